@@ -0,0 +1,142 @@
+"""
+Бенчмарк: обращения к БД на одно обработанное сообщение
+
+Повторяет обращения к памяти при обработке сообщения с ответом
+(сохранение, история за 20 сообщений для контекста LLM, профиль автора,
+get_recent_messages_count) и считает вызовы DatabaseManager. Сравнивает
+прежний кэш истории (список, попадание только при limit сохраненных
+сообщениях) с кольцевым буфером, который знает, что хранит весь хвост чата.
+
+Половина чатов тихие (меньше сообщений, чем запрашивается) - на них
+прежний кэш промахивался на каждом сообщении.
+
+Запуск:
+    python benchmarks/bench_history_cache.py [сообщений] [чатов]
+
+Код возврата 1, если буфер читал историю из БД повторно для того же чата.
+"""
+
+import sys
+import time
+import asyncio
+import tempfile
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from user_accounts_system.database.async_db import AsyncDatabaseManager
+from user_accounts_system.database.db_manager import DatabaseManager
+from user_accounts_system.database.models import Account
+from user_accounts_system.listener.message_parser import MessageContext
+from user_accounts_system.memory.memory_manager import MemoryManager
+
+
+class CallCounter:
+    """Обертка DatabaseManager, считающая вызовы публичных методов"""
+
+    def __init__(self, db: DatabaseManager):
+        self.db = db
+        self.calls = Counter()
+
+    def __getattr__(self, name: str):
+        attr = getattr(self.db, name)
+        if name.startswith("_") or not callable(attr):
+            return attr
+
+        def method(*args, **kwargs):
+            self.calls[name] += 1
+            return attr(*args, **kwargs)
+
+        return method
+
+
+class LegacyMemoryManager(MemoryManager):
+    """Прежний кэш истории: список до 100 сообщений без признака полноты"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._legacy_history = {}
+
+    async def save_message(self, context: MessageContext):
+        await super().save_message(context)
+        history = self._legacy_history.setdefault(context.chat_id, [])
+        history.append(self._chat_cache.peek(context.chat_id).messages[-1])
+        self._legacy_history[context.chat_id] = history[-100:]
+
+    async def get_chat_history(self, chat_id: str, limit: int = 50):
+        cached = self._legacy_history.get(chat_id)
+        if cached is not None and len(cached) >= limit:
+            return cached[-limit:]
+        history = await self.async_db.get_chat_history(self.account_id, chat_id, limit)
+        self._legacy_history[chat_id] = history
+        return history
+
+
+def make_context(i: int, chats: int) -> MessageContext:
+    """Сообщение: первая половина чатов получает почти весь поток"""
+    busy = i % 10 != 0
+    chat = i % (chats // 2) if busy else chats // 2 + i % (chats - chats // 2)
+    return MessageContext(
+        chat_id=str(-1000 - chat),
+        message_id=i,
+        user_id=str(i % 50),
+        username=f"user{i % 50}",
+        text=f"Сообщение номер {i}",
+    )
+
+
+async def process(memory: MemoryManager, context: MessageContext):
+    """Обращения к памяти при обработке одного сообщения с ответом"""
+    await memory.save_message(context)
+    await memory.get_chat_history(context.chat_id, limit=20)
+    await memory.get_user_profile(context.user_id, context.username)
+    await memory.get_recent_messages_count(context.chat_id)
+
+
+async def run(manager_class, count: int, chats: int):
+    """Обработать count сообщений, вернуть (вызовы БД, сообщений в секунду)"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(str(Path(tmp) / "bench.db"))
+        account_id = db.create_account(Account(phone_number="+1", session_file="bench"))
+        counter = CallCounter(db)
+        async_db = AsyncDatabaseManager(counter)
+        memory = manager_class(account_id, db, async_db)
+
+        started = time.perf_counter()
+        for i in range(count):
+            await process(memory, make_context(i, chats))
+        elapsed = time.perf_counter() - started
+
+        async_db.close()
+        db.close()
+        return counter.calls, count / elapsed
+
+
+def report(name: str, calls: Counter, count: int, rate: float):
+    total = sum(calls.values())
+    print(f"{name}: {total / count:.2f} вызовов БД на сообщение, {rate:.1f} msg/s")
+    for method, number in calls.most_common():
+        print(f"    {method:28s} {number / count:6.2f}")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    chats = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    legacy_calls, legacy_rate = asyncio.run(run(LegacyMemoryManager, count, chats))
+    calls, rate = asyncio.run(run(MemoryManager, count, chats))
+
+    print(f"Сообщений: {count}, чатов: {chats}")
+    report("Список (прежний кэш)", legacy_calls, count, legacy_rate)
+    report("Кольцевой буфер", calls, count, rate)
+
+    # Каждый чат читается из БД один раз - при первом сообщении
+    if calls["get_chat_history"] > chats:
+        print(f"Ошибка: {calls['get_chat_history']} чтений истории на {chats} чатов")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+"""
+Бенчмарк: чтение истории чата (get_chat_history) в секунду
+
+Сравнивает прежний путь чтения (sqlite3.Row, datetime.fromisoformat по
+текстовым меткам времени) с текущим: целые миллисекунды эпохи и сборка
+моделей из кортежей. Прежний путь воспроизводится на той же БД до
+миграции 5, затем БД мигрирует и замеряется DatabaseManager.
+
+Запуск:
+    python benchmarks/bench_history_read.py [сообщений_в_чате] [чтений]
+"""
+
+import sys
+import time
+import sqlite3
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from user_accounts_system.database import migrations
+from user_accounts_system.database.db_manager import DatabaseManager
+from user_accounts_system.database.models import ChatMessage
+
+LIMIT = 50
+
+
+def fill_legacy(db_path: str, count: int):
+    """Создать БД схемы v4 с текстовыми метками времени"""
+    conn = sqlite3.connect(db_path)
+    migrations.migrate(conn, [m for m in migrations.MIGRATIONS if m.version <= 4])
+    conn.execute("INSERT INTO accounts (phone_number, session_file) VALUES ('+1', 'bench')")
+    started = datetime.now() - timedelta(seconds=count)
+    conn.executemany("""
+        INSERT INTO chat_memory
+        (account_id, chat_id, message_id, user_id, username, message_text, timestamp, tone, is_question)
+        VALUES (1, 'chat', ?, ?, ?, ?, ?, 'neutral', ?)
+    """, [
+        (i, str(i % 50), f"user{i % 50}", f"Сообщение {i}",
+         str(started + timedelta(seconds=i)), i % 7 == 0)
+        for i in range(count)
+    ])
+    conn.commit()
+    conn.close()
+
+
+def read_legacy(conn: sqlite3.Connection):
+    """Чтение истории так, как оно работало до миграции 5 (без терминов)"""
+    rows = conn.execute("""
+        SELECT * FROM chat_memory
+        WHERE account_id = ? AND chat_id = ?
+        ORDER BY timestamp DESC
+        LIMIT ?
+    """, (1, "chat", LIMIT)).fetchall()
+    return [
+        ChatMessage(
+            id=row["id"],
+            account_id=row["account_id"],
+            chat_id=row["chat_id"],
+            message_id=row["message_id"],
+            user_id=row["user_id"],
+            username=row["username"],
+            message_text=row["message_text"],
+            timestamp=datetime.fromisoformat(row["timestamp"]) if row["timestamp"] else None,
+            is_reply_to=row["is_reply_to"],
+            tone=row["tone"],
+            is_question=bool(row["is_question"]),
+        )
+        for row in reversed(rows)
+    ]
+
+
+def measure(read, reads: int) -> float:
+    """Выполнить reads чтений, вернуть чтений в секунду"""
+    read()
+    started = time.perf_counter()
+    for _ in range(reads):
+        read()
+    return reads / (time.perf_counter() - started)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    reads = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = str(Path(tmp) / "bench.db")
+        fill_legacy(db_path, count)
+
+        conn = sqlite3.connect(db_path)
+        conn.row_factory = sqlite3.Row
+        legacy = measure(lambda: read_legacy(conn), reads)
+        conn.close()
+
+        # Миграция 5 переводит метки времени в миллисекунды эпохи
+        db = DatabaseManager(db_path)
+        current = measure(lambda: db.get_chat_history(1, "chat", LIMIT), reads)
+        db.close()
+
+    print(f"Сообщений в чате: {count}, чтений по {LIMIT}: {reads}")
+    print(f"{'text + Row':14s} {legacy:10.1f} reads/s")
+    print(f"{'epoch ms':14s} {current:10.1f} reads/s")
+
+
+if __name__ == "__main__":
+    main()
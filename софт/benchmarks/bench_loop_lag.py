@@ -0,0 +1,96 @@
+"""
+Бенчмарк: задержка event loop при записи в БД
+
+Имитирует одновременную обработку сообщений несколькими аккаунтами и
+измеряет задержку event loop (LoopLagMonitor) в двух режимах:
+синхронные вызовы DatabaseManager прямо из корутин (старое поведение)
+и асинхронный фасад AsyncDatabaseManager.
+
+Запуск:
+    python benchmarks/bench_loop_lag.py [аккаунтов] [сообщений_на_аккаунт]
+"""
+
+import sys
+import asyncio
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from user_accounts_system.database.db_manager import DatabaseManager
+from user_accounts_system.database.async_db import AsyncDatabaseManager
+from user_accounts_system.database.models import ChatMessage, InteractionLog
+from user_accounts_system.loop_monitor import LoopLagMonitor
+
+
+def make_rows(account_id: int, i: int):
+    """Сгенерировать сообщение и запись лога"""
+    message = ChatMessage(
+        account_id=account_id,
+        chat_id="-1001",
+        message_id=i,
+        user_id=str(i % 50),
+        username=f"user{i % 50}",
+        message_text=f"Сообщение {i}",
+    )
+    interaction = InteractionLog(
+        account_id=account_id,
+        chat_id="-1001",
+        action_type="ignore",
+        message_id=i,
+        importance_score=0.1,
+        decision_reason="Low importance: 0.10",
+    )
+    return message, interaction
+
+
+async def account_sync(db: DatabaseManager, account_id: int, count: int):
+    for i in range(count):
+        message, interaction = make_rows(account_id, i)
+        db.save_chat_message(message)
+        db.log_interaction(interaction)
+        await asyncio.sleep(0)
+
+
+async def account_async(async_db: AsyncDatabaseManager, account_id: int, count: int):
+    for i in range(count):
+        message, interaction = make_rows(account_id, i)
+        await async_db.save_chat_message(message)
+        await async_db.log_interaction(interaction)
+
+
+async def run(use_facade: bool, accounts: int, count: int) -> dict:
+    """Прогнать нагрузку и вернуть статистику задержки event loop"""
+    with tempfile.TemporaryDirectory() as tmp:
+        # synchronous=FULL - fsync на каждый commit, как на медленном диске
+        db = DatabaseManager(str(Path(tmp) / "bench.db"), synchronous="FULL")
+        async_db = AsyncDatabaseManager(db)
+        monitor = LoopLagMonitor(interval=0.01)
+        monitor.start()
+
+        if use_facade:
+            tasks = [account_async(async_db, a, count) for a in range(1, accounts + 1)]
+        else:
+            tasks = [account_sync(db, a, count) for a in range(1, accounts + 1)]
+        await asyncio.gather(*tasks)
+
+        await monitor.stop()
+        async_db.close()
+        db.close()
+        return monitor.get_stats()
+
+
+def main():
+    accounts = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+
+    before = asyncio.run(run(False, accounts, count))
+    after = asyncio.run(run(True, accounts, count))
+
+    print(f"Аккаунтов: {accounts}, сообщений на аккаунт: {count}")
+    print(f"Синхронные вызовы:  avg {before['avg_lag_ms']:8.2f} ms, max {before['max_lag_ms']:8.2f} ms")
+    print(f"Async фасад:        avg {after['avg_lag_ms']:8.2f} ms, max {after['max_lag_ms']:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
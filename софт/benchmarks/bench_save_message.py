@@ -0,0 +1,67 @@
+"""
+Бенчмарк: скорость сохранения сообщений через MemoryManager.save_message
+
+Сравнивает старый режим (новое соединение SQLite на каждый запрос)
+с пулом долгоживущих соединений в режиме WAL.
+
+Запуск:
+    python benchmarks/bench_save_message.py [количество_сообщений]
+"""
+
+import sys
+import time
+import asyncio
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from user_accounts_system.database.db_manager import DatabaseManager
+from user_accounts_system.listener.message_parser import MessageContext
+from user_accounts_system.memory.memory_manager import MemoryManager
+
+
+def make_context(i: int) -> MessageContext:
+    """Сгенерировать тестовое сообщение"""
+    return MessageContext(
+        chat_id=str(-1000 - i % 10),
+        message_id=i,
+        user_id=str(i % 50),
+        username=f"user{i % 50}",
+        text=f"Сообщение номер {i}: обсуждаем технологии и программирование",
+        tone="neutral",
+        topic_keywords=["обсуждаем", "технологии", "программирование"],
+    )
+
+
+async def run(persistent: bool, count: int) -> float:
+    """Сохранить count сообщений, вернуть сообщений в секунду"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(str(Path(tmp) / "bench.db"), persistent_connections=persistent)
+        memory = MemoryManager(account_id=1, db_manager=db)
+        contexts = [make_context(i) for i in range(count)]
+
+        started = time.perf_counter()
+        for context in contexts:
+            await memory.save_message(context)
+        elapsed = time.perf_counter() - started
+
+        memory.async_db.close()
+        db.close()
+        return count / elapsed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    before = asyncio.run(run(persistent=False, count=count))
+    after = asyncio.run(run(persistent=True, count=count))
+
+    print(f"Сообщений: {count}")
+    print(f"Соединение на запрос:   {before:10.1f} msg/s")
+    print(f"Пул соединений (WAL):   {after:10.1f} msg/s")
+    print(f"Ускорение:              {after / before:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
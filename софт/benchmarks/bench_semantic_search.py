@@ -0,0 +1,68 @@
+"""
+Бенчмарк: пополнение и поиск в семантическом индексе
+
+Добавляет сообщения по одному (как при сохранении) и замеряет задержку
+поиска top-k по всему аккаунту и по одному чату.
+
+Запуск:
+    python benchmarks/bench_semantic_search.py [сообщений] [чатов]
+"""
+
+import sys
+import time
+import random
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from user_accounts_system.memory.semantic_index import SemanticIndex
+
+WORDS = (
+    "погода дождь снег море отпуск работа релиз сервер ошибка база запрос "
+    "кофе чай обед футбол матч игра фильм сериал книга музыка концерт "
+    "машина поезд самолет билет город дом ремонт деньги банк кредит"
+).split()
+
+QUERIES = 200
+
+
+def make_text(rng: random.Random) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 12)))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    chats = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    rng = random.Random(1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = SemanticIndex(tmp)
+        texts = [make_text(rng) for _ in range(count)]
+
+        started = time.perf_counter()
+        for i, text in enumerate(texts):
+            index.add(str(i % chats), i, i, text)
+        add_rate = count / (time.perf_counter() - started)
+
+        queries = [make_text(rng) for _ in range(QUERIES)]
+        started = time.perf_counter()
+        for query in queries:
+            index.search(query, 5)
+        account_ms = (time.perf_counter() - started) / QUERIES * 1000
+
+        started = time.perf_counter()
+        for i, query in enumerate(queries):
+            index.search(query, 5, chat_id=str(i % chats))
+        chat_ms = (time.perf_counter() - started) / QUERIES * 1000
+
+        index.close()
+
+    print(f"Сообщений: {count}, чатов: {chats}, размерность: {index.dim}")
+    print(f"Добавление:          {add_rate:10.1f} msg/s")
+    print(f"Поиск по аккаунту:   {account_ms:10.2f} ms")
+    print(f"Поиск по чату:       {chat_ms:10.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Бенчмарк: первые сообщения после перезапуска с прогревом кэшей и без
+
+Заполняет БД историей нескольких аккаунтов, затем "перезапускает" их:
+создает новые MemoryManager (пустые кэши) и обрабатывает по одному
+сообщению в каждом активном чате (история для контекста LLM, профиль
+автора, темы сообщения). Сравнивает чтения из БД и задержку первых
+сообщений без прогрева и после warm_up, а также длительность прогрева.
+
+Запуск:
+    python benchmarks/bench_warm_up.py [аккаунтов] [сообщений на аккаунт]
+"""
+
+import sys
+import time
+import asyncio
+import tempfile
+from collections import Counter
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from user_accounts_system.database.async_db import AsyncDatabaseManager
+from user_accounts_system.database.db_manager import DatabaseManager
+from user_accounts_system.database.models import Account, ChatMessage, InteractionLog
+from user_accounts_system.listener.message_parser import MessageContext
+from user_accounts_system.memory.cache import WarmUpConfig
+from user_accounts_system.memory.memory_manager import MemoryManager
+
+CHATS = 30
+USERS = 200
+TOPICS = 40
+
+
+class CallCounter:
+    """Обертка DatabaseManager, считающая вызовы публичных методов"""
+
+    def __init__(self, db: DatabaseManager):
+        self.db = db
+        self.calls = Counter()
+
+    def __getattr__(self, name: str):
+        attr = getattr(self.db, name)
+        if name.startswith("_") or not callable(attr):
+            return attr
+
+        def method(*args, **kwargs):
+            self.calls[name] += 1
+            return attr(*args, **kwargs)
+
+        return method
+
+
+def populate(db: DatabaseManager, accounts: int, count: int):
+    """История, решения, профили и темы аккаунтов за последние часы"""
+    now = datetime.now()
+    account_ids = []
+    for number in range(accounts):
+        account_id = db.create_account(Account(phone_number=f"+{number}", session_file="bench"))
+        account_ids.append(account_id)
+        messages, interactions = [], []
+        for i in range(count):
+            timestamp = now - timedelta(seconds=(count - i) * 2)
+            chat_id = str(-1000 - i % CHATS)
+            messages.append(ChatMessage(
+                account_id=account_id, chat_id=chat_id, message_id=i, user_id=str(i % USERS),
+                username=f"user{i % USERS}", message_text=f"Сообщение номер {i}", timestamp=timestamp,
+                topic_keywords=[f"тема{i % TOPICS}"],
+            ))
+            interactions.append(InteractionLog(
+                account_id=account_id, chat_id=chat_id, action_type="ignore", message_id=i, timestamp=timestamp,
+            ))
+        db.save_chat_messages(messages)
+        db.log_interactions(interactions)
+        for user in range(USERS):
+            profile = db.get_or_create_user_profile(account_id, str(user), f"user{user}")
+            profile.interaction_count = USERS - user
+            db.update_user_profile(profile)
+        db.get_or_create_topic_memories(account_id, [f"тема{topic}" for topic in range(TOPICS)])
+    return account_ids
+
+
+async def first_messages(memory: MemoryManager) -> float:
+    """По сообщению в каждом чате сразу после старта, вернуть среднюю задержку (мс)"""
+    started = time.perf_counter()
+    for chat in range(CHATS):
+        context = MessageContext(
+            chat_id=str(-1000 - chat), message_id=10 ** 6 + chat, user_id=str(chat % USERS),
+            username=f"user{chat % USERS}", text="Новое сообщение", topic_keywords=[f"тема{chat % TOPICS}"],
+        )
+        await memory.save_message(context)
+        await memory.get_chat_history(context.chat_id, limit=20)
+        await memory.get_user_profile(context.user_id, context.username)
+        await memory.get_topic_context(context.topic_keywords)
+    return (time.perf_counter() - started) * 1000 / CHATS
+
+
+async def restart(db: DatabaseManager, account_ids, warm: bool):
+    """Новые менеджеры памяти для всех аккаунтов, вернуть (вызовы БД после прогрева, запросы прогрева, прогрев мс, задержка мс)"""
+    counter = CallCounter(db)
+    async_db = AsyncDatabaseManager(counter)
+    memories = [
+        MemoryManager(account_id, db, async_db, warm_up=WarmUpConfig(enabled=warm))
+        for account_id in account_ids
+    ]
+
+    started = time.perf_counter()
+    await asyncio.gather(*(memory.warm_up() for memory in memories))
+    warm_up_ms = (time.perf_counter() - started) * 1000
+    warm_up_calls = sum(counter.calls.values())
+    counter.calls.clear()
+
+    latency = sum([await first_messages(memory) for memory in memories]) / len(memories)
+    async_db.close()
+    return counter.calls, warm_up_calls, warm_up_ms, latency
+
+
+def report(name: str, calls: Counter, warm_up_calls: int, warm_up_ms: float, latency: float, accounts: int):
+    messages = accounts * CHATS
+    reads = sum(number for method, number in calls.items() if method.startswith("get_"))
+    print(f"{name}: прогрев {warm_up_ms:.1f} мс ({warm_up_calls} запросов), "
+          f"первое сообщение {latency:.2f} мс, {reads / messages:.2f} чтений БД на сообщение")
+    for method, number in calls.most_common():
+        print(f"    {method:28s} {number:6d}")
+
+
+def main():
+    accounts = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(str(Path(tmp) / "bench.db"))
+        account_ids = populate(db, accounts, count)
+
+        cold = asyncio.run(restart(db, account_ids, warm=False))
+        warm = asyncio.run(restart(db, account_ids, warm=True))
+        db.close()
+
+    print(f"Аккаунтов: {accounts}, сообщений на аккаунт: {count}, чатов: {CHATS}")
+    report("Без прогрева", *cold, accounts)
+    report("С прогревом", *warm, accounts)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Бенчмарк: вставки chat_memory + interaction_log в секунду
+
+Сравнивает запись каждой строки отдельной транзакцией с очередью
+отложенной записи (WriteBehindQueue) при разных уровнях надежности.
+
+Запуск:
+    python benchmarks/bench_write_behind.py [количество_сообщений]
+"""
+
+import sys
+import time
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from user_accounts_system.database.db_manager import DatabaseManager
+from user_accounts_system.database.models import ChatMessage, InteractionLog
+from user_accounts_system.database.write_behind import WriteBehindConfig
+
+
+def make_rows(i: int):
+    """Сгенерировать сообщение и запись лога"""
+    message = ChatMessage(
+        account_id=1,
+        chat_id=str(-1000 - i % 10),
+        message_id=i,
+        user_id=str(i % 50),
+        username=f"user{i % 50}",
+        message_text=f"Сообщение {i}",
+    )
+    interaction = InteractionLog(
+        account_id=1,
+        chat_id=message.chat_id,
+        action_type="ignore",
+        message_id=i,
+        importance_score=0.1,
+        decision_reason="Low importance: 0.10",
+    )
+    return message, interaction
+
+
+def run(durability: str, count: int) -> float:
+    """Записать count пар строк, вернуть вставок в секунду"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(str(Path(tmp) / "bench.db"))
+        if durability != "per-row":
+            db.enable_write_behind(WriteBehindConfig.for_durability(durability))
+        rows = [make_rows(i) for i in range(count)]
+
+        started = time.perf_counter()
+        for message, interaction in rows:
+            db.queue_chat_message(message)
+            db.queue_interaction(interaction)
+        db.flush_pending()
+        elapsed = time.perf_counter() - started
+
+        db.close()
+        return count * 2 / elapsed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+
+    print(f"Сообщений: {count} (+{count} записей лога)")
+    for durability in ("per-row", "strict", "balanced", "fast"):
+        print(f"{durability:10s} {run(durability, count):12.1f} inserts/s")
+
+
+if __name__ == "__main__":
+    main()
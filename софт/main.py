@@ -9,6 +9,7 @@ from pathlib import Path
 from dotenv import load_dotenv
 
 from user_accounts_system.orchestrator import Orchestrator
+from user_accounts_system.memory.cache import MemoryCacheConfig, WarmUpConfig
 from user_accounts_system.api.control_api import create_app
 import uvicorn
 
@@ -65,10 +66,22 @@ async def main():
     # Инициализация orchestrator
     print("\nИнициализация системы...")
     orchestrator = Orchestrator(
-        db_path=str(data_dir / "accounts.db"),
+        db_path=os.getenv("DATABASE_URL") or str(data_dir / "accounts.db"),
         llm_provider="openai",
         llm_api_key=os.getenv("OPENAI_API_KEY"),
         llm_model=os.getenv("LLM_MODEL", "gpt-4o-mini"),
+        sharded=os.getenv("DB_SHARDED", "0") == "1",
+        interaction_sample_rate=float(os.getenv("INTERACTION_SAMPLE_RATE", "0.05")),
+        memory_cache=MemoryCacheConfig(
+            chat_capacity=int(os.getenv("MEMORY_CACHE_CHATS", "500")),
+            user_capacity=int(os.getenv("MEMORY_CACHE_USERS", "5000")),
+            topic_capacity=int(os.getenv("MEMORY_CACHE_TOPICS", "2000")),
+            ttl=float(os.getenv("MEMORY_CACHE_TTL", "1800")) or None,
+        ),
+        memory_warm_up=WarmUpConfig(
+            enabled=os.getenv("MEMORY_WARMUP_MESSAGES", "5000") != "0",
+            max_messages=int(os.getenv("MEMORY_WARMUP_MESSAGES", "5000")),
+        ),
     )
 
     # Проверка наличия API ключа
@@ -0,0 +1,23 @@
+"""
+Общие фикстуры тестов
+
+Запуск из папки софт:
+    python -m pytest -q tests
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from user_accounts_system.database.db_manager import DatabaseManager
+
+
+@pytest.fixture
+def db(tmp_path):
+    """DatabaseManager на чистом файле SQLite"""
+    manager = DatabaseManager(str(tmp_path / "accounts.db"))
+    yield manager
+    manager.close()
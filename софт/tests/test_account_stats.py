@@ -0,0 +1,40 @@
+"""
+Статистика аккаунтов в Orchestrator не читает БД из event loop
+"""
+
+import asyncio
+import threading
+
+from user_accounts_system.database.models import Account
+from user_accounts_system.orchestrator import Orchestrator
+from user_accounts_system.personality.personality_engine import PersonalityEngine
+
+
+def test_stopped_account_stats_read_off_the_event_loop(tmp_path):
+    orchestrator = Orchestrator(str(tmp_path / "accounts.db"), llm_api_key="test")
+    db = orchestrator.db
+    account_id = db.create_account(Account(phone_number="+1", session_file="test"))
+    PersonalityEngine(account_id, db, orchestrator.async_db).load_profile()
+    db.upsert_personality_scores(account_id, topic_priorities={"кино": 0.8})
+
+    threads = []
+    for name in ("get_topic_priorities", "get_user_relationships"):
+        original = getattr(db, name)
+
+        def loader(*args, _original=original, **kwargs):
+            threads.append(threading.current_thread())
+            return _original(*args, **kwargs)
+
+        setattr(db, name, loader)
+
+    async def scenario():
+        return await orchestrator.get_account_stats(account_id)
+
+    try:
+        stats = asyncio.run(scenario())
+    finally:
+        orchestrator.async_db.close()
+        db.close()
+
+    assert stats["profile"]["dynamic"]["topic_priorities"] == {"кино": 0.8}
+    assert threads and threading.main_thread() not in threads
@@ -0,0 +1,128 @@
+"""
+Кольцевой буфер истории чата в MemoryManager
+"""
+
+import asyncio
+from collections import Counter
+from datetime import datetime, timedelta
+
+import pytest
+
+from user_accounts_system.database.async_db import AsyncDatabaseManager
+from user_accounts_system.database.models import ChatMessage
+from user_accounts_system.listener.message_parser import MessageContext
+from user_accounts_system.memory.cache import MemoryCacheConfig, WarmUpConfig
+from user_accounts_system.memory.memory_manager import MemoryManager
+
+ACCOUNT_ID = 1
+BUFFER_SIZE = 100
+
+
+class CallCounter:
+    """Обертка DatabaseManager, считающая вызовы публичных методов"""
+
+    def __init__(self, db):
+        self.db = db
+        self.calls = Counter()
+
+    def __getattr__(self, name: str):
+        attr = getattr(self.db, name)
+        if name.startswith("_") or not callable(attr):
+            return attr
+
+        def method(*args, **kwargs):
+            self.calls[name] += 1
+            return attr(*args, **kwargs)
+
+        return method
+
+    @property
+    def reads(self) -> int:
+        return sum(number for name, number in self.calls.items() if name.startswith("get_"))
+
+
+@pytest.fixture
+def counter(db):
+    return CallCounter(db)
+
+
+@pytest.fixture
+def memory(db, counter):
+    async_db = AsyncDatabaseManager(counter)
+    manager = MemoryManager(
+        ACCOUNT_ID, db, async_db,
+        cache_config=MemoryCacheConfig(chat_history_size=BUFFER_SIZE),
+        warm_up=WarmUpConfig(enabled=False),
+    )
+    yield manager
+    async_db.close()
+
+
+def _populate(db, chat_id: str, count: int):
+    start = datetime.now() - timedelta(hours=1)
+    db.save_chat_messages([
+        ChatMessage(account_id=ACCOUNT_ID, chat_id=chat_id, message_id=i, user_id=str(i % 7),
+                    message_text=f"Сообщение {i}", timestamp=start + timedelta(seconds=i))
+        for i in range(count)
+    ])
+
+
+def _context(chat_id: str, message_id: int) -> MessageContext:
+    return MessageContext(chat_id=chat_id, message_id=message_id, user_id="1",
+                          username="user1", text="Новое сообщение")
+
+
+def _ids(history):
+    return [msg.message_id for msg in history]
+
+
+def test_warm_history_is_served_without_db(memory, counter, db):
+    _populate(db, "-1001", 300)
+
+    async def scenario():
+        first = await memory.get_chat_history("-1001", limit=20)
+        assert counter.calls["get_chat_history"] == 1
+        counter.calls.clear()
+
+        assert _ids(await memory.get_chat_history("-1001", limit=20)) == _ids(first)
+        assert _ids(await memory.get_chat_history("-1001", limit=BUFFER_SIZE)) == list(range(200, 300))
+
+        # Новые сообщения дописываются в буфер, чтение их видит без БД
+        for message_id in range(300, 305):
+            await memory.save_message(_context("-1001", message_id))
+        assert _ids(await memory.get_chat_history("-1001", limit=20)) == list(range(285, 305))
+        assert _ids(await memory.get_chat_history("-1001", limit=BUFFER_SIZE)) == list(range(205, 305))
+
+    asyncio.run(scenario())
+    assert counter.reads == 0
+
+
+def test_complete_short_chat_answers_any_limit(memory, counter, db):
+    _populate(db, "-1002", 5)
+
+    async def scenario():
+        await memory.get_chat_history("-1002", limit=20)
+        counter.calls.clear()
+        assert _ids(await memory.get_chat_history("-1002", limit=500)) == list(range(5))
+
+    asyncio.run(scenario())
+    assert counter.reads == 0
+
+
+def test_incomplete_tail_falls_through_to_db(memory, counter, db):
+    _populate(db, "-1003", 300)
+
+    async def scenario():
+        # Буфер нового чата знает только сохраненное сообщение, но не старую историю
+        await memory.save_message(_context("-1003", 300))
+        history = await memory.get_chat_history("-1003", limit=20)
+        assert _ids(history) == list(range(281, 301))
+        assert counter.calls["get_chat_history"] == 1
+
+        # Запрос длиннее заполненного буфера тоже идет в БД
+        counter.calls.clear()
+        history = await memory.get_chat_history("-1003", limit=BUFFER_SIZE + 50)
+        assert _ids(history) == list(range(151, 301))
+        assert counter.calls["get_chat_history"] == 1
+
+    asyncio.run(scenario())
@@ -0,0 +1,159 @@
+"""
+Миграции схемы SQLite: от исходной схемы до актуальной версии
+"""
+
+import json
+import sqlite3
+import threading
+from datetime import datetime
+
+import pytest
+
+from user_accounts_system.database.db_manager import DatabaseManager
+from user_accounts_system.database import migrations
+from user_accounts_system.database.migrations import (
+    MIGRATIONS, fts5_supported, get_schema_version, latest_version, migrate,
+)
+
+
+requires_fts5 = pytest.mark.skipif(not fts5_supported(), reason="SQLite built without FTS5")
+
+
+def _schema(conn: sqlite3.Connection) -> list:
+    return conn.execute("SELECT type, name, sql FROM sqlite_master ORDER BY type, name").fetchall()
+
+
+@pytest.fixture
+def baseline_db(tmp_path):
+    """Файл БД со схемой версии 1 и данными в старом формате"""
+    path = str(tmp_path / "accounts.db")
+    conn = sqlite3.connect(path)
+    assert migrate(conn, MIGRATIONS[:1]) == 1
+
+    conn.execute("INSERT INTO accounts (id, phone_number, session_file) VALUES (1, '+1', 'session')")
+    conn.execute("""
+        INSERT INTO personality_profiles (account_id, base_config, dynamic_config, constraints_config)
+        VALUES (1, '{}', ?, '{}')
+    """, (json.dumps({"topic_priorities": {"погода": 0.8}, "user_relationships": {"42": 0.6}}),))
+    conn.execute("""
+        INSERT INTO chat_memory (account_id, chat_id, message_id, user_id, username, message_text,
+                                 timestamp, context_data)
+        VALUES (1, '-1001', 7, '42', 'user', 'Какая завтра погода?', '2024-05-01 12:30:00', ?)
+    """, (json.dumps({"tone": "neutral", "is_question": True,
+                      "topic_keywords": ["погода"], "mentions": ["bot"]}),))
+    conn.execute("""
+        INSERT INTO interaction_log (account_id, chat_id, action_type, message_id, importance_score,
+                                     timestamp)
+        VALUES (1, '-1001', 'message', 7, 0.9, '2024-05-01 12:30:05')
+    """)
+    conn.commit()
+    conn.close()
+    return path
+
+
+def test_baseline_schema_migrates_to_latest(baseline_db):
+    db = DatabaseManager(baseline_db)
+    try:
+        with db.pool.connection() as conn:
+            assert get_schema_version(conn) == latest_version() == MIGRATIONS[-1].version
+
+        [message] = db.get_chat_history(1, "-1001")
+        assert message.message_text == "Какая завтра погода?"
+        assert message.timestamp == datetime(2024, 5, 1, 12, 30)
+        assert message.tone == "neutral" and message.is_question
+        assert message.topic_keywords == ["погода"] and message.mentions == ["bot"]
+
+        assert db.get_topic_priorities(1) == {"погода": 0.8}
+        assert db.get_user_relationships(1) == {"42": 0.6}
+
+        stats = db.get_account_stats(1, recent_hours=1)
+        assert stats.messages_received == 1 and stats.messages_responded == 1
+        assert [c.total for c in db.get_interaction_counters(1)] == [1]
+    finally:
+        db.close()
+
+
+def test_rerun_is_noop(baseline_db):
+    conn = sqlite3.connect(baseline_db)
+    try:
+        assert migrate(conn) == latest_version()
+        schema = _schema(conn)
+        assert migrate(conn) == latest_version()
+        assert _schema(conn) == schema
+    finally:
+        conn.close()
+
+
+def test_concurrent_start_applies_each_migration_once(baseline_db):
+    barrier = threading.Barrier(4)
+    results, errors = [], []
+
+    def start():
+        conn = sqlite3.connect(baseline_db, timeout=30)
+        try:
+            barrier.wait()
+            results.append(migrate(conn))
+        except Exception as e:
+            errors.append(e)
+        finally:
+            conn.close()
+
+    threads = [threading.Thread(target=start) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    assert results == [latest_version()] * 4
+
+    db = DatabaseManager(baseline_db)
+    try:
+        # Данные перенесены один раз
+        assert len(db.get_chat_history(1, "-1001")) == 1
+        assert db.get_account_stats(1).messages_received == 1
+    finally:
+        db.close()
+
+
+def _drop_full_text_index(path: str):
+    """Как будто миграция 6 прошла на SQLite без FTS5"""
+    conn = sqlite3.connect(path)
+    for trigger in ("insert", "delete", "update"):
+        conn.execute(f"DROP TRIGGER IF EXISTS trg_chat_memory_fts_{trigger}")
+    conn.execute("DROP TABLE IF EXISTS chat_memory_fts")
+    conn.commit()
+    conn.close()
+
+
+@requires_fts5
+def test_full_text_index_is_created_on_later_start(baseline_db):
+    conn = sqlite3.connect(baseline_db)
+    migrate(conn)
+    conn.close()
+    _drop_full_text_index(baseline_db)
+
+    db = DatabaseManager(baseline_db)
+    try:
+        assert db.has_full_text_index()
+        [result] = db.search_chat_memory(1, "погоду")
+        assert result.message.message_id == 7
+    finally:
+        db.close()
+
+
+def test_current_schema_without_fts5_takes_no_write_lock(baseline_db, monkeypatch):
+    conn = sqlite3.connect(baseline_db)
+    migrate(conn)
+    conn.close()
+    _drop_full_text_index(baseline_db)
+    monkeypatch.setattr(migrations, "_fts5_supported", False)
+
+    conn = sqlite3.connect(baseline_db)
+    statements = []
+    conn.set_trace_callback(statements.append)
+    try:
+        assert migrate(conn) == latest_version()
+    finally:
+        conn.close()
+    assert not any(statement.startswith("BEGIN") for statement in statements)
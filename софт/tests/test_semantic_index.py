@@ -0,0 +1,104 @@
+"""
+Удаление сообщений из семантического индекса: частоты позиций, политика хранения, compact
+"""
+
+import asyncio
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from user_accounts_system.memory.semantic_index import SemanticIndex
+from user_accounts_system.orchestrator import Orchestrator
+
+TEXTS = [
+    "Смотрели вчера новое кино про космос",
+    "Погода сегодня отличная, идем гулять",
+    "Кто знает хороший рецепт борща",
+    "Футбольный матч перенесли на субботу",
+]
+
+
+def _fill(index, chat_id, count, start_ms=0):
+    for i in range(count):
+        index.add(chat_id, i, start_ms + i * 1000, f"{TEXTS[i % len(TEXTS)]} номер{i}")
+
+
+def _live_frequency(index):
+    count = len(index)
+    return np.count_nonzero(index._vectors[:count], axis=0)
+
+
+def test_forget_chat_keeps_document_frequency(tmp_path):
+    index = SemanticIndex(str(tmp_path / "index"), dim=64)
+    _fill(index, "-1001", 20)
+    _fill(index, "-1002", 10)
+
+    index.forget_chat("-1001")
+    assert np.array_equal(index._document_frequency, _live_frequency(index))
+    assert all(hit.chat_id == "-1002" for hit in index.search("кино про космос", limit=10, min_score=0.0))
+
+    index.forget_chat()
+    assert not index._document_frequency.any()
+    index.close()
+
+
+def test_prune_by_age_and_rows_then_compact(tmp_path):
+    path = str(tmp_path / "index")
+    index = SemanticIndex(path, dim=64)
+    _fill(index, "-1001", 30)
+    _fill(index, "-1002", 5, start_ms=100_000)
+
+    # Старше 10 секунд от начала - и не больше 8 последних строк на чат
+    assert index.prune(before=10_000, max_rows_per_chat=8) == 22
+    assert np.array_equal(index._document_frequency, _live_frequency(index))
+    found = {(hit.chat_id, hit.message_id) for hit in index.search("кино про космос", limit=50, min_score=0.0)}
+    assert found and all(chat == "-1002" or message_id >= 22 for chat, message_id in found)
+
+    assert index.compact() == 22
+    assert len(index) == 13
+    assert np.array_equal(index._document_frequency, _live_frequency(index))
+    assert index.search("кино про космос", limit=50, min_score=0.0)
+    index.add("-1001", 100, 200_000, "Еще одно сообщение про кино")
+    index.close()
+
+    reopened = SemanticIndex(path, dim=64)
+    assert len(reopened) == 14
+    assert reopened._keys[-1] == ("-1001", 100, 200_000)
+    reopened.close()
+
+
+def test_interrupted_compaction_keeps_old_files(tmp_path):
+    path = tmp_path / "index"
+    index = SemanticIndex(str(path), dim=64)
+    _fill(index, "-1001", 5)
+    index.close()
+
+    # Сбой до замены meta.jsonl: недописанные файлы отбрасываются
+    (path / "meta.jsonl.compact").write_text('["-1001", 4, 4000]\n', encoding="utf-8")
+    (path / "vectors-64.f32.compact").write_bytes(b"\0" * 256)
+    reopened = SemanticIndex(str(path), dim=64)
+    assert len(reopened) == 5
+    assert not (path / "meta.jsonl.compact").exists()
+    assert not (path / "vectors-64.f32.compact").exists()
+    reopened.close()
+
+
+def test_clearing_a_stopped_account_forgets_its_index(tmp_path):
+    semantic_dir = tmp_path / "semantic"
+    index = SemanticIndex(str(semantic_dir / "1"))
+    _fill(index, "-1001", 5)
+    _fill(index, "-1002", 3)
+    index.close()
+
+    orchestrator = Orchestrator(str(tmp_path / "accounts.db"), llm_api_key="test",
+                                semantic_index_dir=str(semantic_dir))
+    try:
+        asyncio.run(orchestrator.forget_chat_memory(1, "-1001"))
+    finally:
+        orchestrator.async_db.close()
+        orchestrator.db.close()
+
+    reopened = SemanticIndex(str(semantic_dir / "1"))
+    assert [key[0] for key in reopened._keys] == ["-1002"] * 3
+    reopened.close()
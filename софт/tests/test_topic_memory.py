@@ -0,0 +1,38 @@
+"""
+get_or_create для профилей пользователей и памяти о темах
+"""
+
+
+def test_existing_user_profile_is_read_without_writes(db):
+    created = db.get_or_create_user_profile(1, "42", "old")
+    with db.pool.connection() as conn:
+        changes = conn.total_changes
+
+    assert db.get_or_create_user_profile(1, "42", "old").id == created.id
+    assert db.get_or_create_user_profile(1, "42").username == "old"
+    with db.pool.connection() as conn:
+        assert conn.total_changes == changes
+
+    renamed = db.get_or_create_user_profile(1, "42", "new")
+    assert (renamed.id, renamed.username) == (created.id, "new")
+    assert db.get_user_profiles(1, ["42"])["42"].username == "new"
+    assert db.get_or_create_user_profile(1, "43").id == created.id + 1
+
+
+def test_existing_topics_are_read_without_writes(db):
+    created = db.get_or_create_topic_memories(1, ["погода", "кино"])
+    with db.pool.connection() as conn:
+        changes = conn.total_changes
+
+    again = db.get_or_create_topic_memories(1, ["кино", "погода", "кино"])
+    with db.pool.connection() as conn:
+        assert conn.total_changes == changes
+    assert {k: t.id for k, t in again.items()} == {k: t.id for k, t in created.items()}
+
+
+def test_lookups_do_not_consume_ids(db):
+    first = db.get_or_create_topic_memory(1, "погода")
+    db.get_or_create_topic_memory(1, "погода")
+    mixed = db.get_or_create_topic_memories(1, ["погода", "кино"])
+    assert mixed["погода"].id == first.id
+    assert mixed["кино"].id == first.id + 1
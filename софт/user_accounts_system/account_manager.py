@@ -3,15 +3,22 @@
 """
 
 import asyncio
+import random
 from typing import Optional, Dict, Any
 from datetime import datetime
+from pathlib import Path
 
 from .database.db_manager import DatabaseManager
+from .database.async_db import AsyncDatabaseManager
 from .database.models import Account
 from .listener.message_listener import MessageListener
+from .listener.shared_ingest import SharedIngest
 from .listener.message_parser import MessageContext
 from .decision.decision_engine import DecisionEngine, DecisionType, Decision
 from .memory.memory_manager import MemoryManager
+from .memory.cache import MemoryCacheConfig, WarmUpConfig, WriteBackConfig
+from .memory import semantic_index
+from .memory.summarizer import ChatSummarizer, SummaryConfig
 from .personality.personality_engine import PersonalityEngine
 from .llm.llm_service import LLMService
 from .llm.prompt_builder import PromptBuilder
@@ -28,6 +35,15 @@ class AccountManager:
         session_string: str,
         db_manager: DatabaseManager,
         llm_service: LLMService,
+        async_db: Optional[AsyncDatabaseManager] = None,
+        interaction_sample_rate: float = 0.05,
+        memory_cache: Optional[MemoryCacheConfig] = None,
+        memory_write_back: Optional[WriteBackConfig] = None,
+        memory_warm_up: Optional[WarmUpConfig] = None,
+        semantic_index_dir: Optional[str] = None,
+        chat_summary: Optional[SummaryConfig] = None,
+        ingest: Optional[SharedIngest] = None,
+        semantic_vectorizer: Optional["semantic_index.HashingVectorizer"] = None,
     ):
         """
         Args:
@@ -37,14 +53,37 @@ class AccountManager:
             session_string: Сессия в формате StringSession
             db_manager: Менеджер БД
             llm_service: Сервис LLM
+            async_db: Асинхронный фасад БД (общий для всех аккаунтов)
+            interaction_sample_rate: Доля решений без ответа (react/ignore/defer),
+                сохраняемых в interaction_log полной строкой; остальные
+                учитываются только в почасовых счетчиках
+            memory_cache: Размеры кэшей памяти аккаунта
+            memory_write_back: Отложенная запись профилей пользователей и тем
+            memory_warm_up: Предзагрузка кэшей памяти при старте (объем)
+            semantic_index_dir: Каталог семантических индексов аккаунтов
+                (None или без NumPy - давние сообщения ищутся только полнотекстово)
+            chat_summary: Сводки чатов - ранняя история сворачивается в фоне
+                и заменяет в промпте старые сообщения
+            ingest: Общий с другими аккаунтами разбор сообщений групп
+            semantic_vectorizer: Общий векторизатор семантических индексов
+                (сообщение группы векторизуется один раз на все аккаунты)
         """
         self.account_id = account_id
         self.db = db_manager
+        self.async_db = async_db or AsyncDatabaseManager(db_manager)
         self.llm_service = llm_service
+        self.interaction_sample_rate = interaction_sample_rate
         
         # Инициализация компонентов
-        self.personality_engine = PersonalityEngine(account_id, db_manager)
-        self.memory_manager = MemoryManager(account_id, db_manager)
+        self.personality_engine = PersonalityEngine(account_id, db_manager, self.async_db)
+        index = None
+        if semantic_index_dir and semantic_index.is_available():
+            index = semantic_index.SemanticIndex(
+                str(Path(semantic_index_dir) / str(account_id)), vectorizer=semantic_vectorizer
+            )
+        self.memory_manager = MemoryManager(
+            account_id, db_manager, self.async_db, memory_cache, memory_write_back, index, memory_warm_up
+        )
         
         # Загрузить профиль
         self.profile = self.personality_engine.load_profile()
@@ -57,16 +96,20 @@ class AccountManager:
             api_hash=api_hash,
             session_string=session_string,
             account_username=None,  # Будет загружено после старта
+            ingest=ingest,
         )
+        self.listener.set_message_handler(self._handle_message)
         
         # Prompt builder
         self.prompt_builder = PromptBuilder(self.profile)
+        self.summarizer = ChatSummarizer(self.memory_manager, llm_service, self.prompt_builder, chat_summary)
         
-        # Статистика
+        # Статистика текущего запуска (накопленная хранится в БД, см. get_stats)
         self.stats = {
             "messages_received": 0,
             "messages_responded": 0,
             "messages_ignored": 0,
+            "messages_deferred": 0,
             "last_activity": None,
         }
 
@@ -74,38 +117,59 @@ class AccountManager:
         """Запустить аккаунт"""
         # Проверить действительность сессии перед запуском
         try:
+            # Оценки личности - до первых сообщений, не синхронно из event loop
+            await self.personality_engine.load_scores()
+            # Пока сообщения не идут, семантический индекс догоняет политику
+            # хранения и переписывается без удаленных сообщений
+            policy = await self.async_db.get_retention_policy(self.account_id)
+            await self.memory_manager.apply_retention(policy, compact=True)
             await self.listener.start()
 
             # Попробовать получить информацию об аккаунте для проверки сессии
             me = await self.listener.client.get_me()
             if me:
                 # Обновить статус аккаунта в базе данных на активный
-                account = self.db.get_account(self.account_id)
+                account = await self.async_db.get_account(self.account_id)
                 if account:
                     account.is_active = True
-                    self.db.update_account(account)
+                    await self.async_db.update_account(account)
 
                 self.listener.account_username = me.username
                 self.listener.parser.account_username = me.username
+                self.memory_manager.start()
+                await self._warm_up_memory()
                 print(f"Account {self.account_id} started successfully")
             else:
                 # Если не удалось получить информацию, сессия недействительна
                 print(f"Account {self.account_id} has invalid session")
                 # Обновить статус аккаунта в базе данных на неактивный
-                account = self.db.get_account(self.account_id)
+                account = await self.async_db.get_account(self.account_id)
                 if account:
                     account.is_active = False
-                    self.db.update_account(account)
+                    await self.async_db.update_account(account)
                 raise Exception(f"Invalid session for account {self.account_id}")
         except Exception as e:
             print(f"Error starting account {self.account_id}: {e}")
             # Обновить статус аккаунта в базе данных на неактивный
-            account = self.db.get_account(self.account_id)
+            account = await self.async_db.get_account(self.account_id)
             if account:
                 account.is_active = False
-                self.db.update_account(account)
+                await self.async_db.update_account(account)
             raise e
 
+    async def _warm_up_memory(self):
+        """Предзагрузить кэши памяти (ошибка прогрева не мешает запуску)"""
+        try:
+            stats = await self.memory_manager.warm_up()
+        except Exception as e:
+            print(f"Error warming up memory of account {self.account_id}: {e}")
+            return
+        print(
+            f"Account {self.account_id} memory warmed up in {stats['duration_ms']} ms: "
+            f"{stats['chats']} chats ({stats['messages']} messages), "
+            f"{stats['users']} users, {stats['topics']} topics"
+        )
+
     async def check_session_validity(self) -> bool:
         """Проверить действительность сессии"""
         try:
@@ -119,6 +183,9 @@ class AccountManager:
     async def stop(self):
         """Остановить аккаунт"""
         await self.listener.stop()
+        await self.summarizer.stop()
+        # Записать отложенные изменения профилей и тем
+        await self.memory_manager.stop()
         print(f"Account {self.account_id} stopped")
 
     def _handle_message(self, context: MessageContext):
@@ -131,56 +198,69 @@ class AccountManager:
         self.stats["messages_received"] += 1
         self.stats["last_activity"] = datetime.now()
         
-        # Сохранить в память
-        self.memory_manager.save_message(context)
+        # Сохранить в память и учесть в счетчиках активности чата
+        await self.memory_manager.save_message(context)
+        self.decision_engine.activity.record_message(context.chat_id)
+        self.summarizer.note_message(context.chat_id)
         
         # Получить контекст
-        chat_history = self.memory_manager.get_chat_history(context.chat_id, limit=20)
-        user_profile = self.memory_manager.get_user_profile(context.user_id, context.username)
+        user_profile = await self.memory_manager.get_user_profile(context.user_id, context.username)
         
         # Принять решение
         decision = self.decision_engine.make_decision(
             context=context,
-            chat_history_count=len(chat_history),
             user_profile=user_profile,
-            recent_responses_count=self._get_recent_responses_count(context.chat_id),
         )
         
         # Обработать решение
         if decision.decision_type == DecisionType.RESPOND:
-            await self._respond_to_message(context, decision, chat_history, user_profile)
+            await self._respond_to_message(context, decision, user_profile)
         elif decision.decision_type == DecisionType.REACT:
             # Реакции пока не реализованы
-            self.memory_manager.log_interaction(
+            await self.memory_manager.log_interaction(
                 context.chat_id,
                 "react",
                 context.message_id,
                 importance_score=decision.importance_score,
                 decision_reason=decision.reason,
+                reason_class=decision.reason_class,
+                keep_row=random.random() < self.interaction_sample_rate,
+            )
+        elif decision.decision_type == DecisionType.DEFER:
+            # Отложить (неактивные часы) - учитывается отдельно от игнорирования
+            await self.memory_manager.log_interaction(
+                context.chat_id,
+                "defer",
+                context.message_id,
+                importance_score=decision.importance_score,
+                decision_reason=decision.reason,
+                reason_class=decision.reason_class,
+                keep_row=random.random() < self.interaction_sample_rate,
             )
+            self.stats["messages_deferred"] += 1
         else:
-            # Игнорировать или отложить
-            self.memory_manager.log_interaction(
+            # Игнорировать
+            await self.memory_manager.log_interaction(
                 context.chat_id,
                 "ignore",
                 context.message_id,
                 importance_score=decision.importance_score,
                 decision_reason=decision.reason,
+                reason_class=decision.reason_class,
+                keep_row=random.random() < self.interaction_sample_rate,
             )
             self.stats["messages_ignored"] += 1
             
             # Эволюция на основе игнорирования
-            if decision.decision_type == DecisionType.IGNORE:
-                self.personality_engine.evolve_from_interaction(
-                    "ignored",
-                    {"user_id": context.user_id, "topic_keywords": context.topic_keywords},
-                )
+            await self.personality_engine.evolve_from_interaction(
+                "ignored",
+                {"user_id": context.user_id, "topic_keywords": context.topic_keywords},
+            )
 
     async def _respond_to_message(
         self,
         context: MessageContext,
         decision: "Decision",
-        chat_history: list,
         user_profile,
     ):
         """Ответить на сообщение"""
@@ -189,9 +269,13 @@ class AccountManager:
             await asyncio.sleep(decision.delay)
         
         # Построить контекст для LLM
-        llm_context = self.memory_manager.build_context_for_llm(context.chat_id, limit=20)
-        user_context = self.memory_manager.get_user_context(context.user_id)
-        topic_context = self.memory_manager.get_topic_context(context.topic_keywords)
+        llm_context = await self.memory_manager.build_context_for_llm(
+            context.chat_id,
+            limit=20,
+            recall_query=context.text,
+        )
+        user_context = await self.memory_manager.get_user_context(context.user_id)
+        topic_context = await self.memory_manager.get_topic_context(context.topic_keywords)
         
         # Построить промпт
         prompt = self.prompt_builder.build_prompt(
@@ -199,6 +283,8 @@ class AccountManager:
             llm_context["chat_history"],
             user_context,
             topic_context,
+            llm_context["recalled_messages"],
+            llm_context["summary"],
         )
         
         # Сгенерировать ответ
@@ -213,30 +299,31 @@ class AccountManager:
             
             # Обновить статистику
             self.stats["messages_responded"] += 1
+            self.decision_engine.activity.record_response(context.chat_id)
             
             # Обновить память
-            self.memory_manager.update_user_interaction(
+            await self.memory_manager.update_user_interaction(
                 context.user_id,
                 context,
                 response_sent=True,
             )
             
             # Обновить память о темах
-            for keyword in context.topic_keywords:
-                self.memory_manager.update_topic_discussion(keyword)
+            await self.memory_manager.update_topic_discussions(context.topic_keywords)
             
             # Записать в лог
-            self.memory_manager.log_interaction(
+            await self.memory_manager.log_interaction(
                 context.chat_id,
                 "message",
                 message_id,
                 response_text=response_text,
                 importance_score=decision.importance_score,
                 decision_reason=decision.reason,
+                reason_class=decision.reason_class,
             )
             
             # Эволюция личности
-            self.personality_engine.evolve_from_interaction(
+            await self.personality_engine.evolve_from_interaction(
                 "responded",
                 {
                     "user_id": context.user_id,
@@ -273,19 +360,26 @@ class AccountManager:
         
         return text
 
-    def _get_recent_responses_count(self, chat_id: str, minutes: int = 60) -> int:
-        """Получить количество недавних ответов"""
-        return self.memory_manager.get_recent_messages_count(chat_id, minutes)
-
-    def get_stats(self) -> Dict[str, Any]:
+    async def get_stats(self) -> Dict[str, Any]:
         """Получить статистику аккаунта"""
-        # Получить актуальный статус аккаунта из базы данных
-        account = self.db.get_account(self.account_id)
+        # Актуальный статус аккаунта и накопленные счетчики - в потоках чтения БД
+        account, account_stats = await asyncio.gather(
+            self.async_db.get_account(self.account_id),
+            self.async_db.get_account_stats(self.account_id),
+        )
+        stats = account_stats.to_dict()
+        stats["session"] = {
+            **self.stats,
+            "last_activity": self.stats["last_activity"].isoformat() if self.stats["last_activity"] else None,
+        }
+        stats["memory_cache"] = self.memory_manager.get_cache_stats()
+        stats["chat_summaries"] = dict(self.summarizer.stats)
         return {
             "id": self.account_id,
             "phone_number": account.phone_number if account else "N/A",
             "is_active": account.is_active if account else False,
-            **self.stats,
+            "is_running": True,
             "profile": self.profile.to_dict(),
+            "stats": stats,
         }
 
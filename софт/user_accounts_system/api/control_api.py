@@ -2,11 +2,11 @@
 REST API для управления системой извне
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List, Dict, Any
 import asyncio
 from pathlib import Path
@@ -27,6 +27,11 @@ class PersonalityUpdate(BaseModel):
     constraints: Optional[Dict[str, Any]] = None
 
 
+class RetentionUpdate(BaseModel):
+    max_age_days: Optional[int] = Field(None, ge=1)
+    max_rows_per_chat: Optional[int] = Field(None, ge=1)
+
+
 class AccountResponse(BaseModel):
     id: int
     phone_number: str
@@ -63,13 +68,13 @@ def create_app(orchestrator: Orchestrator) -> FastAPI:
     @app.get("/accounts", response_model=List[AccountResponse])
     async def get_accounts():
         """Получить список всех аккаунтов"""
-        accounts_info = orchestrator.get_all_accounts_info()
+        accounts_info = await orchestrator.get_all_accounts_info()
         return accounts_info
     
     @app.get("/accounts/{account_id}")
     async def get_account(account_id: int):
         """Получить информацию об аккаунте"""
-        stats = orchestrator.get_account_stats(account_id)
+        stats = await orchestrator.get_account_stats(account_id)
         if not stats:
             raise HTTPException(status_code=404, detail="Account not found")
         return stats
@@ -109,7 +114,7 @@ def create_app(orchestrator: Orchestrator) -> FastAPI:
     @app.get("/accounts/{account_id}/profile")
     async def get_profile(account_id: int):
         """Получить профиль личности"""
-        stats = orchestrator.get_account_stats(account_id)
+        stats = await orchestrator.get_account_stats(account_id)
         if not stats:
             raise HTTPException(status_code=404, detail="Account not found")
         
@@ -276,6 +281,26 @@ def create_app(orchestrator: Orchestrator) -> FastAPI:
 
         return {"message": "Personality unlocked", "profile": profile.to_dict()}
     
+    @app.get("/accounts/{account_id}/profile/evolution")
+    async def get_profile_evolution(
+        account_id: int,
+        parameter: str,
+        days: Optional[int] = Query(None, ge=1),
+        buckets: int = Query(100, ge=1, le=1000),
+    ):
+        """Ряд значений параметра личности за последние дни (или за всё время)"""
+        from datetime import datetime, timedelta
+
+        account = await orchestrator.async_db.get_account(account_id)
+        if not account:
+            raise HTTPException(status_code=404, detail="Account not found")
+
+        since = datetime.now() - timedelta(days=days) if days else None
+        points = await orchestrator.async_db.get_evolution_series(
+            account_id, parameter, since=since, buckets=buckets
+        )
+        return {"parameter": parameter, "points": [point.to_dict() for point in points]}
+    
     @app.get("/accounts/{account_id}/memory")
     async def get_memory(account_id: int, chat_id: Optional[str] = None):
         """Получить память аккаунта"""
@@ -286,25 +311,151 @@ def create_app(orchestrator: Orchestrator) -> FastAPI:
         memory = manager.memory_manager
         
         if chat_id:
-            history = memory.get_chat_history(chat_id, limit=50)
+            history = await memory.get_chat_history(chat_id, limit=50)
             return {"chat_history": [msg.to_dict() for msg in history]}
         else:
             # Вернуть общую информацию о памяти
             return {"message": "Use ?chat_id=... to get specific chat history"}
     
+    @app.get("/accounts/{account_id}/memory/history")
+    async def get_memory_history(
+        account_id: int,
+        chat_id: str,
+        before: Optional[str] = None,
+        after: Optional[str] = None,
+        limit: int = Query(50, ge=1, le=500),
+    ):
+        """Постранично листать историю чата (курсоры before/after из предыдущей страницы)"""
+        account = await orchestrator.async_db.get_account(account_id)
+        if not account:
+            raise HTTPException(status_code=404, detail="Account not found")
+
+        try:
+            page = await orchestrator.async_db.get_chat_history_page(
+                account_id, chat_id, before=before, after=after, limit=limit
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return page.to_dict()
+
+    @app.get("/accounts/{account_id}/interactions")
+    async def get_interactions(
+        account_id: int,
+        chat_id: Optional[str] = None,
+        action_type: Optional[str] = None,
+        min_score: Optional[float] = None,
+        max_score: Optional[float] = None,
+        before: Optional[str] = None,
+        after: Optional[str] = None,
+        limit: int = Query(50, ge=1, le=500),
+    ):
+        """Постранично листать лог взаимодействий с фильтрами по чату, действию и оценке"""
+        account = await orchestrator.async_db.get_account(account_id)
+        if not account:
+            raise HTTPException(status_code=404, detail="Account not found")
+
+        try:
+            page = await orchestrator.async_db.get_interaction_log_page(
+                account_id,
+                chat_id=chat_id,
+                action_type=action_type,
+                min_score=min_score,
+                max_score=max_score,
+                before=before,
+                after=after,
+                limit=limit,
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return page.to_dict()
+
+    @app.get("/accounts/{account_id}/interactions/summary")
+    async def get_interactions_summary(
+        account_id: int,
+        hours: int = Query(24, ge=1, le=24 * 90),
+        chat_id: Optional[str] = None,
+    ):
+        """Число решений за последние часы: итоги по действиям/причинам и почасовой ряд"""
+        from datetime import datetime, timedelta
+        from ..database.models import INTERACTION_ACTIONS
+
+        account = await orchestrator.async_db.get_account(account_id)
+        if not account:
+            raise HTTPException(status_code=404, detail="Account not found")
+
+        since = datetime.now() - timedelta(hours=hours)
+        counters = await orchestrator.async_db.get_interaction_counters(
+            account_id, since=since, chat_id=chat_id
+        )
+        # Все действия, в том числе без решений за период (defer - отдельно от ignore)
+        totals: Dict[str, Dict[str, int]] = {action: {} for action in INTERACTION_ACTIONS}
+        for counter in counters:
+            by_reason = totals.setdefault(counter.action_type, {})
+            by_reason[counter.reason_class] = by_reason.get(counter.reason_class, 0) + counter.total
+        return {
+            "since": since.isoformat(),
+            "totals": totals,
+            "hourly": [counter.to_dict() for counter in counters],
+        }
+
     @app.post("/accounts/{account_id}/memory/clear")
     async def clear_memory(account_id: int, chat_id: Optional[str] = None):
-        """Очистить память (не реализовано полностью)"""
-        return {"message": "Memory clearing not fully implemented"}
+        """Очистить историю сообщений аккаунта (или одного чата)"""
+        account = await orchestrator.async_db.get_account(account_id)
+        if not account:
+            raise HTTPException(status_code=404, detail="Account not found")
+
+        # По порции на вызов потока записи, как в RetentionPruner: очередь
+        # остальных записей не ждет окончания всей очистки
+        deleted, batch_size = 0, 5000
+        while True:
+            batch = await orchestrator.async_db.delete_chat_memory_batch(account_id, chat_id, batch_size)
+            deleted += batch
+            if batch < batch_size:
+                break
+        await orchestrator.async_db.delete_chat_summaries(account_id, chat_id)
+        await orchestrator.forget_chat_memory(account_id, chat_id)
+
+        return {"message": "Memory cleared", "deleted": deleted}
+
+    @app.get("/accounts/{account_id}/retention")
+    async def get_retention(account_id: int):
+        """Получить политику хранения истории"""
+        policy = await orchestrator.async_db.get_retention_policy(account_id)
+        if not policy:
+            return {"account_id": account_id, "max_age_days": None, "max_rows_per_chat": None}
+        return policy.to_dict()
+
+    @app.put("/accounts/{account_id}/retention")
+    async def update_retention(account_id: int, update: RetentionUpdate):
+        """Задать политику хранения истории (max_age_days, max_rows_per_chat)"""
+        from ..database.models import RetentionPolicy
+
+        account = await orchestrator.async_db.get_account(account_id)
+        if not account:
+            raise HTTPException(status_code=404, detail="Account not found")
+
+        policy = RetentionPolicy(
+            account_id=account_id,
+            max_age_days=update.max_age_days,
+            max_rows_per_chat=update.max_rows_per_chat,
+        )
+        await orchestrator.async_db.set_retention_policy(policy)
+        return {"message": "Retention policy updated", "policy": policy.to_dict()}
     
     @app.get("/accounts/{account_id}/stats")
     async def get_stats(account_id: int):
         """Получить статистику аккаунта"""
-        stats = orchestrator.get_account_stats(account_id)
+        stats = await orchestrator.get_account_stats(account_id)
         if not stats:
             raise HTTPException(status_code=404, detail="Account not found")
         return stats
 
+    @app.get("/system/stats")
+    async def get_system_stats():
+        """Получить системную статистику (задержка event loop и т.д.)"""
+        return orchestrator.get_system_stats()
+
     @app.post("/accounts/check_sessions")
     async def check_all_sessions():
         """Проверить действительность сессий всех аккаунтов"""
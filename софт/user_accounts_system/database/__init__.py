@@ -9,9 +9,17 @@ from .models import (
     DynamicPersonalityConfig,
     PersonalityConstraints,
     ChatMessage,
+    ChatSearchResult,
+    ChatSummary,
     UserProfile,
     TopicMemory,
     InteractionLog,
+    INTERACTION_ACTIONS,
+    InteractionCounter,
+    AccountStats,
+    EvolutionPoint,
+    Page,
+    RetentionPolicy,
 )
 
 __all__ = [
@@ -21,8 +29,16 @@ __all__ = [
     "DynamicPersonalityConfig",
     "PersonalityConstraints",
     "ChatMessage",
+    "ChatSearchResult",
+    "ChatSummary",
     "UserProfile",
     "TopicMemory",
     "InteractionLog",
+    "INTERACTION_ACTIONS",
+    "InteractionCounter",
+    "AccountStats",
+    "EvolutionPoint",
+    "Page",
+    "RetentionPolicy",
 ]
 
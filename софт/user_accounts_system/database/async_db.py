@@ -0,0 +1,75 @@
+"""
+Асинхронный фасад над DatabaseManager для asyncio-конвейера
+"""
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from .db_manager import DatabaseManager
+
+
+class AsyncDatabaseManager:
+    """
+    Неблокирующий доступ к DatabaseManager из корутин.
+
+    Запись выполняется в одном выделенном потоке (SQLite допускает только
+    одного писателя, так что очередь в один поток снимает конкуренцию за
+    блокировку), чтение - в пуле потоков. Каждый поток использует своё
+    соединение из ConnectionPool, схема БД не меняется.
+
+    Любой публичный метод DatabaseManager доступен как корутина:
+        profile = await async_db.get_or_create_user_profile(account_id, user_id)
+    """
+
+    # Методы с этими префиксами только читают и могут выполняться параллельно
+    READ_PREFIXES = ("get_", "search_", "find_", "count_")
+    # ...кроме тех, что создают записи при отсутствии
+    WRITE_PREFIXES = ("get_or_create_",)
+
+    def __init__(self, db_manager: DatabaseManager, read_workers: int = 4):
+        """
+        Args:
+            db_manager: Синхронный менеджер БД
+            read_workers: Количество потоков для чтения
+        """
+        self.db = db_manager
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+        self._readers = ThreadPoolExecutor(max_workers=read_workers, thread_name_prefix="db-reader")
+
+    @classmethod
+    def is_read_method(cls, name: str) -> bool:
+        """Проверить, является ли метод DatabaseManager чтением"""
+        if name.startswith(cls.WRITE_PREFIXES):
+            return False
+        return name.startswith(cls.READ_PREFIXES)
+
+    async def run_read(self, func: Callable, *args, **kwargs) -> Any:
+        """Выполнить функцию в пуле потоков чтения"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._readers, functools.partial(func, *args, **kwargs))
+
+    async def run_write(self, func: Callable, *args, **kwargs) -> Any:
+        """Выполнить функцию в потоке записи"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._writer, functools.partial(func, *args, **kwargs))
+
+    def __getattr__(self, name: str):
+        attr = getattr(self.db, name)
+        if name.startswith("_") or not callable(attr):
+            return attr
+
+        runner = self.run_read if self.is_read_method(name) else self.run_write
+
+        async def method(*args, **kwargs):
+            return await runner(attr, *args, **kwargs)
+
+        method.__name__ = name
+        method.__doc__ = attr.__doc__
+        return method
+
+    def close(self):
+        """Дождаться завершения операций и остановить потоки"""
+        self._writer.shutdown(wait=True)
+        self._readers.shutdown(wait=True)
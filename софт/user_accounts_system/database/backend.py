@@ -0,0 +1,164 @@
+"""
+Подключаемые хранилища для DatabaseManager
+
+DatabaseManager пишет запросы на общем подмножестве SQL (плейсхолдеры ?,
+INSERT ... ON CONFLICT, RETURNING), а всё, что различается между СУБД -
+миграции, массовая вставка, полнотекстовый поиск, режим фиксации и
+обслуживание файлов - делегирует хранилищу.
+"""
+
+from abc import ABC, abstractmethod
+from contextlib import AbstractContextManager
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+from .connection_pool import ConnectionPool
+from .migrations import migrate
+
+
+class StorageBackend(ABC):
+    """
+    Интерфейс хранилища
+
+    connection() и transaction() - контекстные менеджеры, отдающие
+    соединение с интерфейсом sqlite3 (execute, executemany, cursor, строки
+    с доступом по индексу и имени колонки).
+    """
+
+    # Можно ли держать данные каждого аккаунта в отдельном хранилище
+    supports_sharding = False
+
+    @abstractmethod
+    def connection(self) -> AbstractContextManager:
+        """Соединение для чтения (без фиксации транзакции)"""
+
+    @abstractmethod
+    def transaction(self) -> AbstractContextManager:
+        """Соединение для записи: commit при успехе, rollback при ошибке"""
+
+    @abstractmethod
+    def close_all(self):
+        """Закрыть все соединения"""
+
+    @abstractmethod
+    def migrate(self) -> int:
+        """Применить недостающие миграции, вернуть версию схемы"""
+
+    @abstractmethod
+    def set_synchronous(self, conn, mode: str):
+        """Режим надежности фиксации для соединения (OFF | NORMAL | FULL)"""
+
+    @abstractmethod
+    def insert_returning_ids(self, conn, table: str, columns: Sequence[str],
+                             rows: List[tuple]) -> List[int]:
+        """Вставить строки и вернуть их id в том же порядке"""
+
+    @abstractmethod
+    def bulk_insert(self, conn, table: str, columns: Sequence[str], rows: List[tuple]):
+        """Вставить много строк самым быстрым для СУБД способом"""
+
+    @abstractmethod
+    def has_full_text_index(self) -> bool:
+        """Есть ли полнотекстовый индекс по chat_memory.message_text"""
+
+    @abstractmethod
+    def full_text_query(self, prefixes: List[str]) -> str:
+        """Запрос полнотекстового поиска по префиксам слов (любой из них)"""
+
+    @abstractmethod
+    def full_text_search_sql(self, columns: str, condition: str) -> str:
+        """
+        SELECT по chat_memory c: columns, фрагмент текста, ранг (меньше - лучше)
+
+        Параметры запроса: (full_text_query, *параметры condition, limit).
+        """
+
+    @abstractmethod
+    def incremental_vacuum(self, pages: int) -> int:
+        """Вернуть ОС часть свободного места, вернуть остаток свободных страниц"""
+
+    @abstractmethod
+    def compact(self):
+        """Разовое полное уплотнение хранилища (при остановленной системе)"""
+
+
+class SQLiteBackend(ConnectionPool, StorageBackend):
+    """Хранилище в файле SQLite (пул долгоживущих соединений, WAL, FTS5)"""
+
+    supports_sharding = True
+
+    def __init__(self, db_path: str, **options):
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        super().__init__(db_path, **options)
+        self._fts_available: Optional[bool] = None
+
+    def migrate(self) -> int:
+        with self.connection() as conn:
+            return migrate(conn)
+
+    def set_synchronous(self, conn, mode: str):
+        conn.execute(f"PRAGMA synchronous={mode.upper()}")
+
+    def insert_returning_ids(self, conn, table: str, columns: Sequence[str],
+                             rows: List[tuple]) -> List[int]:
+        sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        return [conn.execute(sql, row).lastrowid for row in rows]
+
+    def bulk_insert(self, conn, table: str, columns: Sequence[str], rows: List[tuple]):
+        sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        conn.executemany(sql, rows)
+
+    def has_full_text_index(self) -> bool:
+        # SQLite может быть собран без FTS5 - тогда миграция не создает таблицу
+        if self._fts_available is None:
+            with self.connection() as conn:
+                row = conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'chat_memory_fts'"
+                ).fetchone()
+            self._fts_available = row is not None
+        return self._fts_available
+
+    def full_text_query(self, prefixes: List[str]) -> str:
+        # Префиксы в кавычках: спецсимволы синтаксиса FTS5 не мешают
+        return " OR ".join(f'"{prefix}"*' for prefix in prefixes)
+
+    def full_text_search_sql(self, columns: str, condition: str) -> str:
+        return f"""
+            SELECT {columns},
+                   snippet(chat_memory_fts, 0, '[', ']', '…', 12),
+                   bm25(chat_memory_fts)
+            FROM chat_memory_fts f
+            JOIN chat_memory c ON c.id = f.rowid
+            WHERE chat_memory_fts MATCH ? AND {condition}
+            ORDER BY bm25(chat_memory_fts), c.id DESC
+            LIMIT ?
+        """
+
+    def incremental_vacuum(self, pages: int) -> int:
+        with self.connection() as conn:
+            conn.execute(f"PRAGMA incremental_vacuum({int(pages)})").fetchall()
+            return conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+    def compact(self):
+        # Перевод существующей БД в auto_vacuum=INCREMENTAL требует полного VACUUM
+        with self.connection() as conn:
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+                return
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+
+
+def create_backend(url: str, **options) -> StorageBackend:
+    """
+    Создать хранилище по адресу
+
+    Args:
+        url: postgresql://... для PostgreSQL, иначе путь к файлу SQLite
+        **options: Параметры хранилища (synchronous, persistent для SQLite;
+            min_connections, max_connections для PostgreSQL)
+    """
+    if url.startswith(("postgresql://", "postgres://")):
+        from .postgres_backend import PostgresBackend
+
+        return PostgresBackend(url, **options)
+    return SQLiteBackend(url, **options)
@@ -0,0 +1,112 @@
+"""
+Пул долгоживущих соединений SQLite
+"""
+
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import List, Iterator
+
+
+class ConnectionPool:
+    """
+    Пул соединений SQLite.
+
+    Каждый поток получает собственное долгоживущее соединение (sqlite3 не
+    позволяет безопасно делить одно соединение между потоками). Соединения
+    открываются в режиме WAL с настроенным synchronous и кэшем подготовленных
+    выражений, поэтому повторные запросы не компилируются заново.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        synchronous: str = "NORMAL",
+        cached_statements: int = 256,
+        busy_timeout: float = 5.0,
+        cache_size_kb: int = 16384,
+        persistent: bool = True,
+    ):
+        """
+        Args:
+            db_path: Путь к файлу БД
+            synchronous: Режим PRAGMA synchronous (OFF | NORMAL | FULL)
+            cached_statements: Размер кэша подготовленных выражений на соединение
+            busy_timeout: Сколько ждать блокировку записи (секунды)
+            cache_size_kb: Размер страничного кэша SQLite на соединение (KiB)
+            persistent: False - открывать соединение на каждую операцию (старое поведение)
+        """
+        self.db_path = db_path
+        self.synchronous = synchronous.upper()
+        self.cached_statements = cached_statements
+        self.busy_timeout = busy_timeout
+        self.cache_size_kb = cache_size_kb
+        self.persistent = persistent
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: List[sqlite3.Connection] = []
+
+    def _connect(self) -> sqlite3.Connection:
+        """Открыть и настроить новое соединение"""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout,
+            cached_statements=self.cached_statements,
+            check_same_thread=False,
+        )
+        conn.row_factory = sqlite3.Row
+        # Для новой БД включает incremental auto_vacuum (должно идти до перехода в WAL
+        # и создания таблиц); у существующей БД режим так не меняется
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        conn.execute(f"PRAGMA cache_size=-{int(self.cache_size_kb)}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
+    def _thread_connection(self) -> sqlite3.Connection:
+        """Получить соединение текущего потока (создается при первом обращении)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Соединение для чтения (без фиксации транзакции)"""
+        if not self.persistent:
+            conn = self._connect()
+            try:
+                yield conn
+            finally:
+                conn.close()
+            return
+
+        yield self._thread_connection()
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Соединение для записи: commit при успехе, rollback при ошибке"""
+        with self.connection() as conn:
+            try:
+                yield conn
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+
+    def close_all(self):
+        """Закрыть все открытые соединения пула"""
+        with self._lock:
+            connections = self._connections
+            self._connections = []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
@@ -4,337 +4,295 @@
 
 import sqlite3
 import json
+import re
+import threading
 from datetime import datetime
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 from pathlib import Path
 
+from .backend import StorageBackend, SQLiteBackend, create_backend
+from .write_behind import WriteBehindQueue, WriteBehindConfig
+from .timestamps import HOUR_MS, to_epoch_ms, from_epoch_ms, now_ms, hour_start_ms
 from .models import (
     Account,
     PersonalityProfile,
     ChatMessage,
+    ChatSearchResult,
+    ChatSummary,
     UserProfile,
     TopicMemory,
     InteractionLog,
+    INTERACTION_ACTIONS,
+    InteractionCounter,
+    AccountStats,
+    EvolutionPoint,
+    Page,
+    RetentionPolicy,
 )
 
 
 class DatabaseManager:
     """Менеджер для работы с базой данных"""
 
-    def __init__(self, db_path: str = "data/accounts.db"):
+    # Максимум параметров в одном IN (...) для пакетных запросов
+    MAX_BATCH_PARAMS = 500
+
+    def __init__(
+        self,
+        db_path: str = "data/accounts.db",
+        persistent_connections: bool = True,
+        synchronous: str = "NORMAL",
+        sharded: bool = False,
+        shard_dir: Optional[str] = None,
+        backend: Optional[StorageBackend] = None,
+    ):
+        """
+        Args:
+            db_path: Путь к файлу SQLite или postgresql://... (в режиме
+                шардирования - к общему каталогу аккаунтов)
+            persistent_connections: Переиспользовать соединения (False - соединение на каждый запрос)
+            synchronous: Режим надежности фиксации (PRAGMA synchronous) для соединений пула
+            sharded: Хранить данные каждого аккаунта в отдельном файле БД (только SQLite)
+            shard_dir: Папка файлов аккаунтов (по умолчанию shards/ рядом с db_path)
+            backend: Готовое хранилище (по умолчанию создается по db_path)
+        """
         self.db_path = db_path
-        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._pool_options = {
+            "synchronous": synchronous,
+            "persistent": persistent_connections,
+        }
+        self.pool: StorageBackend = backend or create_backend(db_path, **self._pool_options)
+
+        # Шарды: account_id -> хранилище файла аккаунта
+        if sharded and not self.pool.supports_sharding:
+            raise ValueError(f"{type(self.pool).__name__} does not support sharding")
+        self.sharded = sharded
+        self.shard_dir = Path(shard_dir) if shard_dir else Path(db_path).parent / "shards"
+        self._shards: Dict[int, StorageBackend] = {}
+        self._shards_lock = threading.Lock()
+
+        self.write_behind: Optional[WriteBehindQueue] = None
         self._init_database()
 
-    def _init_database(self):
-        """Инициализация структуры БД"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def close(self):
+        """Закрыть все соединения с БД"""
+        if self.write_behind:
+            self.write_behind.close()
+        for pool in self._pools():
+            pool.close_all()
 
-        # Проверить, существует ли старая таблица с уникальным ограничением
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='accounts';")
-        table_exists = cursor.fetchone()
-
-        if table_exists:
-            # Проверить, есть ли уникальное ограничение
-            cursor.execute("PRAGMA table_info(accounts)")
-            columns_info = cursor.fetchall()
-
-            # Проверить, есть ли уникальное ограничение на phone_number
-            # Получить SQL определение таблицы
-            cursor.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name='accounts';")
-            table_sql = cursor.fetchone()
-
-            if table_sql and 'UNIQUE' in table_sql[0]:
-                # Создать новую таблицу без уникального ограничения
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS accounts_new (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        phone_number TEXT NOT NULL,
-                        session_file TEXT NOT NULL,
-                        is_active BOOLEAN DEFAULT TRUE,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        last_seen TIMESTAMP,
-                        api_id INTEGER,
-                        api_hash TEXT,
-                        session_string TEXT
-                    )
-                """)
+    # === Sharding ===
 
-                # Скопировать данные из старой таблицы в новую
-                cursor.execute("""
-                    INSERT INTO accounts_new (id, phone_number, session_file, is_active, created_at, last_seen)
-                    SELECT id, phone_number, session_file, is_active, created_at, last_seen FROM accounts
-                """)
+    def shard_path(self, account_id: int) -> Path:
+        """Путь к файлу БД аккаунта в режиме шардирования"""
+        return self.shard_dir / f"account_{int(account_id)}.db"
 
-                # Удалить старую таблицу
-                cursor.execute("DROP TABLE accounts")
+    def _pool_for(self, account_id: int) -> StorageBackend:
+        """
+        Пул соединений, в котором хранятся данные аккаунта
+        
+        Без шардирования это общий пул. С шардированием у каждого аккаунта
+        свой файл (со своей блокировкой записи); он создается и мигрирует
+        при первом обращении.
+        """
+        if not self.sharded:
+            return self.pool
 
-                # Переименовать новую таблицу
-                cursor.execute("ALTER TABLE accounts_new RENAME TO accounts")
-            else:
-                # Проверить, существуют ли новые колонки, и добавить их, если нет
-                cursor.execute("PRAGMA table_info(accounts)")
-                columns = [column[1] for column in cursor.fetchall()]
-
-                if 'api_id' not in columns:
-                    cursor.execute("ALTER TABLE accounts ADD COLUMN api_id INTEGER")
-                if 'api_hash' not in columns:
-                    cursor.execute("ALTER TABLE accounts ADD COLUMN api_hash TEXT")
-                if 'session_string' not in columns:
-                    cursor.execute("ALTER TABLE accounts ADD COLUMN session_string TEXT")
+        pool = self._shards.get(account_id)
+        if pool is not None:
+            return pool
+
+        with self._shards_lock:
+            pool = self._shards.get(account_id)
+            if pool is None:
+                pool = SQLiteBackend(str(self.shard_path(account_id)), **self._pool_options)
+                pool.migrate()
+                self._shards[account_id] = pool
+        return pool
+
+    def _pools(self, all_accounts: bool = False) -> List[StorageBackend]:
+        """Общий пул и пулы шардов (открытых или, с all_accounts, всех аккаунтов каталога)"""
+        if all_accounts and self.sharded:
+            for account in self.get_all_accounts():
+                self._pool_for(account.id)
+        with self._shards_lock:
+            return [self.pool, *self._shards.values()]
+
+    def _group_by_pool(self, rows: list) -> Dict[StorageBackend, list]:
+        """Разложить модели с полем account_id по хранилищам их аккаунтов"""
+        groups: Dict[StorageBackend, list] = {}
+        for row in rows:
+            groups.setdefault(self._pool_for(row.account_id), []).append(row)
+        return groups
+
+    # === Write-behind ===
+
+    def enable_write_behind(self, config: Optional[WriteBehindConfig] = None) -> WriteBehindQueue:
+        """Включить отложенную групповую запись chat_memory и interaction_log"""
+        if self.write_behind is None:
+            self.write_behind = WriteBehindQueue(self, config)
+        self.write_behind.start()
+        return self.write_behind
+
+    def queue_chat_message(self, message: ChatMessage):
+        """Сохранить сообщение через очередь (или сразу, если очередь выключена)"""
+        if self.write_behind:
+            self.write_behind.put_message(message)
         else:
-            # Создать новую таблицу с правильной структурой
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS accounts (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    phone_number TEXT NOT NULL,
-                    session_file TEXT NOT NULL,
-                    is_active BOOLEAN DEFAULT TRUE,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    last_seen TIMESTAMP,
-                    api_id INTEGER,
-                    api_hash TEXT,
-                    session_string TEXT
-                )
-            """)
+            self.save_chat_message(message)
 
-        # Закрыть соединение и открыть новое для остальных таблиц
-        conn.commit()
-        conn.close()
+    def queue_interaction(self, interaction: InteractionLog):
+        """Записать взаимодействие через очередь (или сразу, если очередь выключена)"""
+        if self.write_behind:
+            self.write_behind.put_interaction(interaction)
+        else:
+            self.write_batch([], [interaction])
 
-        # Открыть новое соединение для создания остальных таблиц
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def flush_pending(self) -> int:
+        """Записать всё, что ждет в очереди, вернуть число строк"""
+        if self.write_behind:
+            return self.write_behind.flush()
+        return 0
 
-        # Таблица профилей личности
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS personality_profiles (
-                account_id INTEGER PRIMARY KEY,
-                base_config TEXT NOT NULL,
-                dynamic_config TEXT NOT NULL,
-                constraints_config TEXT NOT NULL,
-                evolution_enabled BOOLEAN DEFAULT TRUE,
-                personality_locked BOOLEAN DEFAULT FALSE,
-                last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (account_id) REFERENCES accounts(id)
-            )
-        """)
-
-        # Таблица памяти чатов
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS chat_memory (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                account_id INTEGER NOT NULL,
-                chat_id TEXT NOT NULL,
-                message_id INTEGER,
-                user_id TEXT,
-                username TEXT,
-                message_text TEXT,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                is_reply_to INTEGER,
-                context_data TEXT,
-                FOREIGN KEY (account_id) REFERENCES accounts(id)
-            )
-        """)
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_chat_memory_account_chat 
-            ON chat_memory(account_id, chat_id, timestamp)
-        """)
-
-        # Таблица профилей пользователей
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS user_profiles (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                account_id INTEGER NOT NULL,
-                user_id TEXT NOT NULL,
-                username TEXT,
-                interaction_count INTEGER DEFAULT 0,
-                last_interaction TIMESTAMP,
-                communication_style TEXT,
-                relationship_score REAL DEFAULT 0.5,
-                notes TEXT,
-                FOREIGN KEY (account_id) REFERENCES accounts(id),
-                UNIQUE(account_id, user_id)
-            )
-        """)
-
-        # Таблица памяти тем
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS topic_memory (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                account_id INTEGER NOT NULL,
-                topic_keyword TEXT NOT NULL,
-                position TEXT,
-                priority REAL DEFAULT 0.5,
-                last_discussed TIMESTAMP,
-                discussion_count INTEGER DEFAULT 0,
-                FOREIGN KEY (account_id) REFERENCES accounts(id),
-                UNIQUE(account_id, topic_keyword)
-            )
-        """)
-
-        # Таблица лога взаимодействий
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS interaction_log (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                account_id INTEGER NOT NULL,
-                chat_id TEXT NOT NULL,
-                action_type TEXT NOT NULL,
-                message_id INTEGER,
-                response_text TEXT,
-                importance_score REAL,
-                decision_reason TEXT,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (account_id) REFERENCES accounts(id)
-            )
-        """)
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_interaction_log_account_time 
-            ON interaction_log(account_id, timestamp)
-        """)
-
-        # Таблица истории эволюции
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS evolution_history (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                account_id INTEGER NOT NULL,
-                parameter_name TEXT NOT NULL,
-                old_value REAL,
-                new_value REAL,
-                reason TEXT,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (account_id) REFERENCES accounts(id)
-            )
-        """)
+    def _flush_before_read(self, account_id: int, chat_id: Optional[str] = None):
+        """
+        Записать ожидающие строки аккаунта (или чата) перед чтением, чтобы
+        видеть собственные записи
 
-        conn.commit()
-        conn.close()
+        Строки других аккаунтов остаются в очереди до группового сброса:
+        чтение из пула потоков не фиксирует чужие группы параллельно с
+        потоком записи, а без своих ожидающих строк ничего не пишет.
+        """
+        if self.write_behind and self.write_behind.pending:
+            self.write_behind.flush_for(account_id, chat_id)
+
+    def _init_database(self):
+        """Инициализация структуры БД (применение недостающих миграций)"""
+        self.pool.migrate()
 
     # === Account methods ===
 
     def create_account(self, account: Account) -> int:
         """Создать новый аккаунт"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO accounts (phone_number, session_file, is_active, created_at, last_seen, api_id, api_hash, session_string)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            account.phone_number,
-            account.session_file,
-            account.is_active,
-            account.created_at or datetime.now(),
-            account.last_seen,
-            account.api_id,
-            account.api_hash,
-            account.session_string
-        ))
-        account_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
-        return account_id
+        with self.pool.transaction() as conn:
+            return self.pool.insert_returning_ids(conn, "accounts", (
+                "phone_number", "session_file", "is_active", "created_at",
+                "last_seen", "api_id", "api_hash", "session_string",
+            ), [(
+                account.phone_number,
+                account.session_file,
+                account.is_active,
+                to_epoch_ms(account.created_at) if account.created_at else now_ms(),
+                to_epoch_ms(account.last_seen),
+                account.api_id,
+                account.api_hash,
+                account.session_string
+            )])[0]
 
     def update_account(self, account: Account):
         """Обновить аккаунт"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("""
-            UPDATE accounts
-            SET phone_number = ?, session_file = ?, is_active = ?, last_seen = ?, api_id = ?, api_hash = ?, session_string = ?
-            WHERE id = ?
-        """, (
-            account.phone_number,
-            account.session_file,
-            account.is_active,
-            account.last_seen,
-            account.api_id,
-            account.api_hash,
-            account.session_string,
-            account.id
-        ))
-        conn.commit()
-        conn.close()
+        with self.pool.transaction() as conn:
+            conn.execute("""
+                UPDATE accounts
+                SET phone_number = ?, session_file = ?, is_active = ?, last_seen = ?, api_id = ?, api_hash = ?, session_string = ?
+                WHERE id = ?
+            """, (
+                account.phone_number,
+                account.session_file,
+                account.is_active,
+                to_epoch_ms(account.last_seen),
+                account.api_id,
+                account.api_hash,
+                account.session_string,
+                account.id
+            ))
 
     def get_account(self, account_id: int) -> Optional[Account]:
         """Получить аккаунт по ID"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM accounts WHERE id = ?", (account_id,))
-        row = cursor.fetchone()
-        conn.close()
+        with self.pool.connection() as conn:
+            row = conn.execute("SELECT * FROM accounts WHERE id = ?", (account_id,)).fetchone()
 
         if not row:
             return None
 
+        return self._row_to_account(row)
+
+    def get_all_accounts(self) -> List[Account]:
+        """Получить все аккаунты"""
+        with self.pool.connection() as conn:
+            rows = conn.execute("SELECT * FROM accounts").fetchall()
+
+        return [self._row_to_account(row) for row in rows]
+
+    @staticmethod
+    def _row_to_account(row: sqlite3.Row) -> Account:
+        """Преобразовать строку таблицы accounts в модель"""
         return Account(
             id=row["id"],
             phone_number=row["phone_number"],
             session_file=row["session_file"],
             is_active=bool(row["is_active"]),
-            created_at=datetime.fromisoformat(row["created_at"]) if row["created_at"] else None,
-            last_seen=datetime.fromisoformat(row["last_seen"]) if row["last_seen"] else None,
+            created_at=from_epoch_ms(row["created_at"]),
+            last_seen=from_epoch_ms(row["last_seen"]),
             api_id=row["api_id"] if "api_id" in row.keys() else None,
             api_hash=row["api_hash"] if "api_hash" in row.keys() else None,
             session_string=row["session_string"] if "session_string" in row.keys() else None,
         )
 
-    def get_all_accounts(self) -> List[Account]:
-        """Получить все аккаунты"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM accounts")
-        rows = cursor.fetchall()
-        conn.close()
+    # === Personality Profile methods ===
 
-        return [
-            Account(
-                id=row["id"],
-                phone_number=row["phone_number"],
-                session_file=row["session_file"],
-                is_active=bool(row["is_active"]),
-                created_at=datetime.fromisoformat(row["created_at"]) if row["created_at"] else None,
-                last_seen=datetime.fromisoformat(row["last_seen"]) if row["last_seen"] else None,
-                api_id=row["api_id"] if "api_id" in row.keys() else None,
-                api_hash=row["api_hash"] if "api_hash" in row.keys() else None,
-                session_string=row["session_string"] if "session_string" in row.keys() else None,
+    def save_personality_profile(self, profile: PersonalityProfile):
+        """
+        Сохранить профиль личности
+        
+        topic_priorities и user_relationships хранятся в отдельных таблицах и
+        обновляются построчно через upsert_personality_scores.
+        """
+        with self._pool_for(profile.account_id).transaction() as conn:
+            conn.execute("""
+                INSERT INTO personality_profiles 
+                (account_id, base_config, dynamic_config, constraints_config, 
+                 evolution_enabled, personality_locked, last_updated)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(account_id) DO UPDATE SET
+                    base_config = excluded.base_config,
+                    dynamic_config = excluded.dynamic_config,
+                    constraints_config = excluded.constraints_config,
+                    evolution_enabled = excluded.evolution_enabled,
+                    personality_locked = excluded.personality_locked,
+                    last_updated = excluded.last_updated
+            """, (
+                profile.account_id,
+                json.dumps(profile.base.to_dict()),
+                json.dumps(profile.dynamic.to_scalar_dict()),
+                json.dumps(profile.constraints.to_dict()),
+                profile.constraints.evolution_enabled,
+                profile.constraints.personality_locked,
+                now_ms(),
+            ))
+            # Словари, созданные в памяти (а не загруженные из БД), сохраняются целиком
+            self._upsert_personality_scores(
+                conn,
+                profile.account_id,
+                self._unsynced_scores(profile.dynamic.topic_priorities),
+                self._unsynced_scores(profile.dynamic.user_relationships),
             )
-            for row in rows
-        ]
 
-    # === Personality Profile methods ===
+    @staticmethod
+    def _unsynced_scores(scores: Dict[str, float]) -> Optional[Dict[str, float]]:
+        """Словарь оценок, если он не связан с БД (LazyScoreMap обновляется построчно)"""
+        from .models import LazyScoreMap
 
-    def save_personality_profile(self, profile: PersonalityProfile):
-        """Сохранить профиль личности"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT OR REPLACE INTO personality_profiles 
-            (account_id, base_config, dynamic_config, constraints_config, 
-             evolution_enabled, personality_locked, last_updated)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (
-            profile.account_id,
-            json.dumps(profile.base.to_dict()),
-            json.dumps(profile.dynamic.to_dict()),
-            json.dumps(profile.constraints.to_dict()),
-            profile.constraints.evolution_enabled,
-            profile.constraints.personality_locked,
-            datetime.now()
-        ))
-        conn.commit()
-        conn.close()
+        if isinstance(scores, LazyScoreMap):
+            return None
+        return scores
 
     def get_personality_profile(self, account_id: int) -> Optional[PersonalityProfile]:
-        """Получить профиль личности"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM personality_profiles WHERE account_id = ?", (account_id,))
-        row = cursor.fetchone()
-        conn.close()
+        """Получить профиль личности (словари оценок загружаются лениво)"""
+        with self._pool_for(account_id).connection() as conn:
+            row = conn.execute(
+                "SELECT * FROM personality_profiles WHERE account_id = ?", (account_id,)
+            ).fetchone()
 
         if not row:
             return None
@@ -347,223 +305,769 @@ class DatabaseManager:
             BasePersonalityConfig,
             DynamicPersonalityConfig,
             PersonalityConstraints,
+            LazyScoreMap,
+        )
+
+        for key in DynamicPersonalityConfig.SCORE_MAPS:
+            dynamic_config.pop(key, None)
+        dynamic = DynamicPersonalityConfig(
+            **dynamic_config,
+            topic_priorities=LazyScoreMap(loader=lambda: self.get_topic_priorities(account_id)),
+            user_relationships=LazyScoreMap(loader=lambda: self.get_user_relationships(account_id)),
         )
 
         profile = PersonalityProfile(
             account_id=account_id,
             base=BasePersonalityConfig(**base_config),
-            dynamic=DynamicPersonalityConfig(**dynamic_config),
+            dynamic=dynamic,
             constraints=PersonalityConstraints(**constraints_config),
-            last_updated=datetime.fromisoformat(row["last_updated"]) if row["last_updated"] else None,
+            last_updated=from_epoch_ms(row["last_updated"]),
         )
         return profile
 
+    def get_topic_priorities(self, account_id: int) -> Dict[str, float]:
+        """Получить приоритеты тем личности"""
+        with self._pool_for(account_id).connection() as conn:
+            rows = conn.execute(
+                "SELECT topic, priority FROM personality_topic_priorities WHERE account_id = ?",
+                (account_id,),
+            ).fetchall()
+        return {row["topic"]: row["priority"] for row in rows}
+
+    def get_user_relationships(self, account_id: int) -> Dict[str, float]:
+        """Получить отношения личности к пользователям"""
+        with self._pool_for(account_id).connection() as conn:
+            rows = conn.execute(
+                "SELECT user_id, score FROM personality_user_relationships WHERE account_id = ?",
+                (account_id,),
+            ).fetchall()
+        return {row["user_id"]: row["score"] for row in rows}
+
+    def save_personality_evolution(
+        self,
+        profile: PersonalityProfile,
+        topic_priorities: Dict[str, float],
+        user_relationships: Dict[str, float],
+        history: List[Tuple[str, float, float]],
+        reason: str,
+    ):
+        """
+        Сохранить результат одного шага эволюции одной транзакцией
+        
+        Обновляются только скалярные параметры профиля, изменившиеся строки
+        приоритетов тем/отношений (UPSERT) и история эволюции.
+        """
+        with self._pool_for(profile.account_id).transaction() as conn:
+            conn.execute("""
+                UPDATE personality_profiles
+                SET dynamic_config = ?, last_updated = ?
+                WHERE account_id = ?
+            """, (
+                json.dumps(profile.dynamic.to_scalar_dict()),
+                to_epoch_ms(profile.last_updated) if profile.last_updated else now_ms(),
+                profile.account_id,
+            ))
+            self._upsert_personality_scores(conn, profile.account_id, topic_priorities, user_relationships)
+            if history:
+                self._insert_evolution_history(conn, profile.account_id, history, reason)
+
+    def upsert_personality_scores(
+        self,
+        account_id: int,
+        topic_priorities: Dict[str, float] = None,
+        user_relationships: Dict[str, float] = None,
+    ):
+        """Обновить отдельные приоритеты тем и отношения к пользователям"""
+        with self._pool_for(account_id).transaction() as conn:
+            self._upsert_personality_scores(conn, account_id, topic_priorities, user_relationships)
+
+    @staticmethod
+    def _upsert_personality_scores(
+        conn: sqlite3.Connection,
+        account_id: int,
+        topic_priorities: Optional[Dict[str, float]],
+        user_relationships: Optional[Dict[str, float]],
+    ):
+        if topic_priorities:
+            conn.executemany("""
+                INSERT INTO personality_topic_priorities (account_id, topic, priority)
+                VALUES (?, ?, ?)
+                ON CONFLICT(account_id, topic) DO UPDATE SET priority = excluded.priority
+            """, [(account_id, topic, value) for topic, value in topic_priorities.items()])
+        if user_relationships:
+            conn.executemany("""
+                INSERT INTO personality_user_relationships (account_id, user_id, score)
+                VALUES (?, ?, ?)
+                ON CONFLICT(account_id, user_id) DO UPDATE SET score = excluded.score
+            """, [(account_id, user_id, value) for user_id, value in user_relationships.items()])
+
     # === Chat Memory methods ===
 
-    def save_chat_message(self, message: ChatMessage) -> int:
-        """Сохранить сообщение в память"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO chat_memory 
-            (account_id, chat_id, message_id, user_id, username, message_text, 
-             timestamp, is_reply_to, context_data)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
+    # Колонки вставки chat_memory (порядок _chat_message_params)
+    _CHAT_MESSAGE_INSERT_COLUMNS = (
+        "account_id", "chat_id", "message_id", "user_id", "username", "message_text",
+        "timestamp", "is_reply_to", "tone", "is_question",
+    )
+    _MESSAGE_TERM_COLUMNS = ("chat_memory_id", "account_id", "kind", "term")
+
+    # Виды терминов в chat_message_terms
+    TERM_KEYWORD = 0
+    TERM_MENTION = 1
+
+    @staticmethod
+    def _chat_message_params(message: ChatMessage) -> tuple:
+        return (
             message.account_id,
             message.chat_id,
             message.message_id,
             message.user_id,
             message.username,
             message.message_text,
-            message.timestamp or datetime.now(),
+            to_epoch_ms(message.timestamp) if message.timestamp else now_ms(),
             message.is_reply_to,
-            json.dumps(message.context_data),
-        ))
-        message_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
-        return message_id
+            message.tone,
+            1 if message.is_question else 0,
+        )
+
+    def _insert_chat_messages(self, pool: StorageBackend, conn: sqlite3.Connection,
+                              messages: List[ChatMessage]) -> List[int]:
+        """Вставить сообщения и их термины в текущей транзакции, вернуть id строк"""
+        ids = pool.insert_returning_ids(
+            conn,
+            "chat_memory",
+            self._CHAT_MESSAGE_INSERT_COLUMNS,
+            [self._chat_message_params(message) for message in messages],
+        )
+        # dict: повтор слова в одном сообщении не нарушает первичный ключ
+        terms = {}
+        for row_id, message in zip(ids, messages):
+            for kind, values in ((self.TERM_KEYWORD, message.topic_keywords),
+                                 (self.TERM_MENTION, message.mentions)):
+                for term in values or ():
+                    terms[(row_id, message.account_id, kind, term)] = None
+        if terms:
+            pool.bulk_insert(conn, "chat_message_terms", self._MESSAGE_TERM_COLUMNS, list(terms))
+        return ids
+
+    def save_chat_message(self, message: ChatMessage) -> int:
+        """Сохранить сообщение в память"""
+        pool = self._pool_for(message.account_id)
+        with pool.transaction() as conn:
+            self._add_to_account_stats(conn, [message], [])
+            return self._insert_chat_messages(pool, conn, [message])[0]
+
+    def save_chat_messages(self, messages: List[ChatMessage]):
+        """Сохранить несколько сообщений одной транзакцией"""
+        if messages:
+            self.write_batch(messages, [])
+
+    # Порядок колонок совпадает с порядком полей ChatMessage (см. _decode_chat_messages)
+    _CHAT_MESSAGE_COLUMNS = (
+        "id", "account_id", "chat_id", "message_id", "user_id", "username",
+        "message_text", "timestamp", "is_reply_to", "tone", "is_question",
+    )
+    _CHAT_MESSAGE_SELECT = ", ".join(_CHAT_MESSAGE_COLUMNS)
+
+    @staticmethod
+    def _fetch_tuples(conn: sqlite3.Connection, sql: str, params) -> List[tuple]:
+        """Выполнить запрос, вернув строки кортежами (без sqlite3.Row) - для горячих чтений"""
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        return cursor.execute(sql, params).fetchall()
+
+    def _decode_chat_messages(self, conn: sqlite3.Connection, rows: List[tuple]) -> List[ChatMessage]:
+        """
+        Собрать ChatMessage из кортежей _CHAT_MESSAGE_COLUMNS
+        
+        Модели создаются позиционно, время - из целых миллисекунд без разбора
+        строк; термины всех сообщений подгружаются одним запросом на порцию.
+        """
+        fromtimestamp = datetime.fromtimestamp
+        messages = {}
+        for (row_id, account_id, chat_id, message_id, user_id, username,
+             message_text, timestamp, is_reply_to, tone, is_question) in rows:
+            messages[row_id] = ChatMessage(
+                row_id, account_id, chat_id, message_id, user_id, username, message_text,
+                fromtimestamp(timestamp / 1000) if timestamp is not None else None,
+                is_reply_to, tone, bool(is_question), [], [],
+            )
+
+        ids = list(messages)
+        for start in range(0, len(ids), self.MAX_BATCH_PARAMS):
+            chunk = ids[start:start + self.MAX_BATCH_PARAMS]
+            placeholders = ",".join("?" * len(chunk))
+            for message_row_id, kind, term in self._fetch_tuples(conn, f"""
+                SELECT chat_memory_id, kind, term FROM chat_message_terms
+                WHERE chat_memory_id IN ({placeholders})
+            """, chunk):
+                message = messages[message_row_id]
+                if kind == self.TERM_KEYWORD:
+                    message.topic_keywords.append(term)
+                else:
+                    message.mentions.append(term)
+
+        return list(messages.values())
 
     def get_chat_history(self, account_id: int, chat_id: str, limit: int = 50) -> List[ChatMessage]:
         """Получить историю чата"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT * FROM chat_memory 
-            WHERE account_id = ? AND chat_id = ?
-            ORDER BY timestamp DESC
+        self._flush_before_read(account_id, chat_id)
+        with self._pool_for(account_id).connection() as conn:
+            rows = self._fetch_tuples(conn, f"""
+                SELECT {self._CHAT_MESSAGE_SELECT} FROM chat_memory 
+                WHERE account_id = ? AND chat_id = ?
+                ORDER BY timestamp DESC
+                LIMIT ?
+            """, (account_id, chat_id, limit))
+            messages = self._decode_chat_messages(conn, rows)
+        return list(reversed(messages))  # Вернуть в хронологическом порядке
+
+    def get_chat_histories(self, account_id: int, chat_ids: List[str],
+                           limit: int = 50) -> Dict[str, List[ChatMessage]]:
+        """
+        Последние limit сообщений нескольких чатов (chat_id -> история)
+        
+        Один UNION ALL на порцию чатов: каждая ветка читает хвост своего
+        чата по индексу (account_id, chat_id, timestamp), как get_chat_history.
+        """
+        histories: Dict[str, List[ChatMessage]] = {chat_id: [] for chat_id in chat_ids}
+        unique_ids = list(histories)
+        self._flush_before_read(account_id)
+        # 3 параметра на чат
+        chunk_size = self.MAX_BATCH_PARAMS // 3
+        with self._pool_for(account_id).connection() as conn:
+            for start in range(0, len(unique_ids), chunk_size):
+                chunk = unique_ids[start:start + chunk_size]
+                branches = " UNION ALL ".join(f"""
+                    SELECT * FROM (
+                        SELECT {self._CHAT_MESSAGE_SELECT} FROM chat_memory
+                        WHERE account_id = ? AND chat_id = ?
+                        ORDER BY timestamp DESC
+                        LIMIT ?
+                    ) AS h{index}
+                """ for index in range(len(chunk)))
+                params = [value for chat_id in chunk for value in (account_id, chat_id, limit)]
+                rows = self._fetch_tuples(conn, branches, params)
+                for message in self._decode_chat_messages(conn, rows):
+                    histories[message.chat_id].append(message)
+        for history in histories.values():
+            history.sort(key=lambda message: (message.timestamp, message.id))
+        return histories
+
+    @classmethod
+    def _keyset_rows(cls, conn: sqlite3.Connection, select: str, table: str,
+                     conditions: List[str], params: list, before: Optional[str],
+                     after: Optional[str], limit: int) -> Tuple[List[tuple], bool, bool]:
+        """
+        Строки одной страницы по (timestamp, id) без OFFSET
+        
+        Условие на пару (timestamp, id) продолжает диапазон индекса
+        (..., timestamp), поэтому чтение страницы не зависит от ее номера.
+        
+        Returns:
+            (строки в порядке листания, есть ли еще строки, листание к новым)
+        """
+        if before and after:
+            raise ValueError("Pass either before or after cursor, not both")
+
+        ascending = after is not None
+        conditions, params = list(conditions), list(params)
+        if before or after:
+            conditions.append(f"(timestamp, id) {'>' if ascending else '<'} (?, ?)")
+            params.extend(Page.decode_cursor(after if ascending else before))
+        order = "ASC" if ascending else "DESC"
+
+        rows = cls._fetch_tuples(conn, f"""
+            SELECT {select} FROM {table}
+            WHERE {' AND '.join(conditions)}
+            ORDER BY timestamp {order}, id {order}
             LIMIT ?
-        """, (account_id, chat_id, limit))
-        rows = cursor.fetchall()
-        conn.close()
+        """, (*params, limit + 1))
+        return rows[:limit], len(rows) > limit, ascending
+
+    @staticmethod
+    def _make_page(items: list, rows: List[tuple], timestamp_index: int,
+                   has_more: bool, ascending: bool) -> Page:
+        """Страница с курсорами первой и последней строки (id - первая колонка)"""
+        if not rows:
+            return Page(items=items, has_more=False)
+        oldest, newest = (rows[0], rows[-1]) if ascending else (rows[-1], rows[0])
+        return Page(
+            items=items,
+            has_more=has_more,
+            before=Page.encode_cursor(oldest[timestamp_index], oldest[0]),
+            after=Page.encode_cursor(newest[timestamp_index], newest[0]),
+        )
+
+    def get_chat_history_page(self, account_id: int, chat_id: str, before: Optional[str] = None,
+                              after: Optional[str] = None, limit: int = 50) -> Page:
+        """
+        Страница истории чата (keyset-пагинация по (timestamp, id))
+        
+        Args:
+            account_id: ID аккаунта
+            chat_id: ID чата
+            before: Курсор - вернуть сообщения старше него (от новых к старым)
+            after: Курсор - вернуть сообщения новее него (от старых к новым)
+            limit: Размер страницы
+            
+        Returns:
+            Страница ChatMessage; без курсора - самые новые сообщения
+        """
+        self._flush_before_read(account_id, chat_id)
+        with self._pool_for(account_id).connection() as conn:
+            rows, has_more, ascending = self._keyset_rows(
+                conn, self._CHAT_MESSAGE_SELECT, "chat_memory",
+                ["account_id = ?", "chat_id = ?"], [account_id, chat_id],
+                before, after, limit,
+            )
+            messages = self._decode_chat_messages(conn, rows)
+        return self._make_page(
+            messages, rows, self._CHAT_MESSAGE_COLUMNS.index("timestamp"), has_more, ascending
+        )
 
+    def get_questions(self, account_id: int, chat_id: str, since: datetime,
+                      limit: int = 50) -> List[ChatMessage]:
+        """Вопросы в чате начиная с момента since (частичный индекс по is_question)"""
+        self._flush_before_read(account_id, chat_id)
+        with self._pool_for(account_id).connection() as conn:
+            rows = self._fetch_tuples(conn, f"""
+                SELECT {self._CHAT_MESSAGE_SELECT} FROM chat_memory 
+                WHERE account_id = ? AND chat_id = ? AND is_question = 1 AND timestamp >= ?
+                ORDER BY timestamp DESC
+                LIMIT ?
+            """, (account_id, chat_id, to_epoch_ms(since), limit))
+            messages = self._decode_chat_messages(conn, rows)
+        return list(reversed(messages))
+
+    def find_messages_by_term(self, account_id: int, term: str, kind: int = TERM_KEYWORD,
+                              chat_id: Optional[str] = None, limit: int = 50) -> List[ChatMessage]:
+        """Последние сообщения с ключевым словом (или упоминанием) term"""
+        self._flush_before_read(account_id, chat_id)
+        condition = "t.account_id = ? AND t.kind = ? AND t.term = ?"
+        params = [account_id, kind, term]
+        if chat_id is not None:
+            condition += " AND c.chat_id = ?"
+            params.append(chat_id)
+        params.append(limit)
+        columns = ", ".join(f"c.{column}" for column in self._CHAT_MESSAGE_COLUMNS)
+
+        with self._pool_for(account_id).connection() as conn:
+            rows = self._fetch_tuples(conn, f"""
+                SELECT {columns} FROM chat_message_terms t
+                JOIN chat_memory c ON c.id = t.chat_memory_id
+                WHERE {condition}
+                ORDER BY t.chat_memory_id DESC
+                LIMIT ?
+            """, params)
+            messages = self._decode_chat_messages(conn, rows)
+        return list(reversed(messages))
+
+    def get_chat_messages_by_keys(self, account_id: int,
+                                  keys: List[Tuple[str, int, int]]) -> List[ChatMessage]:
+        """
+        Сообщения по ключам (chat_id, message_id, timestamp в мс)
+        
+        Метка времени входит в ключ, и каждое условие OR повторяет account_id,
+        чтобы каждое шло по индексу (account_id, chat_id, timestamp), а не
+        по всем сообщениям аккаунта. Удаленных сообщений в ответе нет.
+        """
+        if not keys:
+            return []
+
+        self._flush_before_read(account_id)
         messages = []
-        for row in rows:
-            context_data = json.loads(row["context_data"]) if row["context_data"] else {}
-            messages.append(ChatMessage(
-                id=row["id"],
-                account_id=row["account_id"],
-                chat_id=row["chat_id"],
-                message_id=row["message_id"],
-                user_id=row["user_id"],
-                username=row["username"],
-                message_text=row["message_text"],
-                timestamp=datetime.fromisoformat(row["timestamp"]) if row["timestamp"] else None,
-                is_reply_to=row["is_reply_to"],
-                context_data=context_data,
+        # 4 параметра на ключ
+        chunk_size = self.MAX_BATCH_PARAMS // 4
+        with self._pool_for(account_id).connection() as conn:
+            for start in range(0, len(keys), chunk_size):
+                chunk = keys[start:start + chunk_size]
+                condition = " OR ".join(
+                    "(account_id = ? AND chat_id = ? AND timestamp = ? AND message_id = ?)" for _ in chunk
+                )
+                params = []
+                for chat_id, message_id, timestamp in chunk:
+                    params.extend((account_id, chat_id, timestamp, message_id))
+                rows = self._fetch_tuples(conn, f"""
+                    SELECT {self._CHAT_MESSAGE_SELECT} FROM chat_memory
+                    WHERE {condition}
+                """, params)
+                messages.extend(self._decode_chat_messages(conn, rows))
+        return messages
+
+    @staticmethod
+    def _search_prefixes(query: str) -> List[str]:
+        """
+        Слова запроса без последних букв - грубая замена стемминга,
+        чтобы "погода" находила "погоду" и "погоде"
+        """
+        words = re.findall(r"\w+", query.lower())
+        return list(dict.fromkeys(word[:max(4, len(word) - 2)] for word in words))
+
+    def has_full_text_index(self) -> bool:
+        """Есть ли полнотекстовый индекс (SQLite может быть собран без FTS5)"""
+        return self.pool.has_full_text_index()
+
+    def search_chat_memory(self, account_id: int, query: str, chat_id: Optional[str] = None,
+                           limit: int = 10) -> List[ChatSearchResult]:
+        """
+        Полнотекстовый поиск по истории сообщений
+        
+        Args:
+            account_id: ID аккаунта
+            query: Произвольный текст запроса
+            chat_id: Искать только в этом чате (None - во всех чатах аккаунта)
+            limit: Максимум результатов
+            
+        Returns:
+            Результаты по убыванию релевантности с фрагментами текста
+        """
+        prefixes = self._search_prefixes(query)
+        if not prefixes:
+            return []
+
+        self._flush_before_read(account_id, chat_id)
+        condition = "c.account_id = ?"
+        params: list = [account_id]
+        if chat_id is not None:
+            condition += " AND c.chat_id = ?"
+            params.append(chat_id)
+        columns = ", ".join(f"c.{column}" for column in self._CHAT_MESSAGE_COLUMNS)
+
+        pool = self._pool_for(account_id)
+        with pool.connection() as conn:
+            if pool.has_full_text_index():
+                rows = self._fetch_tuples(
+                    conn,
+                    pool.full_text_search_sql(columns, condition),
+                    (pool.full_text_query(prefixes), *params, limit),
+                )
+            else:
+                # Без FTS5: последние сообщения, содержащие любое из слов
+                like = " OR ".join("c.message_text LIKE ?" for _ in prefixes)
+                rows = self._fetch_tuples(conn, f"""
+                    SELECT {columns}, c.message_text, 0.0
+                    FROM chat_memory c
+                    WHERE {condition} AND ({like})
+                    ORDER BY c.timestamp DESC
+                    LIMIT ?
+                """, (*params, *(f"%{prefix}%" for prefix in prefixes), limit))
+
+            width = len(self._CHAT_MESSAGE_COLUMNS)
+            messages = self._decode_chat_messages(conn, [row[:width] for row in rows])
+
+        return [
+            ChatSearchResult(message=message, snippet=row[width], rank=row[width + 1])
+            for message, row in zip(messages, rows)
+        ]
+
+    # === Chat Summary methods ===
+
+    def get_chat_summary(self, account_id: int, chat_id: str) -> Optional[ChatSummary]:
+        """Получить сводку ранней части разговора в чате"""
+        with self._pool_for(account_id).connection() as conn:
+            row = conn.execute("""
+                SELECT id, account_id, chat_id, summary, covered_until, covered_message_id,
+                       messages_folded, updated_at
+                FROM chat_summaries WHERE account_id = ? AND chat_id = ?
+            """, (account_id, chat_id)).fetchone()
+        if not row:
+            return None
+        return ChatSummary(
+            id=row["id"],
+            account_id=row["account_id"],
+            chat_id=row["chat_id"],
+            summary=row["summary"],
+            covered_until=from_epoch_ms(row["covered_until"]),
+            covered_message_id=row["covered_message_id"],
+            messages_folded=row["messages_folded"],
+            updated_at=from_epoch_ms(row["updated_at"]),
+        )
+
+    def save_chat_summary(self, summary: ChatSummary):
+        """Сохранить сводку чата (заменяет прежнюю)"""
+        with self._pool_for(summary.account_id).transaction() as conn:
+            conn.execute("""
+                INSERT INTO chat_summaries
+                (account_id, chat_id, summary, covered_until, covered_message_id, messages_folded, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(account_id, chat_id) DO UPDATE SET
+                    summary = excluded.summary,
+                    covered_until = excluded.covered_until,
+                    covered_message_id = excluded.covered_message_id,
+                    messages_folded = excluded.messages_folded,
+                    updated_at = excluded.updated_at
+            """, (
+                summary.account_id,
+                summary.chat_id,
+                summary.summary,
+                to_epoch_ms(summary.covered_until),
+                summary.covered_message_id,
+                summary.messages_folded,
+                to_epoch_ms(summary.updated_at) if summary.updated_at else now_ms(),
             ))
-        return list(reversed(messages))  # Вернуть в хронологическом порядке
 
     # === User Profile methods ===
 
     def get_or_create_user_profile(self, account_id: int, user_id: str, username: str = None) -> UserProfile:
-        """Получить или создать профиль пользователя"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT * FROM user_profiles 
+        """
+        Получить или создать профиль пользователя
+        
+        Существующий профиль только читается (запись - лишь если известный
+        username изменился); новый вставляется INSERT ... ON CONFLICT DO
+        NOTHING RETURNING, а профиль, который успел вставить параллельный
+        писатель, дочитывается в той же транзакции.
+        """
+        pool = self._pool_for(account_id)
+        with pool.connection() as conn:
+            profile = self._select_user_profile(conn, account_id, user_id)
+        if profile is not None and (username is None or profile.username == username):
+            return profile
+
+        with pool.transaction() as conn:
+            if profile is None:
+                rows = self._fetch_tuples(conn, f"""
+                    INSERT INTO user_profiles 
+                    (account_id, user_id, username, interaction_count, last_interaction, 
+                     communication_style, relationship_score)
+                    VALUES (?, ?, ?, 0, ?, '{{}}', 0.5)
+                    ON CONFLICT(account_id, user_id) DO NOTHING
+                    RETURNING {self._USER_PROFILE_SELECT}
+                """, (account_id, user_id, username, now_ms()))
+                if rows:
+                    return self._decode_user_profile(rows[0])
+                profile = self._select_user_profile(conn, account_id, user_id)
+                if username is None or profile.username == username:
+                    return profile
+            conn.execute(
+                "UPDATE user_profiles SET username = ? WHERE account_id = ? AND user_id = ?",
+                (username, account_id, user_id),
+            )
+        profile.username = username
+        return profile
+
+    def _select_user_profile(self, conn: sqlite3.Connection, account_id: int,
+                             user_id: str) -> Optional[UserProfile]:
+        """Существующий профиль пользователя (None, если его нет)"""
+        rows = self._fetch_tuples(conn, f"""
+            SELECT {self._USER_PROFILE_SELECT} FROM user_profiles
             WHERE account_id = ? AND user_id = ?
         """, (account_id, user_id))
-        row = cursor.fetchone()
+        return self._decode_user_profile(rows[0]) if rows else None
 
-        if row:
-            conn.close()
-            style = json.loads(row["communication_style"]) if row["communication_style"] else {}
-            return UserProfile(
-                id=row["id"],
-                account_id=row["account_id"],
-                user_id=row["user_id"],
-                username=row["username"],
-                interaction_count=row["interaction_count"],
-                last_interaction=datetime.fromisoformat(row["last_interaction"]) if row["last_interaction"] else None,
-                communication_style=style,
-                relationship_score=row["relationship_score"],
-                notes=row["notes"],
-            )
+    def get_user_profiles(self, account_id: int, user_ids: List[str]) -> Dict[str, UserProfile]:
+        """Получить существующие профили нескольких пользователей (user_id -> профиль)"""
+        profiles = {}
+        unique_ids = list(dict.fromkeys(user_ids))
+        with self._pool_for(account_id).connection() as conn:
+            for start in range(0, len(unique_ids), self.MAX_BATCH_PARAMS):
+                chunk = unique_ids[start:start + self.MAX_BATCH_PARAMS]
+                placeholders = ", ".join("?" * len(chunk))
+                rows = self._fetch_tuples(conn, f"""
+                    SELECT {self._USER_PROFILE_SELECT} FROM user_profiles
+                    WHERE account_id = ? AND user_id IN ({placeholders})
+                """, (account_id, *chunk))
+                for row in rows:
+                    profile = self._decode_user_profile(row)
+                    profiles[profile.user_id] = profile
+        return profiles
 
-        # Создать новый профиль
-        cursor.execute("""
-            INSERT INTO user_profiles 
-            (account_id, user_id, username, interaction_count, last_interaction, 
-             communication_style, relationship_score)
-            VALUES (?, ?, ?, 0, ?, '{}', 0.5)
-        """, (account_id, user_id, username, datetime.now()))
-        profile_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+    def get_top_user_profiles(self, account_id: int, limit: int) -> List[UserProfile]:
+        """Профили пользователей, с которыми больше всего взаимодействий"""
+        with self._pool_for(account_id).connection() as conn:
+            rows = self._fetch_tuples(conn, f"""
+                SELECT {self._USER_PROFILE_SELECT} FROM user_profiles
+                WHERE account_id = ?
+                ORDER BY interaction_count DESC, last_interaction DESC
+                LIMIT ?
+            """, (account_id, limit))
+        return [self._decode_user_profile(row) for row in rows]
 
-        return UserProfile(
-            id=profile_id,
-            account_id=account_id,
-            user_id=user_id,
-            username=username,
-            interaction_count=0,
-            last_interaction=datetime.now(),
-            communication_style={},
-            relationship_score=0.5,
-        )
+    _UPDATE_USER_PROFILE = """
+        UPDATE user_profiles 
+        SET username = ?, interaction_count = ?, last_interaction = ?,
+            communication_style = ?, relationship_score = ?, notes = ?
+        WHERE account_id = ? AND user_id = ?
+    """
 
-    def update_user_profile(self, profile: UserProfile):
-        """Обновить профиль пользователя"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("""
-            UPDATE user_profiles 
-            SET username = ?, interaction_count = ?, last_interaction = ?,
-                communication_style = ?, relationship_score = ?, notes = ?
-            WHERE account_id = ? AND user_id = ?
-        """, (
+    @staticmethod
+    def _user_profile_params(profile: UserProfile) -> tuple:
+        return (
             profile.username,
             profile.interaction_count,
-            profile.last_interaction or datetime.now(),
+            to_epoch_ms(profile.last_interaction) if profile.last_interaction else now_ms(),
             json.dumps(profile.communication_style),
             profile.relationship_score,
             profile.notes,
             profile.account_id,
             profile.user_id,
-        ))
-        conn.commit()
-        conn.close()
+        )
+
+    def update_user_profile(self, profile: UserProfile):
+        """Обновить профиль пользователя"""
+        with self._pool_for(profile.account_id).transaction() as conn:
+            conn.execute(self._UPDATE_USER_PROFILE, self._user_profile_params(profile))
+
+    def update_user_profiles(self, profiles: List[UserProfile]):
+        """Обновить несколько профилей пользователей одной транзакцией"""
+        if not profiles:
+            return
+        for pool, group in self._group_by_pool(profiles).items():
+            with pool.transaction() as conn:
+                conn.executemany(
+                    self._UPDATE_USER_PROFILE,
+                    [self._user_profile_params(profile) for profile in group],
+                )
+
+    # Порядок колонок совпадает с порядком полей UserProfile
+    _USER_PROFILE_SELECT = (
+        "id, account_id, user_id, username, interaction_count, last_interaction, "
+        "communication_style, relationship_score, notes"
+    )
+
+    @staticmethod
+    def _decode_user_profile(row: tuple) -> UserProfile:
+        """Собрать UserProfile из кортежа _USER_PROFILE_SELECT"""
+        (profile_id, account_id, user_id, username, interaction_count,
+         last_interaction, style, relationship_score, notes) = row
+        return UserProfile(
+            profile_id, account_id, user_id, username, interaction_count,
+            datetime.fromtimestamp(last_interaction / 1000) if last_interaction is not None else None,
+            # Пустой стиль ('{}' у новых профилей) не разбираем
+            json.loads(style) if style and style != "{}" else {},
+            relationship_score, notes,
+        )
 
     # === Topic Memory methods ===
 
     def get_or_create_topic_memory(self, account_id: int, topic_keyword: str) -> TopicMemory:
         """Получить или создать память о теме"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT * FROM topic_memory 
-            WHERE account_id = ? AND topic_keyword = ?
-        """, (account_id, topic_keyword))
-        row = cursor.fetchone()
-
-        if row:
-            conn.close()
-            return TopicMemory(
-                id=row["id"],
-                account_id=row["account_id"],
-                topic_keyword=row["topic_keyword"],
-                position=row["position"],
-                priority=row["priority"],
-                last_discussed=datetime.fromisoformat(row["last_discussed"]) if row["last_discussed"] else None,
-                discussion_count=row["discussion_count"],
-            )
+        return self.get_or_create_topic_memories(account_id, [topic_keyword])[topic_keyword]
 
-        # Создать новую память
-        cursor.execute("""
-            INSERT INTO topic_memory 
-            (account_id, topic_keyword, priority, last_discussed, discussion_count)
-            VALUES (?, ?, 0.5, ?, 0)
-        """, (account_id, topic_keyword, datetime.now()))
-        topic_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+    def get_or_create_topic_memories(self, account_id: int, topic_keywords: List[str]) -> Dict[str, TopicMemory]:
+        """
+        Получить или создать память о нескольких темах (ключевое слово -> тема)
+        
+        Существующие темы только читаются; недостающие вставляются
+        многострочным INSERT ... ON CONFLICT DO NOTHING RETURNING. Темы,
+        которые успел вставить параллельный писатель, дочитываются в той же
+        транзакции.
+        """
+        unique_keywords = list(dict.fromkeys(topic_keywords))
+        pool = self._pool_for(account_id)
+        with pool.connection() as conn:
+            topics = self._select_topic_memories(conn, account_id, unique_keywords)
+        missing = [keyword for keyword in unique_keywords if keyword not in topics]
+        if not missing:
+            return topics
 
-        return TopicMemory(
-            id=topic_id,
-            account_id=account_id,
-            topic_keyword=topic_keyword,
-            position=None,
-            priority=0.5,
-            last_discussed=datetime.now(),
-            discussion_count=0,
-        )
+        now = now_ms()
+        # 3 параметра на строку VALUES
+        chunk_size = self.MAX_BATCH_PARAMS // 3
+        with pool.transaction() as conn:
+            for start in range(0, len(missing), chunk_size):
+                chunk = missing[start:start + chunk_size]
+                values = ", ".join("(?, ?, 0.5, ?, 0)" for _ in chunk)
+                params = [value for keyword in chunk for value in (account_id, keyword, now)]
+                for row in self._fetch_tuples(conn, f"""
+                    INSERT INTO topic_memory 
+                    (account_id, topic_keyword, priority, last_discussed, discussion_count)
+                    VALUES {values}
+                    ON CONFLICT(account_id, topic_keyword) DO NOTHING
+                    RETURNING {self._TOPIC_MEMORY_SELECT}
+                """, params):
+                    topic = self._decode_topic_memory(row)
+                    topics[topic.topic_keyword] = topic
+            raced = [keyword for keyword in missing if keyword not in topics]
+            if raced:
+                topics.update(self._select_topic_memories(conn, account_id, raced))
+        return topics
 
-    def update_topic_memory(self, topic: TopicMemory):
-        """Обновить память о теме"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("""
-            UPDATE topic_memory 
-            SET position = ?, priority = ?, last_discussed = ?, discussion_count = ?
-            WHERE account_id = ? AND topic_keyword = ?
-        """, (
+    def _select_topic_memories(self, conn: sqlite3.Connection, account_id: int,
+                               topic_keywords: List[str]) -> Dict[str, TopicMemory]:
+        """Существующие темы из списка ключевых слов (без повторов)"""
+        topics = {}
+        for start in range(0, len(topic_keywords), self.MAX_BATCH_PARAMS):
+            chunk = topic_keywords[start:start + self.MAX_BATCH_PARAMS]
+            placeholders = ", ".join("?" * len(chunk))
+            for row in self._fetch_tuples(conn, f"""
+                SELECT {self._TOPIC_MEMORY_SELECT} FROM topic_memory
+                WHERE account_id = ? AND topic_keyword IN ({placeholders})
+            """, (account_id, *chunk)):
+                topic = self._decode_topic_memory(row)
+                topics[topic.topic_keyword] = topic
+        return topics
+
+    def get_top_topic_memories(self, account_id: int, limit: int) -> List[TopicMemory]:
+        """Темы с наибольшим приоритетом (при равенстве - чаще обсуждаемые)"""
+        with self._pool_for(account_id).connection() as conn:
+            rows = self._fetch_tuples(conn, f"""
+                SELECT {self._TOPIC_MEMORY_SELECT} FROM topic_memory
+                WHERE account_id = ?
+                ORDER BY priority DESC, discussion_count DESC
+                LIMIT ?
+            """, (account_id, limit))
+        return [self._decode_topic_memory(row) for row in rows]
+
+    _UPDATE_TOPIC_MEMORY = """
+        UPDATE topic_memory 
+        SET position = ?, priority = ?, last_discussed = ?, discussion_count = ?
+        WHERE account_id = ? AND topic_keyword = ?
+    """
+
+    @staticmethod
+    def _topic_memory_params(topic: TopicMemory) -> tuple:
+        return (
             topic.position,
             topic.priority,
-            topic.last_discussed or datetime.now(),
+            to_epoch_ms(topic.last_discussed) if topic.last_discussed else now_ms(),
             topic.discussion_count,
             topic.account_id,
             topic.topic_keyword,
-        ))
-        conn.commit()
-        conn.close()
+        )
+
+    def update_topic_memory(self, topic: TopicMemory):
+        """Обновить память о теме"""
+        with self._pool_for(topic.account_id).transaction() as conn:
+            conn.execute(self._UPDATE_TOPIC_MEMORY, self._topic_memory_params(topic))
+
+    def update_topic_memories(self, topics: List[TopicMemory]):
+        """Обновить память о нескольких темах одной транзакцией"""
+        if not topics:
+            return
+        for pool, group in self._group_by_pool(topics).items():
+            with pool.transaction() as conn:
+                conn.executemany(
+                    self._UPDATE_TOPIC_MEMORY,
+                    [self._topic_memory_params(topic) for topic in group],
+                )
+
+    # Порядок колонок совпадает с порядком полей TopicMemory
+    _TOPIC_MEMORY_SELECT = (
+        "id, account_id, topic_keyword, position, priority, last_discussed, discussion_count"
+    )
+
+    @staticmethod
+    def _decode_topic_memory(row: tuple) -> TopicMemory:
+        """Собрать TopicMemory из кортежа _TOPIC_MEMORY_SELECT"""
+        (topic_id, account_id, topic_keyword, position, priority,
+         last_discussed, discussion_count) = row
+        return TopicMemory(
+            topic_id, account_id, topic_keyword, position, priority,
+            datetime.fromtimestamp(last_discussed / 1000) if last_discussed is not None else None,
+            discussion_count,
+        )
 
     # === Interaction Log methods ===
 
-    def log_interaction(self, interaction: InteractionLog) -> int:
-        """Записать взаимодействие в лог"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO interaction_log 
-            (account_id, chat_id, action_type, message_id, response_text, 
-             importance_score, decision_reason, timestamp)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
+    # Колонки вставки interaction_log (порядок _interaction_params)
+    _INTERACTION_COLUMNS = (
+        "account_id", "chat_id", "action_type", "message_id", "response_text",
+        "importance_score", "decision_reason", "timestamp",
+    )
+
+    @staticmethod
+    def _interaction_params(interaction: InteractionLog) -> tuple:
+        return (
             interaction.account_id,
             interaction.chat_id,
             interaction.action_type,
@@ -571,10 +1075,654 @@ class DatabaseManager:
             interaction.response_text,
             interaction.importance_score,
             interaction.decision_reason,
-            interaction.timestamp or datetime.now(),
-        ))
-        log_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
-        return log_id
+            to_epoch_ms(interaction.timestamp) if interaction.timestamp else now_ms(),
+        )
+
+    def log_interaction(self, interaction: InteractionLog) -> int:
+        """Записать взаимодействие в лог (строкой независимо от keep_row) и в счетчики"""
+        pool = self._pool_for(interaction.account_id)
+        with pool.transaction() as conn:
+            self._add_to_rollup(conn, [interaction])
+            self._add_to_account_stats(conn, [], [interaction])
+            return pool.insert_returning_ids(
+                conn, "interaction_log", self._INTERACTION_COLUMNS,
+                [self._interaction_params(interaction)],
+            )[0]
+
+    @staticmethod
+    def _add_to_rollup(conn: sqlite3.Connection, interactions: List[InteractionLog]):
+        """Прибавить взаимодействия к почасовым счетчикам (один UPSERT на ключ)"""
+        counters: Dict[tuple, list] = {}
+        for interaction in interactions:
+            timestamp = to_epoch_ms(interaction.timestamp) if interaction.timestamp else now_ms()
+            key = (
+                interaction.account_id,
+                hour_start_ms(timestamp),
+                interaction.chat_id,
+                interaction.action_type,
+                interaction.reason_class or "other",
+            )
+            counter = counters.get(key)
+            if counter is None:
+                counter = counters[key] = [0, 0.0]
+            counter[0] += 1
+            counter[1] += interaction.importance_score or 0.0
+
+        conn.executemany("""
+            INSERT INTO interaction_rollup
+                (account_id, hour, chat_id, action_type, reason_class, total, score_sum)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(account_id, hour, chat_id, action_type, reason_class) DO UPDATE SET
+                total = interaction_rollup.total + excluded.total,
+                score_sum = interaction_rollup.score_sum + excluded.score_sum
+        """, [(*key, total, score_sum) for key, (total, score_sum) in counters.items()])
+
+    # Счетчик account_stats для действия лога
+    _STATS_ACTIONS = {"message": 1, "react": 2, "ignore": 3, "defer": 4}
+
+    @classmethod
+    def _add_to_account_stats(cls, conn: sqlite3.Connection, messages: List[ChatMessage],
+                              interactions: List[InteractionLog]):
+        """Прибавить записанные сообщения и решения к account_stats (один UPSERT на аккаунт)"""
+        # account_id -> [received, responded, reacted, ignored, deferred, last_activity]
+        deltas: Dict[int, list] = {}
+        for message in messages:
+            delta = deltas.get(message.account_id)
+            if delta is None:
+                delta = deltas[message.account_id] = [0, 0, 0, 0, 0, None]
+            delta[0] += 1
+            timestamp = to_epoch_ms(message.timestamp) if message.timestamp else now_ms()
+            if delta[5] is None or timestamp > delta[5]:
+                delta[5] = timestamp
+        for interaction in interactions:
+            index = cls._STATS_ACTIONS.get(interaction.action_type)
+            if index is None:
+                continue
+            delta = deltas.get(interaction.account_id)
+            if delta is None:
+                delta = deltas[interaction.account_id] = [0, 0, 0, 0, 0, None]
+            delta[index] += 1
+
+        if not deltas:
+            return
+        conn.executemany("""
+            INSERT INTO account_stats
+                (account_id, messages_received, messages_responded, messages_reacted,
+                 messages_ignored, messages_deferred, last_activity)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(account_id) DO UPDATE SET
+                messages_received = account_stats.messages_received + excluded.messages_received,
+                messages_responded = account_stats.messages_responded + excluded.messages_responded,
+                messages_reacted = account_stats.messages_reacted + excluded.messages_reacted,
+                messages_ignored = account_stats.messages_ignored + excluded.messages_ignored,
+                messages_deferred = account_stats.messages_deferred + excluded.messages_deferred,
+                last_activity = CASE
+                    WHEN account_stats.last_activity IS NULL
+                         OR excluded.last_activity > account_stats.last_activity
+                    THEN excluded.last_activity
+                    ELSE account_stats.last_activity
+                END
+        """, [(account_id, *delta) for account_id, delta in deltas.items()])
+
+    # Ключ AccountStats.recent для действия лога
+    _RECENT_KEYS = {"message": "responded", "react": "reacted", "ignore": "ignored", "defer": "deferred"}
+
+    @classmethod
+    def _stats_from_row(cls, row: Optional[tuple], account_id: int, recent_rows: List[tuple],
+                        recent_hours: int) -> AccountStats:
+        """AccountStats из строки account_stats и сумм счетчиков окна по action_type"""
+        stats = AccountStats(account_id=account_id, recent_hours=recent_hours)
+        if row is not None:
+            (stats.messages_received, stats.messages_responded, stats.messages_reacted,
+             stats.messages_ignored, stats.messages_deferred, last_activity) = row
+            stats.last_activity = from_epoch_ms(last_activity)
+        for action_type, total in recent_rows:
+            # Каждое полученное сообщение заканчивается ровно одним решением
+            stats.recent["received"] += total
+            key = cls._RECENT_KEYS.get(action_type)
+            if key:
+                stats.recent[key] += total
+        return stats
+
+    _ACCOUNT_STATS_SELECT = (
+        "messages_received, messages_responded, messages_reacted, messages_ignored, messages_deferred, "
+        "last_activity"
+    )
+
+    def get_account_stats(self, account_id: int, recent_hours: int = 24) -> AccountStats:
+        """
+        Статистика аккаунта: накопленные счетчики и решения за последние часы
+        
+        Чтение не просматривает лог: одна строка account_stats и почасовые
+        счетчики окна (окно выровнено по началу часа).
+        """
+        since = hour_start_ms(now_ms() - recent_hours * HOUR_MS)
+        self._flush_before_read(account_id)
+        with self._pool_for(account_id).connection() as conn:
+            rows = self._fetch_tuples(conn, f"""
+                SELECT {self._ACCOUNT_STATS_SELECT} FROM account_stats WHERE account_id = ?
+            """, (account_id,))
+            recent_rows = self._fetch_tuples(conn, """
+                SELECT action_type, sum(total) FROM interaction_rollup
+                WHERE account_id = ? AND hour >= ?
+                GROUP BY action_type
+            """, (account_id, since))
+        return self._stats_from_row(rows[0] if rows else None, account_id, recent_rows, recent_hours)
+
+    def get_all_account_stats(self, recent_hours: int = 24) -> Dict[int, AccountStats]:
+        """
+        Статистика всех аккаунтов (по два запроса на хранилище)
+        
+        Очередь отложенной записи не сбрасывается: строки, ожидающие
+        группового сброса, попадут в счетчики через flush_interval.
+        """
+        since = hour_start_ms(now_ms() - recent_hours * HOUR_MS)
+        rows: Dict[int, tuple] = {}
+        recent_rows: Dict[int, List[tuple]] = {}
+        for pool in self._pools(all_accounts=True):
+            with pool.connection() as conn:
+                for account_id, *row in self._fetch_tuples(conn, f"""
+                    SELECT account_id, {self._ACCOUNT_STATS_SELECT} FROM account_stats
+                """, ()):
+                    rows[account_id] = tuple(row)
+                for account_id, action_type, total in self._fetch_tuples(conn, """
+                    SELECT account_id, action_type, sum(total) FROM interaction_rollup
+                    WHERE hour >= ?
+                    GROUP BY account_id, action_type
+                """, (since,)):
+                    recent_rows.setdefault(account_id, []).append((action_type, total))
+
+        return {
+            account_id: self._stats_from_row(
+                rows.get(account_id), account_id, recent_rows.get(account_id, []), recent_hours
+            )
+            for account_id in rows.keys() | recent_rows.keys()
+        }
+
+    def get_interaction_counters(self, account_id: int, since: Optional[datetime] = None,
+                                 until: Optional[datetime] = None,
+                                 chat_id: Optional[str] = None) -> List[InteractionCounter]:
+        """
+        Почасовые счетчики решений аккаунта
+        
+        Args:
+            account_id: ID аккаунта
+            since: С этого момента (включая час, в который он попадает)
+            until: До этого момента (не включительно)
+            chat_id: Только этот чат
+        """
+        conditions, params = ["account_id = ?"], [account_id]
+        if since is not None:
+            conditions.append("hour >= ?")
+            params.append(hour_start_ms(to_epoch_ms(since)))
+        if until is not None:
+            conditions.append("hour < ?")
+            params.append(to_epoch_ms(until))
+        if chat_id is not None:
+            conditions.append("chat_id = ?")
+            params.append(chat_id)
+
+        self._flush_before_read(account_id, chat_id)
+        with self._pool_for(account_id).connection() as conn:
+            rows = self._fetch_tuples(conn, f"""
+                SELECT account_id, chat_id, hour, action_type, reason_class, total, score_sum
+                FROM interaction_rollup
+                WHERE {' AND '.join(conditions)}
+                ORDER BY hour, chat_id, action_type, reason_class
+            """, params)
+        return [
+            InteractionCounter(row_account_id, row_chat_id, from_epoch_ms(hour),
+                               action_type, reason_class, total, score_sum)
+            for row_account_id, row_chat_id, hour, action_type, reason_class, total, score_sum in rows
+        ]
+
+    def count_interactions(self, account_id: int, since: Optional[datetime] = None,
+                           chat_id: Optional[str] = None) -> Dict[str, Dict[str, int]]:
+        """Число решений по действиям и классам причин: {action_type: {reason_class: n}}"""
+        counts: Dict[str, Dict[str, int]] = {}
+        for counter in self.get_interaction_counters(account_id, since=since, chat_id=chat_id):
+            by_reason = counts.setdefault(counter.action_type, {})
+            by_reason[counter.reason_class] = by_reason.get(counter.reason_class, 0) + counter.total
+        return counts
+
+    def get_active_chat_ids(self, account_id: int, since: datetime, limit: int) -> List[str]:
+        """Чаты аккаунта с наибольшим числом входящих сообщений (решений по ним) с момента since"""
+        self._flush_before_read(account_id)
+        with self._pool_for(account_id).connection() as conn:
+            rows = self._fetch_tuples(conn, """
+                SELECT chat_id FROM interaction_rollup
+                WHERE account_id = ? AND hour >= ?
+                GROUP BY chat_id
+                ORDER BY sum(total) DESC
+                LIMIT ?
+            """, (account_id, hour_start_ms(to_epoch_ms(since)), limit))
+        return [row[0] for row in rows]
+
+    def log_interactions(self, interactions: List[InteractionLog]):
+        """Записать несколько взаимодействий одной транзакцией"""
+        if interactions:
+            self.write_batch([], interactions)
+
+    _INTERACTION_SELECT = "id, " + ", ".join(_INTERACTION_COLUMNS)
+
+    def get_interaction_log_page(self, account_id: int, chat_id: Optional[str] = None,
+                                 action_type: Optional[str] = None,
+                                 min_score: Optional[float] = None,
+                                 max_score: Optional[float] = None,
+                                 before: Optional[str] = None, after: Optional[str] = None,
+                                 limit: int = 50) -> Page:
+        """
+        Страница лога взаимодействий (keyset-пагинация по (timestamp, id))
+        
+        Args:
+            account_id: ID аккаунта
+            chat_id: Только этот чат
+            action_type: Только это действие - одно из INTERACTION_ACTIONS
+                ('message', 'react', 'ignore', 'defer'); другое значение - ValueError
+            min_score: Нижняя граница importance_score (включительно)
+            max_score: Верхняя граница importance_score (включительно)
+            before: Курсор - вернуть записи старше него (от новых к старым)
+            after: Курсор - вернуть записи новее него (от старых к новым)
+            limit: Размер страницы
+            
+        Returns:
+            Страница InteractionLog; без курсора - самые новые записи
+        """
+        if action_type is not None and action_type not in INTERACTION_ACTIONS:
+            raise ValueError(
+                f"Unknown action_type {action_type!r}, expected one of: {', '.join(INTERACTION_ACTIONS)}"
+            )
+        conditions, params = ["account_id = ?"], [account_id]
+        if chat_id is not None:
+            conditions.append("chat_id = ?")
+            params.append(chat_id)
+        if action_type is not None:
+            conditions.append("action_type = ?")
+            params.append(action_type)
+        if min_score is not None:
+            conditions.append("importance_score >= ?")
+            params.append(min_score)
+        if max_score is not None:
+            conditions.append("importance_score <= ?")
+            params.append(max_score)
+
+        self._flush_before_read(account_id, chat_id)
+        with self._pool_for(account_id).connection() as conn:
+            rows, has_more, ascending = self._keyset_rows(
+                conn, self._INTERACTION_SELECT, "interaction_log",
+                conditions, params, before, after, limit,
+            )
+
+        fromtimestamp = datetime.fromtimestamp
+        interactions = [
+            InteractionLog(
+                row_id, row_account_id, row_chat_id, row_action_type, message_id,
+                response_text, importance_score, decision_reason,
+                fromtimestamp(timestamp / 1000) if timestamp is not None else None,
+            )
+            for (row_id, row_account_id, row_chat_id, row_action_type, message_id,
+                 response_text, importance_score, decision_reason, timestamp) in rows
+        ]
+        return self._make_page(interactions, rows, len(self._INTERACTION_COLUMNS), has_more, ascending)
+
+    def write_batch(self, messages: List[ChatMessage], interactions: List[InteractionLog],
+                    synchronous: Optional[str] = None):
+        """
+        Записать сообщения и лог взаимодействий в одной транзакции
+        (при шардировании - по одной транзакции на файл аккаунта)
+        
+        Args:
+            messages: Сообщения
+            interactions: Записи лога
+            synchronous: Режим надежности фиксации для соединений текущего потока
+        """
+        batches: Dict[StorageBackend, Tuple[list, list]] = {}
+        for pool, group in self._group_by_pool(messages).items():
+            batches.setdefault(pool, ([], []))[0].extend(group)
+        for pool, group in self._group_by_pool(interactions).items():
+            batches.setdefault(pool, ([], []))[1].extend(group)
+
+        for pool, (pool_messages, pool_interactions) in batches.items():
+            if synchronous:
+                with pool.connection() as conn:
+                    pool.set_synchronous(conn, synchronous)
+            with pool.transaction() as conn:
+                if pool_messages:
+                    self._insert_chat_messages(pool, conn, pool_messages)
+                if pool_interactions:
+                    # Полные строки - только для keep_row, счетчики - для всех
+                    rows = [
+                        self._interaction_params(interaction)
+                        for interaction in pool_interactions
+                        if interaction.keep_row
+                    ]
+                    if rows:
+                        pool.bulk_insert(conn, "interaction_log", self._INTERACTION_COLUMNS, rows)
+                    self._add_to_rollup(conn, pool_interactions)
+                self._add_to_account_stats(conn, pool_messages, pool_interactions)
+
+    # === Evolution History methods ===
+
+    def log_evolution(self, account_id: int, changes: List[Tuple[str, float, float]], reason: str):
+        """Записать изменения параметров личности в историю эволюции"""
+        with self._pool_for(account_id).transaction() as conn:
+            self._insert_evolution_history(conn, account_id, changes, reason)
+
+    @staticmethod
+    def _insert_evolution_history(conn: sqlite3.Connection, account_id: int,
+                                  changes: List[Tuple[str, float, float]], reason: str):
+        timestamp = now_ms()
+        conn.executemany("""
+            INSERT INTO evolution_history 
+            (account_id, parameter_name, old_value, new_value, reason, timestamp)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, [
+            (account_id, param_name, old_value, new_value, reason, timestamp)
+            for param_name, old_value, new_value in changes
+        ])
+
+    def get_evolution_series(self, account_id: int, parameter_name: str,
+                             since: Optional[datetime] = None, until: Optional[datetime] = None,
+                             buckets: int = 100) -> List[EvolutionPoint]:
+        """
+        Ряд значений параметра личности, сжатый до buckets интервалов
+        
+        Старые изменения читаются из почасовых агрегатов, свежие - из
+        evolution_history; оба чтения идут по индексу (account_id, parameter_name, время).
+        
+        Args:
+            account_id: ID аккаунта
+            parameter_name: Параметр ("activity_level", "topic_priority_<тема>", ...)
+            since: Начало ряда (по умолчанию - первое изменение параметра)
+            until: Конец ряда (по умолчанию - сейчас)
+            buckets: Число интервалов, на которые делится [since, until)
+            
+        Returns:
+            Точки интервалов, в которых были изменения, по возрастанию времени
+        """
+        until_ms = to_epoch_ms(until) if until else now_ms()
+        key = (account_id, parameter_name)
+        with self._pool_for(account_id).connection() as conn:
+            if since is not None:
+                since_ms = to_epoch_ms(since)
+            else:
+                firsts = [
+                    row[0] for row in (
+                        self._fetch_tuples(conn, """
+                            SELECT min(hour) FROM evolution_history_hourly
+                            WHERE account_id = ? AND parameter_name = ?
+                        """, key)
+                        + self._fetch_tuples(conn, """
+                            SELECT min(timestamp) FROM evolution_history
+                            WHERE account_id = ? AND parameter_name = ?
+                        """, key)
+                    )
+                    if row[0] is not None
+                ]
+                if not firsts:
+                    return []
+                since_ms = min(firsts)
+
+            # (время, значение в конце, минимум, максимум, изменений)
+            samples = self._fetch_tuples(conn, """
+                SELECT hour, close_value, min_value, max_value, changes
+                FROM evolution_history_hourly
+                WHERE account_id = ? AND parameter_name = ? AND hour > ? AND hour < ?
+                ORDER BY hour
+            """, (*key, since_ms - HOUR_MS, until_ms))
+            samples += self._fetch_tuples(conn, """
+                SELECT timestamp, new_value, new_value, new_value, 1
+                FROM evolution_history
+                WHERE account_id = ? AND parameter_name = ? AND timestamp >= ? AND timestamp < ?
+                ORDER BY timestamp, id
+            """, (*key, since_ms, until_ms))
+        # Агрегаты старше сырых строк: сортировка двух упорядоченных серий почти линейна
+        samples.sort(key=lambda sample: sample[0])
+
+        buckets = max(1, buckets)
+        width = max(1, -(-(until_ms - since_ms) // buckets))
+        points: Dict[int, EvolutionPoint] = {}
+        for timestamp, value, min_value, max_value, changes in samples:
+            index = min(max((timestamp - since_ms) // width, 0), buckets - 1)
+            point = points.get(index)
+            if point is None:
+                points[index] = EvolutionPoint(
+                    from_epoch_ms(since_ms + index * width), value, min_value, max_value, changes
+                )
+                continue
+            point.value = value
+            point.min_value = min(point.min_value, min_value)
+            point.max_value = max(point.max_value, max_value)
+            point.changes += changes
+        return [points[index] for index in sorted(points)]
+
+    def compact_evolution_history(self, older_than_days: int = 7, batch_size: int = 5000) -> int:
+        """
+        Свернуть изменения старше older_than_days в почасовые агрегаты
+        
+        За вызов обрабатывается не больше batch_size строк в каждом
+        хранилище (отдельной транзакцией); вызывать, пока возвращает не 0.
+        
+        Returns:
+            Сколько строк evolution_history свернуто и удалено
+        """
+        # Граница по началу часа: час сворачивается целиком, за один проход
+        cutoff = hour_start_ms(now_ms() - older_than_days * 86_400_000)
+        compacted = 0
+        for pool in self._pools(all_accounts=True):
+            with pool.transaction() as conn:
+                rows = self._fetch_tuples(conn, """
+                    SELECT id, account_id, parameter_name, timestamp, old_value, new_value
+                    FROM evolution_history
+                    WHERE timestamp < ?
+                    ORDER BY id
+                    LIMIT ?
+                """, (cutoff, batch_size))
+                if not rows:
+                    continue
+
+                # (account_id, parameter_name, hour) -> [open, close, min, max, changes]
+                hours: Dict[tuple, list] = {}
+                for _, account_id, parameter_name, timestamp, old_value, new_value in rows:
+                    key = (account_id, parameter_name, hour_start_ms(timestamp))
+                    aggregate = hours.get(key)
+                    if aggregate is None:
+                        hours[key] = [old_value, new_value, new_value, new_value, 1]
+                        continue
+                    aggregate[1] = new_value
+                    aggregate[2] = min(aggregate[2], new_value)
+                    aggregate[3] = max(aggregate[3], new_value)
+                    aggregate[4] += 1
+
+                conn.executemany("""
+                    INSERT INTO evolution_history_hourly
+                        (account_id, parameter_name, hour, open_value, close_value,
+                         min_value, max_value, changes)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(account_id, parameter_name, hour) DO UPDATE SET
+                        close_value = excluded.close_value,
+                        min_value = CASE WHEN excluded.min_value < evolution_history_hourly.min_value
+                                         THEN excluded.min_value
+                                         ELSE evolution_history_hourly.min_value END,
+                        max_value = CASE WHEN excluded.max_value > evolution_history_hourly.max_value
+                                         THEN excluded.max_value
+                                         ELSE evolution_history_hourly.max_value END,
+                        changes = evolution_history_hourly.changes + excluded.changes
+                """, [(*key, *aggregate) for key, aggregate in hours.items()])
+                # Строки порции - все строки старше границы в диапазоне их id
+                conn.execute("""
+                    DELETE FROM evolution_history
+                    WHERE id >= ? AND id <= ? AND timestamp < ?
+                """, (rows[0][0], rows[-1][0], cutoff))
+                compacted += len(rows)
+        return compacted
+
+    # === Retention methods ===
+
+    # Таблицы, к которым применяется политика хранения
+    RETENTION_TABLES = ("chat_memory", "interaction_log")
+
+    def set_retention_policy(self, policy: RetentionPolicy):
+        """Сохранить политику хранения аккаунта (ограничения - None или не меньше 1)"""
+        for name in ("max_age_days", "max_rows_per_chat"):
+            value = getattr(policy, name)
+            if value is not None and value < 1:
+                raise ValueError(f"{name} must be at least 1, got {value}")
+        with self.pool.transaction() as conn:
+            conn.execute("""
+                INSERT INTO retention_policies (account_id, max_age_days, max_rows_per_chat)
+                VALUES (?, ?, ?)
+                ON CONFLICT(account_id) DO UPDATE SET
+                    max_age_days = excluded.max_age_days,
+                    max_rows_per_chat = excluded.max_rows_per_chat
+            """, (policy.account_id, policy.max_age_days, policy.max_rows_per_chat))
+
+    def get_retention_policy(self, account_id: int) -> Optional[RetentionPolicy]:
+        """Получить политику хранения аккаунта"""
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                "SELECT * FROM retention_policies WHERE account_id = ?", (account_id,)
+            ).fetchone()
+        if not row:
+            return None
+        return RetentionPolicy(
+            account_id=row["account_id"],
+            max_age_days=row["max_age_days"],
+            max_rows_per_chat=row["max_rows_per_chat"],
+        )
+
+    def get_retention_policies(self) -> List[RetentionPolicy]:
+        """Получить политики хранения всех аккаунтов"""
+        with self.pool.connection() as conn:
+            rows = conn.execute("SELECT * FROM retention_policies").fetchall()
+        return [
+            RetentionPolicy(
+                account_id=row["account_id"],
+                max_age_days=row["max_age_days"],
+                max_rows_per_chat=row["max_rows_per_chat"],
+            )
+            for row in rows
+        ]
+
+    def get_chat_ids(self, account_id: int) -> List[str]:
+        """Получить ID всех чатов аккаунта, для которых есть история или лог"""
+        self._flush_before_read(account_id)
+        with self._pool_for(account_id).connection() as conn:
+            rows = conn.execute("""
+                SELECT DISTINCT chat_id FROM chat_memory WHERE account_id = ?
+                UNION
+                SELECT DISTINCT chat_id FROM interaction_log WHERE account_id = ?
+            """, (account_id, account_id)).fetchall()
+        return [row["chat_id"] for row in rows]
+
+    def prune_chat(self, policy: RetentionPolicy, chat_id: str, batch_size: int = 500) -> int:
+        """
+        Удалить одну порцию устаревших записей чата по политике хранения
+        
+        Каждая порция - отдельная короткая транзакция, чтобы не держать
+        блокировку записи. Вызывать повторно, пока не вернется 0.
+        
+        Returns:
+            Количество удаленных строк
+        """
+        deleted = 0
+        with self._pool_for(policy.account_id).transaction() as conn:
+            for table in self.RETENTION_TABLES:
+                cutoff = self._retention_cutoff(conn, table, policy, chat_id)
+                if cutoff is None:
+                    continue
+                cursor = conn.execute(f"""
+                    DELETE FROM {table} WHERE id IN (
+                        SELECT id FROM {table}
+                        WHERE account_id = ? AND chat_id = ? AND timestamp < ?
+                        ORDER BY timestamp
+                        LIMIT ?
+                    )
+                """, (policy.account_id, chat_id, cutoff, batch_size))
+                deleted += cursor.rowcount
+        return deleted
+
+    def _retention_cutoff(self, conn: sqlite3.Connection, table: str,
+                          policy: RetentionPolicy, chat_id: str):
+        """Граница времени: всё, что раньше, подлежит удалению"""
+        cutoffs = []
+        if policy.max_age_days:
+            cutoffs.append(now_ms() - policy.max_age_days * 86_400_000)
+        if policy.max_rows_per_chat:
+            # Самая старая из max_rows_per_chat последних записей (по индексу)
+            row = conn.execute(f"""
+                SELECT timestamp FROM {table}
+                WHERE account_id = ? AND chat_id = ?
+                ORDER BY timestamp DESC
+                LIMIT 1 OFFSET ?
+            """, (policy.account_id, chat_id, policy.max_rows_per_chat - 1)).fetchone()
+            if row:
+                cutoffs.append(row["timestamp"])
+        if not cutoffs:
+            return None
+        return max(cutoffs)
+
+    def delete_chat_memory_batch(self, account_id: int, chat_id: Optional[str] = None,
+                                 batch_size: int = 5000) -> int:
+        """
+        Удалить одну порцию истории сообщений аккаунта (или одного чата)
+        
+        Каждая порция - отдельная транзакция; вызывать повторно, пока не
+        вернется меньше batch_size, и затем удалить сводки (delete_chat_summaries).
+        
+        Returns:
+            Количество удаленных строк
+        """
+        self._flush_before_read(account_id, chat_id)
+        condition = "account_id = ?" + (" AND chat_id = ?" if chat_id else "")
+        params = (account_id, chat_id) if chat_id else (account_id,)
+        with self._pool_for(account_id).transaction() as conn:
+            cursor = conn.execute(f"""
+                DELETE FROM chat_memory WHERE id IN (
+                    SELECT id FROM chat_memory WHERE {condition} LIMIT ?
+                )
+            """, (*params, batch_size))
+        return cursor.rowcount
+
+    def delete_chat_summaries(self, account_id: int, chat_id: Optional[str] = None):
+        """Удалить сводки чатов аккаунта (или одного чата)"""
+        condition = "account_id = ?" + (" AND chat_id = ?" if chat_id else "")
+        params = (account_id, chat_id) if chat_id else (account_id,)
+        with self._pool_for(account_id).transaction() as conn:
+            conn.execute(f"DELETE FROM chat_summaries WHERE {condition}", params)
+
+    def clear_chat_memory(self, account_id: int, chat_id: Optional[str] = None,
+                          batch_size: int = 5000) -> int:
+        """
+        Удалить историю сообщений аккаунта (или одного чата) порциями вместе со сводками
+        
+        Все порции выполняются одним вызовом; из event loop удалять по порции
+        за вызов (delete_chat_memory_batch), чтобы между ними шли другие записи.
+        """
+        total = 0
+        while True:
+            deleted = self.delete_chat_memory_batch(account_id, chat_id, batch_size)
+            total += deleted
+            if deleted < batch_size:
+                break
+
+        # Сводка удаленной истории тоже больше не нужна
+        self.delete_chat_summaries(account_id, chat_id)
+        return total
+
+    def incremental_vacuum(self, pages: int = 1000) -> int:
+        """
+        Вернуть ОС до pages свободных страниц (в каждом файле БД),
+        вернуть оставшееся число свободных страниц
+        """
+        return sum(pool.incremental_vacuum(pages) for pool in self._pools())
 
+    def enable_incremental_vacuum(self):
+        """
+        Перевести существующую БД в режим auto_vacuum=INCREMENTAL
+        
+        Требует полного VACUUM (перезапись файла), поэтому выполняется
+        один раз вручную, при остановленной системе.
+        """
+        for pool in self._pools(all_accounts=True):
+            pool.compact()
@@ -0,0 +1,600 @@
+"""
+Версионированные миграции схемы БД
+
+Версия схемы хранится в PRAGMA user_version. При старте, если версия
+актуальна, выполняется одна проверка целого числа; иначе недостающие
+миграции применяются по порядку, каждая в своей транзакции. Миграции,
+которые могли пройти не полностью (FTS5 без поддержки в SQLite),
+проверяются при каждом старте чтением и повторяются, когда это стало
+возможно (SQLite обновили до сборки с FTS5).
+"""
+
+import sqlite3
+import json
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+
+@dataclass
+class Migration:
+    """Одна миграция схемы"""
+    version: int
+    description: str
+    apply: Callable[[sqlite3.Connection], None]
+    # Проверка при каждом старте: миграция применена не полностью (например,
+    # без расширения SQLite) и ее нужно повторить, когда это станет возможно
+    incomplete: Optional[Callable[[sqlite3.Connection], bool]] = None
+
+
+def _baseline_schema(conn: sqlite3.Connection):
+    """Исходная схема (в том числе для БД, созданных до появления версий)"""
+    cursor = conn.cursor()
+
+    # Проверить, существует ли старая таблица с уникальным ограничением
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='accounts';")
+    table_exists = cursor.fetchone()
+
+    if table_exists:
+        # Проверить, есть ли уникальное ограничение на phone_number
+        # Получить SQL определение таблицы
+        cursor.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name='accounts';")
+        table_sql = cursor.fetchone()
+
+        if table_sql and 'UNIQUE' in table_sql[0]:
+            # Создать новую таблицу без уникального ограничения
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS accounts_new (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    phone_number TEXT NOT NULL,
+                    session_file TEXT NOT NULL,
+                    is_active BOOLEAN DEFAULT TRUE,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    last_seen TIMESTAMP,
+                    api_id INTEGER,
+                    api_hash TEXT,
+                    session_string TEXT
+                )
+            """)
+
+            # Скопировать данные из старой таблицы в новую
+            cursor.execute("""
+                INSERT INTO accounts_new (id, phone_number, session_file, is_active, created_at, last_seen)
+                SELECT id, phone_number, session_file, is_active, created_at, last_seen FROM accounts
+            """)
+
+            # Удалить старую таблицу
+            cursor.execute("DROP TABLE accounts")
+
+            # Переименовать новую таблицу
+            cursor.execute("ALTER TABLE accounts_new RENAME TO accounts")
+        else:
+            # Проверить, существуют ли новые колонки, и добавить их, если нет
+            cursor.execute("PRAGMA table_info(accounts)")
+            columns = [column[1] for column in cursor.fetchall()]
+
+            if 'api_id' not in columns:
+                cursor.execute("ALTER TABLE accounts ADD COLUMN api_id INTEGER")
+            if 'api_hash' not in columns:
+                cursor.execute("ALTER TABLE accounts ADD COLUMN api_hash TEXT")
+            if 'session_string' not in columns:
+                cursor.execute("ALTER TABLE accounts ADD COLUMN session_string TEXT")
+    else:
+        # Создать новую таблицу с правильной структурой
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS accounts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                phone_number TEXT NOT NULL,
+                session_file TEXT NOT NULL,
+                is_active BOOLEAN DEFAULT TRUE,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                last_seen TIMESTAMP,
+                api_id INTEGER,
+                api_hash TEXT,
+                session_string TEXT
+            )
+        """)
+
+    # Таблица профилей личности
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS personality_profiles (
+            account_id INTEGER PRIMARY KEY,
+            base_config TEXT NOT NULL,
+            dynamic_config TEXT NOT NULL,
+            constraints_config TEXT NOT NULL,
+            evolution_enabled BOOLEAN DEFAULT TRUE,
+            personality_locked BOOLEAN DEFAULT FALSE,
+            last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (account_id) REFERENCES accounts(id)
+        )
+    """)
+
+    # Таблица памяти чатов
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS chat_memory (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            account_id INTEGER NOT NULL,
+            chat_id TEXT NOT NULL,
+            message_id INTEGER,
+            user_id TEXT,
+            username TEXT,
+            message_text TEXT,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            is_reply_to INTEGER,
+            context_data TEXT,
+            FOREIGN KEY (account_id) REFERENCES accounts(id)
+        )
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_chat_memory_account_chat 
+        ON chat_memory(account_id, chat_id, timestamp)
+    """)
+
+    # Таблица профилей пользователей
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS user_profiles (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            account_id INTEGER NOT NULL,
+            user_id TEXT NOT NULL,
+            username TEXT,
+            interaction_count INTEGER DEFAULT 0,
+            last_interaction TIMESTAMP,
+            communication_style TEXT,
+            relationship_score REAL DEFAULT 0.5,
+            notes TEXT,
+            FOREIGN KEY (account_id) REFERENCES accounts(id),
+            UNIQUE(account_id, user_id)
+        )
+    """)
+
+    # Таблица памяти тем
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS topic_memory (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            account_id INTEGER NOT NULL,
+            topic_keyword TEXT NOT NULL,
+            position TEXT,
+            priority REAL DEFAULT 0.5,
+            last_discussed TIMESTAMP,
+            discussion_count INTEGER DEFAULT 0,
+            FOREIGN KEY (account_id) REFERENCES accounts(id),
+            UNIQUE(account_id, topic_keyword)
+        )
+    """)
+
+    # Таблица лога взаимодействий
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS interaction_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            account_id INTEGER NOT NULL,
+            chat_id TEXT NOT NULL,
+            action_type TEXT NOT NULL,
+            message_id INTEGER,
+            response_text TEXT,
+            importance_score REAL,
+            decision_reason TEXT,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (account_id) REFERENCES accounts(id)
+        )
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_interaction_log_account_time 
+        ON interaction_log(account_id, timestamp)
+    """)
+
+    # Таблица истории эволюции
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS evolution_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            account_id INTEGER NOT NULL,
+            parameter_name TEXT NOT NULL,
+            old_value REAL,
+            new_value REAL,
+            reason TEXT,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (account_id) REFERENCES accounts(id)
+        )
+    """)
+
+
+
+def _retention(conn: sqlite3.Connection):
+    """Политики хранения и индекс для удаления лога по чатам"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS retention_policies (
+            account_id INTEGER PRIMARY KEY,
+            max_age_days INTEGER,
+            max_rows_per_chat INTEGER,
+            FOREIGN KEY (account_id) REFERENCES accounts(id)
+        )
+    """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_interaction_log_account_chat_time
+        ON interaction_log(account_id, chat_id, timestamp)
+    """)
+
+
+
+def _personality_scores(conn: sqlite3.Connection):
+    """Вынести topic_priorities и user_relationships из JSON профиля в таблицы"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS personality_topic_priorities (
+            account_id INTEGER NOT NULL,
+            topic TEXT NOT NULL,
+            priority REAL NOT NULL,
+            PRIMARY KEY (account_id, topic)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS personality_user_relationships (
+            account_id INTEGER NOT NULL,
+            user_id TEXT NOT NULL,
+            score REAL NOT NULL,
+            PRIMARY KEY (account_id, user_id)
+        ) WITHOUT ROWID
+    """)
+
+    rows = conn.execute("SELECT account_id, dynamic_config FROM personality_profiles").fetchall()
+    for account_id, dynamic_json in rows:
+        dynamic = json.loads(dynamic_json) if dynamic_json else {}
+        topics = dynamic.pop("topic_priorities", None) or {}
+        relationships = dynamic.pop("user_relationships", None) or {}
+        conn.executemany("""
+            INSERT OR REPLACE INTO personality_topic_priorities (account_id, topic, priority)
+            VALUES (?, ?, ?)
+        """, [(account_id, topic, value) for topic, value in topics.items()])
+        conn.executemany("""
+            INSERT OR REPLACE INTO personality_user_relationships (account_id, user_id, score)
+            VALUES (?, ?, ?)
+        """, [(account_id, user_id, value) for user_id, value in relationships.items()])
+        conn.execute(
+            "UPDATE personality_profiles SET dynamic_config = ? WHERE account_id = ?",
+            (json.dumps(dynamic), account_id),
+        )
+
+
+def _message_features(conn: sqlite3.Connection):
+    """Признаки сообщений - колонками chat_memory и боковой таблицей вместо JSON"""
+    conn.execute("ALTER TABLE chat_memory ADD COLUMN tone TEXT")
+    conn.execute("ALTER TABLE chat_memory ADD COLUMN is_question INTEGER NOT NULL DEFAULT 0")
+
+    # Ключевые слова (kind = 0) и упоминания (kind = 1) сообщений
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS chat_message_terms (
+            chat_memory_id INTEGER NOT NULL,
+            account_id INTEGER NOT NULL,
+            kind INTEGER NOT NULL,
+            term TEXT NOT NULL,
+            PRIMARY KEY (chat_memory_id, kind, term)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_chat_message_terms_term
+        ON chat_message_terms(account_id, kind, term, chat_memory_id)
+    """)
+    # Удаление сообщения (очистка, retention) удаляет и его термины
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_chat_memory_delete_terms
+        AFTER DELETE ON chat_memory
+        BEGIN
+            DELETE FROM chat_message_terms WHERE chat_memory_id = old.id;
+        END
+    """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_chat_memory_questions
+        ON chat_memory(account_id, chat_id, timestamp) WHERE is_question = 1
+    """)
+
+    # Перенести данные из context_data
+    conn.execute("""
+        UPDATE chat_memory SET
+            tone = json_extract(context_data, '$.tone'),
+            is_question = coalesce(json_extract(context_data, '$.is_question'), 0)
+        WHERE json_valid(context_data)
+    """)
+    for kind, path in ((0, "$.topic_keywords"), (1, "$.mentions")):
+        conn.execute(f"""
+            INSERT OR IGNORE INTO chat_message_terms (chat_memory_id, account_id, kind, term)
+            SELECT c.id, c.account_id, {kind}, j.value
+            FROM chat_memory c, json_each(c.context_data, '{path}') j
+            WHERE json_valid(c.context_data) AND j.type = 'text'
+        """)
+    conn.execute("ALTER TABLE chat_memory DROP COLUMN context_data")
+
+
+# Колонки времени: (таблица, колонка, хранилось ли значение по умолчанию в UTC)
+_TIMESTAMP_COLUMNS = [
+    ("accounts", "created_at", False),
+    ("accounts", "last_seen", False),
+    ("personality_profiles", "last_updated", False),
+    ("chat_memory", "timestamp", False),
+    ("user_profiles", "last_interaction", False),
+    ("topic_memory", "last_discussed", False),
+    ("interaction_log", "timestamp", False),
+    # Заполнялась DEFAULT CURRENT_TIMESTAMP, т.е. в UTC
+    ("evolution_history", "timestamp", True),
+]
+
+
+def _epoch_ms_timestamps(conn: sqlite3.Connection):
+    """Перевести текстовые datetime в целые миллисекунды эпохи"""
+    for table, column, is_utc in _TIMESTAMP_COLUMNS:
+        # Python записывал локальное время: модификатор 'utc' переводит его в UTC
+        julian = f"julianday({column})" if is_utc else f"julianday({column}, 'utc')"
+        conn.execute(f"""
+            UPDATE {table}
+            SET {column} = CAST(round(({julian} - 2440587.5) * 86400000) AS INTEGER)
+            WHERE typeof({column}) = 'text' AND julianday({column}) IS NOT NULL
+        """)
+
+
+def _chat_memory_fts(conn: sqlite3.Connection):
+    """Полнотекстовый индекс FTS5 по тексту сообщений, синхронизируемый триггерами"""
+    try:
+        conn.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS chat_memory_fts USING fts5(
+                message_text,
+                content='chat_memory',
+                content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2'
+            )
+        """)
+    except sqlite3.OperationalError as e:
+        # SQLite собран без FTS5: поиск по памяти работает через LIKE
+        print(f"FTS5 is not available, full-text memory search disabled: {e}")
+        return
+
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_chat_memory_fts_insert
+        AFTER INSERT ON chat_memory
+        BEGIN
+            INSERT INTO chat_memory_fts (rowid, message_text) VALUES (new.id, new.message_text);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_chat_memory_fts_delete
+        AFTER DELETE ON chat_memory
+        BEGIN
+            INSERT INTO chat_memory_fts (chat_memory_fts, rowid, message_text)
+            VALUES ('delete', old.id, old.message_text);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_chat_memory_fts_update
+        AFTER UPDATE OF message_text ON chat_memory
+        BEGIN
+            INSERT INTO chat_memory_fts (chat_memory_fts, rowid, message_text)
+            VALUES ('delete', old.id, old.message_text);
+            INSERT INTO chat_memory_fts (rowid, message_text) VALUES (new.id, new.message_text);
+        END
+    """)
+    # Проиндексировать уже сохраненные сообщения
+    conn.execute("INSERT INTO chat_memory_fts (chat_memory_fts) VALUES ('rebuild')")
+
+
+# Поддерживает ли FTS5 эта сборка SQLite (проверяется один раз на процесс)
+_fts5_supported: Optional[bool] = None
+
+
+def fts5_supported() -> bool:
+    """Есть ли FTS5 в SQLite текущего процесса (проверка на БД в памяти, без блокировок)"""
+    global _fts5_supported
+    if _fts5_supported is None:
+        conn = sqlite3.connect(":memory:")
+        try:
+            conn.execute("CREATE VIRTUAL TABLE fts5_probe USING fts5(text)")
+            _fts5_supported = True
+        except sqlite3.OperationalError:
+            _fts5_supported = False
+        finally:
+            conn.close()
+    return _fts5_supported
+
+
+def _chat_memory_fts_missing(conn: sqlite3.Connection) -> bool:
+    """
+    Миграция 6 прошла без FTS5 - повторить ее, если SQLite теперь с FTS5
+
+    Без FTS5 повторять нечего: старт с актуальной схемой не берет
+    блокировку записи и не пытается создать индекс заново.
+    """
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'chat_memory_fts'"
+    ).fetchone()
+    return row is None and fts5_supported()
+
+
+def _keyset_indexes(conn: sqlite3.Connection):
+    """Индекс лога по типу действия для постраничного чтения"""
+    # Индексы (..., timestamp) неявно заканчиваются rowid = id, поэтому
+    # уже упорядочены по (timestamp, id) и подходят для keyset-пагинации
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_interaction_log_account_action_time
+        ON interaction_log(account_id, action_type, timestamp)
+    """)
+
+
+def _interaction_rollup(conn: sqlite3.Connection):
+    """Почасовые счетчики решений вместо строки лога на каждое игнорирование"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS interaction_rollup (
+            account_id INTEGER NOT NULL,
+            hour INTEGER NOT NULL,
+            chat_id TEXT NOT NULL,
+            action_type TEXT NOT NULL,
+            reason_class TEXT NOT NULL,
+            total INTEGER NOT NULL DEFAULT 0,
+            score_sum REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (account_id, hour, chat_id, action_type, reason_class)
+        ) WITHOUT ROWID
+    """)
+    # Старые строки лога: класс причины не сохранялся
+    conn.execute("""
+        INSERT INTO interaction_rollup
+            (account_id, hour, chat_id, action_type, reason_class, total, score_sum)
+        SELECT account_id, timestamp - timestamp % 3600000, chat_id, action_type, 'legacy',
+               count(*), coalesce(sum(importance_score), 0)
+        FROM interaction_log
+        WHERE timestamp IS NOT NULL
+        GROUP BY account_id, timestamp - timestamp % 3600000, chat_id, action_type
+    """)
+
+
+def _account_stats(conn: sqlite3.Connection):
+    """Накопленная статистика аккаунтов и индекс счетчиков по часу"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS account_stats (
+            account_id INTEGER PRIMARY KEY,
+            messages_received INTEGER NOT NULL DEFAULT 0,
+            messages_responded INTEGER NOT NULL DEFAULT 0,
+            messages_reacted INTEGER NOT NULL DEFAULT 0,
+            messages_ignored INTEGER NOT NULL DEFAULT 0,
+            last_activity INTEGER
+        )
+    """)
+    # Окно "за последние часы" по всем аккаунтам сразу
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_interaction_rollup_hour
+        ON interaction_rollup(hour)
+    """)
+
+    # Начальные значения: сообщения - из chat_memory (без уже удаленных
+    # политикой хранения), решения - из почасовых счетчиков
+    conn.execute("""
+        INSERT INTO account_stats (account_id, messages_received, last_activity)
+        SELECT account_id, count(*), max(timestamp) FROM chat_memory GROUP BY account_id
+    """)
+    conn.execute("""
+        INSERT INTO account_stats (account_id, messages_responded, messages_reacted, messages_ignored)
+        SELECT account_id,
+               sum(CASE WHEN action_type = 'message' THEN total ELSE 0 END),
+               sum(CASE WHEN action_type = 'react' THEN total ELSE 0 END),
+               sum(CASE WHEN action_type = 'ignore' THEN total ELSE 0 END)
+        FROM interaction_rollup WHERE true GROUP BY account_id
+        ON CONFLICT(account_id) DO UPDATE SET
+            messages_responded = excluded.messages_responded,
+            messages_reacted = excluded.messages_reacted,
+            messages_ignored = excluded.messages_ignored
+    """)
+
+
+def _evolution_series(conn: sqlite3.Connection):
+    """Индекс истории эволюции по параметру и почасовые агрегаты старых изменений"""
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_evolution_history_param_time
+        ON evolution_history(account_id, parameter_name, timestamp)
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS evolution_history_hourly (
+            account_id INTEGER NOT NULL,
+            parameter_name TEXT NOT NULL,
+            hour INTEGER NOT NULL,
+            open_value REAL,
+            close_value REAL,
+            min_value REAL,
+            max_value REAL,
+            changes INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (account_id, parameter_name, hour)
+        ) WITHOUT ROWID
+    """)
+
+
+def _chat_summaries(conn: sqlite3.Connection):
+    """Сжатое содержание ранней части разговора по чатам"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS chat_summaries (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            account_id INTEGER NOT NULL,
+            chat_id TEXT NOT NULL,
+            summary TEXT NOT NULL,
+            covered_until INTEGER NOT NULL,
+            covered_message_id INTEGER,
+            messages_folded INTEGER NOT NULL DEFAULT 0,
+            updated_at INTEGER NOT NULL,
+            UNIQUE(account_id, chat_id)
+        )
+    """)
+
+
+def _deferred_stats(conn: sqlite3.Connection):
+    """Отдельный счетчик отложенных решений (раньше они учитывались как ignore)"""
+    conn.execute("""
+        ALTER TABLE account_stats ADD COLUMN messages_deferred INTEGER NOT NULL DEFAULT 0
+    """)
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "baseline schema", _baseline_schema),
+    Migration(2, "retention policies", _retention),
+    Migration(3, "normalized personality scores", _personality_scores),
+    Migration(4, "columnar message features", _message_features),
+    Migration(5, "epoch milliseconds timestamps", _epoch_ms_timestamps),
+    Migration(6, "chat memory full-text index", _chat_memory_fts, _chat_memory_fts_missing),
+    Migration(7, "keyset pagination indexes", _keyset_indexes),
+    Migration(8, "hourly interaction counters", _interaction_rollup),
+    Migration(9, "persisted account statistics", _account_stats),
+    Migration(10, "evolution history series", _evolution_series),
+    Migration(11, "rolling chat summaries", _chat_summaries),
+    Migration(12, "deferred decisions counter", _deferred_stats),
+]
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """Текущая версия схемы"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def latest_version(migrations: List[Migration] = None) -> int:
+    """Версия схемы после применения всех миграций"""
+    migrations = MIGRATIONS if migrations is None else migrations
+    return max((m.version for m in migrations), default=0)
+
+
+def migrate(conn: sqlite3.Connection, migrations: List[Migration] = None) -> int:
+    """
+    Применить недостающие миграции и повторить примененные не полностью
+    
+    Args:
+        conn: Соединение с БД
+        migrations: Список миграций (по умолчанию MIGRATIONS)
+        
+    Returns:
+        Версия схемы после миграции
+    """
+    migrations = MIGRATIONS if migrations is None else migrations
+    version = get_schema_version(conn)
+    if version < latest_version(migrations):
+        for migration in sorted(migrations, key=lambda m: m.version):
+            if migration.version <= version:
+                continue
+
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Другой процесс мог успеть применить миграцию, пока мы ждали блокировку
+                version = get_schema_version(conn)
+                if migration.version <= version:
+                    conn.rollback()
+                    continue
+                migration.apply(conn)
+                conn.execute(f"PRAGMA user_version = {int(migration.version)}")
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            version = migration.version
+
+    for migration in migrations:
+        if migration.incomplete is None or migration.version > version:
+            continue
+        if not migration.incomplete(conn):
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Повтор идемпотентен: другой процесс мог уже довести миграцию
+            if migration.incomplete(conn):
+                migration.apply(conn)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+    return version
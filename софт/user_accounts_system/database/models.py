@@ -3,10 +3,12 @@
 """
 
 from datetime import datetime
-from typing import Optional, Dict, List, Any
+from typing import Optional, Dict, List, Any, Callable, Tuple
 from dataclasses import dataclass, asdict
 import json
 
+from .timestamps import to_epoch_ms
+
 
 @dataclass
 class Account:
@@ -60,6 +62,104 @@ class BasePersonalityConfig:
         return asdict(self)
 
 
+class LazyScoreMap(dict):
+    """
+    Словарь оценок (ключ -> 0.0-1.0), загружаемый из БД при первом обращении.
+
+    Используется для topic_priorities и user_relationships: они хранятся в
+    отдельных таблицах и читаются только тогда, когда действительно нужны.
+    """
+
+    def __init__(self, *args, loader: Optional[Callable[[], Dict[str, float]]] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._loader = loader
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._loader is None
+
+    def _ensure_loaded(self):
+        if self._loader is not None:
+            self.fill(self._loader())
+
+    def fill(self, loaded: Dict[str, float]):
+        """
+        Заполнить значениями, прочитанными заранее (например, через async_db),
+        чтобы первое обращение не читало БД синхронно; если словарь уже
+        загружен, ничего не делает
+        """
+        if self._loader is None:
+            return
+        self._loader = None
+        # Значения, заданные до загрузки, имеют приоритет
+        for key, value in loaded.items():
+            dict.setdefault(self, key, value)
+
+    def __getitem__(self, key):
+        self._ensure_loaded()
+        return super().__getitem__(key)
+
+    def __setitem__(self, key, value):
+        self._ensure_loaded()
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key):
+        self._ensure_loaded()
+        super().__delitem__(key)
+
+    def __contains__(self, key):
+        self._ensure_loaded()
+        return super().__contains__(key)
+
+    def __iter__(self):
+        self._ensure_loaded()
+        return super().__iter__()
+
+    def __len__(self):
+        self._ensure_loaded()
+        return super().__len__()
+
+    def __eq__(self, other):
+        self._ensure_loaded()
+        return super().__eq__(other)
+
+    def __repr__(self):
+        self._ensure_loaded()
+        return super().__repr__()
+
+    def get(self, key, default=None):
+        self._ensure_loaded()
+        return super().get(key, default)
+
+    def setdefault(self, key, default=None):
+        self._ensure_loaded()
+        return super().setdefault(key, default)
+
+    def pop(self, key, *args):
+        self._ensure_loaded()
+        return super().pop(key, *args)
+
+    def keys(self):
+        self._ensure_loaded()
+        return super().keys()
+
+    def values(self):
+        self._ensure_loaded()
+        return super().values()
+
+    def items(self):
+        self._ensure_loaded()
+        return super().items()
+
+    def update(self, *args, **kwargs):
+        self._ensure_loaded()
+        super().update(*args, **kwargs)
+
+    def copy(self) -> Dict[str, float]:
+        self._ensure_loaded()
+        return dict(self)
+
+
 @dataclass
 class DynamicPersonalityConfig:
     """Динамические параметры личности (эволюционируют)"""
@@ -74,9 +174,19 @@ class DynamicPersonalityConfig:
         if self.user_relationships is None:
             self.user_relationships = {}
 
+    # Словари, которые хранятся в отдельных таблицах, а не в JSON профиля
+    SCORE_MAPS = ("topic_priorities", "user_relationships")
+
     def to_dict(self) -> Dict:
         return asdict(self)
 
+    def to_scalar_dict(self) -> Dict:
+        """Параметры без topic_priorities/user_relationships (для JSON в БД)"""
+        return {
+            "discussion_tendency": self.discussion_tendency,
+            "activity_level": self.activity_level,
+        }
+
 
 @dataclass
 class PersonalityConstraints:
@@ -148,14 +258,29 @@ class ChatMessage:
     message_text: str = ""
     timestamp: Optional[datetime] = None
     is_reply_to: Optional[int] = None
-    context_data: Dict[str, Any] = None
+    tone: Optional[str] = None
+    is_question: bool = False
+    topic_keywords: List[str] = None
+    mentions: List[str] = None
 
     def __post_init__(self):
-        if self.context_data is None:
-            self.context_data = {}
+        if self.topic_keywords is None:
+            self.topic_keywords = []
+        if self.mentions is None:
+            self.mentions = []
         if self.timestamp is None:
             self.timestamp = datetime.now()
 
+    @property
+    def context_data(self) -> Dict[str, Any]:
+        """Признаки сообщения в прежнем формате словаря"""
+        return {
+            "tone": self.tone,
+            "is_question": self.is_question,
+            "topic_keywords": self.topic_keywords,
+            "mentions": self.mentions,
+        }
+
     def to_dict(self) -> Dict:
         return {
             "id": self.id,
@@ -171,6 +296,56 @@ class ChatMessage:
         }
 
 
+@dataclass
+class ChatSearchResult:
+    """Найденное полнотекстовым поиском сообщение"""
+    message: ChatMessage
+    snippet: str = ""  # Фрагмент текста с выделенными совпадениями
+    rank: float = 0.0  # bm25: чем меньше, тем релевантнее
+
+    def to_dict(self) -> Dict:
+        return {
+            "message": self.message.to_dict(),
+            "snippet": self.snippet,
+            "rank": self.rank,
+        }
+
+
+@dataclass
+class ChatSummary:
+    """Сжатое содержание ранней части разговора в чате"""
+    id: Optional[int] = None
+    account_id: int = 0
+    chat_id: str = ""
+    summary: str = ""
+    covered_until: Optional[datetime] = None  # Время последнего сообщения, вошедшего в сводку
+    covered_message_id: Optional[int] = None  # Его message_id
+    messages_folded: int = 0  # Сколько сообщений всего свернуто в сводку
+    updated_at: Optional[datetime] = None
+
+    def covers(self, message: "ChatMessage") -> bool:
+        """Вошло ли сообщение в сводку"""
+        if self.covered_until is None or message.timestamp is None:
+            return False
+        # Сравнение в миллисекундах, как время хранится в БД
+        timestamp, covered_until = to_epoch_ms(message.timestamp), to_epoch_ms(self.covered_until)
+        if timestamp != covered_until:
+            return timestamp < covered_until
+        return self.covered_message_id is not None and message.message_id <= self.covered_message_id
+
+    def to_dict(self) -> Dict:
+        return {
+            "id": self.id,
+            "account_id": self.account_id,
+            "chat_id": self.chat_id,
+            "summary": self.summary,
+            "covered_until": self.covered_until.isoformat() if self.covered_until else None,
+            "covered_message_id": self.covered_message_id,
+            "messages_folded": self.messages_folded,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+        }
+
+
 @dataclass
 class UserProfile:
     """Профиль пользователя для памяти"""
@@ -225,18 +400,26 @@ class TopicMemory:
         }
 
 
+# Действия лога взаимодействий: ответ, реакция, игнорирование, откладывание
+INTERACTION_ACTIONS = ("message", "react", "ignore", "defer")
+
+
 @dataclass
 class InteractionLog:
     """Лог взаимодействий"""
     id: Optional[int] = None
     account_id: int = 0
     chat_id: str = ""
-    action_type: str = ""  # 'message', 'reaction', 'ignore'
+    action_type: str = ""  # Одно из INTERACTION_ACTIONS
     message_id: Optional[int] = None
     response_text: Optional[str] = None
     importance_score: Optional[float] = None
     decision_reason: Optional[str] = None
     timestamp: Optional[datetime] = None
+    # Не хранятся в строке лога: класс причины для почасовых счетчиков и
+    # признак, что строку надо сохранить целиком (иначе учитывается только в счетчиках)
+    reason_class: Optional[str] = None
+    keep_row: bool = True
 
     def __post_init__(self):
         if self.timestamp is None:
@@ -255,3 +438,128 @@ class InteractionLog:
             "timestamp": self.timestamp.isoformat() if self.timestamp else None,
         }
 
+
+@dataclass
+class InteractionCounter:
+    """Почасовой счетчик решений по чату, действию и классу причины"""
+    account_id: int = 0
+    chat_id: str = ""
+    hour: Optional[datetime] = None  # Начало часа
+    action_type: str = ""
+    reason_class: str = ""
+    total: int = 0
+    score_sum: float = 0.0  # Сумма importance_score (для средней оценки)
+
+    def to_dict(self) -> Dict:
+        return {
+            "account_id": self.account_id,
+            "chat_id": self.chat_id,
+            "hour": self.hour.isoformat() if self.hour else None,
+            "action_type": self.action_type,
+            "reason_class": self.reason_class,
+            "total": self.total,
+            "score_sum": self.score_sum,
+        }
+
+
+@dataclass
+class EvolutionPoint:
+    """Точка ряда параметра личности (агрегат изменений за интервал)"""
+    start: Optional[datetime] = None  # Начало интервала
+    value: Optional[float] = None  # Значение в конце интервала
+    min_value: Optional[float] = None
+    max_value: Optional[float] = None
+    changes: int = 0  # Сколько изменений попало в интервал
+
+    def to_dict(self) -> Dict:
+        return {
+            "start": self.start.isoformat() if self.start else None,
+            "value": self.value,
+            "min_value": self.min_value,
+            "max_value": self.max_value,
+            "changes": self.changes,
+        }
+
+
+@dataclass
+class AccountStats:
+    """Накопленная статистика аккаунта (обновляется при записи сообщений и лога)"""
+    account_id: int = 0
+    messages_received: int = 0
+    messages_responded: int = 0
+    messages_reacted: int = 0
+    messages_ignored: int = 0
+    messages_deferred: int = 0
+    last_activity: Optional[datetime] = None
+    # Решения за последние recent_hours часов (по часовым счетчикам):
+    # received, responded, reacted, ignored, deferred
+    recent: Dict[str, int] = None
+    recent_hours: int = 24
+
+    def __post_init__(self):
+        if self.recent is None:
+            self.recent = {"received": 0, "responded": 0, "reacted": 0, "ignored": 0, "deferred": 0}
+
+    def to_dict(self) -> Dict:
+        return {
+            "account_id": self.account_id,
+            "messages_received": self.messages_received,
+            "messages_responded": self.messages_responded,
+            "messages_reacted": self.messages_reacted,
+            "messages_ignored": self.messages_ignored,
+            "messages_deferred": self.messages_deferred,
+            "last_activity": self.last_activity.isoformat() if self.last_activity else None,
+            "recent": self.recent,
+            "recent_hours": self.recent_hours,
+        }
+
+
+@dataclass
+class Page:
+    """
+    Страница keyset-пагинации по (timestamp, id)
+
+    Записи идут в порядке листания: от новых к старым (курсор before или без
+    курсора) или от старых к новым (курсор after).
+    """
+    items: List[Any]
+    has_more: bool = False  # Есть ли еще записи в направлении листания
+    before: Optional[str] = None  # Курсор самой старой записи страницы (для более старых)
+    after: Optional[str] = None  # Курсор самой новой записи страницы (для более новых)
+
+    @staticmethod
+    def encode_cursor(timestamp_ms: int, row_id: int) -> str:
+        return f"{timestamp_ms}:{row_id}"
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[int, int]:
+        """Курсор -> (timestamp_ms, id); ValueError, если курсор испорчен"""
+        try:
+            timestamp_ms, row_id = cursor.split(":")
+            return int(timestamp_ms), int(row_id)
+        except (AttributeError, ValueError):
+            raise ValueError(f"Invalid page cursor: {cursor!r}")
+
+    def to_dict(self) -> Dict:
+        return {
+            "items": [item.to_dict() for item in self.items],
+            "has_more": self.has_more,
+            "before": self.before,
+            "after": self.after,
+        }
+
+
+
+@dataclass
+class RetentionPolicy:
+    """Политика хранения истории для аккаунта"""
+    account_id: int = 0
+    max_age_days: Optional[int] = None  # Удалять записи старше N дней
+    max_rows_per_chat: Optional[int] = None  # Хранить не больше N записей на чат
+
+    def to_dict(self) -> Dict:
+        return {
+            "account_id": self.account_id,
+            "max_age_days": self.max_age_days,
+            "max_rows_per_chat": self.max_rows_per_chat,
+        }
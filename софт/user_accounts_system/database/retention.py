@@ -0,0 +1,133 @@
+"""
+Фоновое удаление устаревшей истории по политикам хранения
+"""
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from .async_db import AsyncDatabaseManager
+from .models import RetentionPolicy
+
+
+class RetentionPruner:
+    """
+    Периодически применяет политики хранения (RetentionPolicy) к
+    chat_memory и interaction_log и сворачивает старую историю эволюции
+    личности в почасовые агрегаты.
+
+    Удаление идет небольшими порциями по индексу (account_id, chat_id,
+    timestamp), каждая порция - отдельная транзакция в потоке записи,
+    поэтому обработка сообщений не блокируется. После прохода свободные
+    страницы возвращаются ОС через incremental_vacuum.
+    """
+
+    def __init__(
+        self,
+        async_db: AsyncDatabaseManager,
+        interval: float = 3600,
+        batch_size: int = 500,
+        vacuum_pages: int = 2000,
+        evolution_raw_days: int = 7,
+        on_prune: Optional[Callable[[RetentionPolicy], Awaitable[Any]]] = None,
+    ):
+        """
+        Args:
+            async_db: Асинхронный фасад БД
+            interval: Период между проходами (секунды)
+            batch_size: Строк на одну транзакцию удаления
+            vacuum_pages: Страниц, возвращаемых ОС за один incremental_vacuum
+            evolution_raw_days: Сколько дней хранить изменения личности построчно
+                (более старые сворачиваются в почасовые агрегаты)
+            on_prune: Вызывается после применения политики аккаунта к БД
+                (например, чтобы применить ее к семантическому индексу)
+        """
+        self.async_db = async_db
+        self.interval = interval
+        self.batch_size = batch_size
+        self.vacuum_pages = vacuum_pages
+        self.evolution_raw_days = evolution_raw_days
+        self.on_prune = on_prune
+        self._task: Optional[asyncio.Task] = None
+
+        self.stats = {
+            "runs": 0,
+            "rows_deleted": 0,
+            "evolution_rows_compacted": 0,
+            "last_run_ms": 0.0,
+            "free_pages": 0,
+        }
+
+    def start(self):
+        """Запустить периодическую очистку в текущем event loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Остановить периодическую очистку"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Retention pruning failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self) -> Dict[int, int]:
+        """Применить все политики хранения, вернуть {account_id: удалено строк}"""
+        started = time.perf_counter()
+        deleted = {}
+        for policy in await self.async_db.get_retention_policies():
+            deleted[policy.account_id] = await self.prune_account(policy)
+            if self.on_prune is not None:
+                await self.on_prune(policy)
+        compacted = await self.compact_evolution()
+
+        if any(deleted.values()) or compacted:
+            self.stats["free_pages"] = await self.async_db.incremental_vacuum(self.vacuum_pages)
+
+        self.stats["runs"] += 1
+        self.stats["rows_deleted"] += sum(deleted.values())
+        self.stats["last_run_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        return deleted
+
+    async def prune_account(self, policy: RetentionPolicy) -> int:
+        """Применить политику одного аккаунта ко всем его чатам"""
+        if not policy.max_age_days and not policy.max_rows_per_chat:
+            return 0
+
+        total = 0
+        for chat_id in await self.async_db.get_chat_ids(policy.account_id):
+            while True:
+                deleted = await self.async_db.prune_chat(policy, chat_id, self.batch_size)
+                total += deleted
+                if deleted < self.batch_size:
+                    break
+        return total
+
+    async def compact_evolution(self) -> int:
+        """Свернуть старую историю эволюции порциями, вернуть число свернутых строк"""
+        total = 0
+        while True:
+            compacted = await self.async_db.compact_evolution_history(
+                self.evolution_raw_days, self.batch_size
+            )
+            total += compacted
+            if not compacted:
+                break
+        self.stats["evolution_rows_compacted"] += total
+        return total
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Получить статистику очистки"""
+        return dict(self.stats)
@@ -0,0 +1,129 @@
+"""
+Офлайн-разделение общей БД на каталог аккаунтов и файлы по аккаунтам
+
+Запуск (при остановленной системе):
+    python -m user_accounts_system.database.sharding data/accounts.db data/catalog.db [data/shards]
+"""
+
+import sqlite3
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from .db_manager import DatabaseManager
+
+# Таблицы общего каталога
+CATALOG_TABLES = ("accounts", "retention_policies")
+
+# Таблицы, которые переносятся в файл аккаунта (chat_memory раньше
+# chat_message_terms; chat_memory_fts заполняется триггерами вставки)
+SHARD_TABLES = (
+    "chat_memory",
+    "chat_message_terms",
+    "chat_summaries",
+    "user_profiles",
+    "topic_memory",
+    "interaction_log",
+    "interaction_rollup",
+    "account_stats",
+    "evolution_history",
+    "evolution_history_hourly",
+    "personality_profiles",
+    "personality_topic_priorities",
+    "personality_user_relationships",
+)
+
+
+def _common_columns(conn: sqlite3.Connection, table: str) -> List[str]:
+    """Колонки таблицы, которые есть и в источнике, и в приемнике"""
+    target = [row[1] for row in conn.execute(f"PRAGMA main.table_info({table})")]
+    source = {row[1] for row in conn.execute(f"PRAGMA src.table_info({table})")}
+    return [column for column in target if column in source]
+
+
+def _copy_table(conn: sqlite3.Connection, table: str, account_id: Optional[int] = None) -> int:
+    """Скопировать строки таблицы из src (всё или только одного аккаунта)"""
+    columns = ", ".join(_common_columns(conn, table))
+    where, params = ("WHERE account_id = ?", (account_id,)) if account_id is not None else ("", ())
+    cursor = conn.execute(f"""
+        INSERT INTO main.{table} ({columns})
+        SELECT {columns} FROM src.{table} {where}
+    """, params)
+    return cursor.rowcount
+
+
+def _copy_from(conn: sqlite3.Connection, source_path: str, tables, account_id: Optional[int] = None) -> int:
+    """Подключить источник к соединению и скопировать таблицы одной транзакцией"""
+    conn.execute("ATTACH DATABASE ? AS src", (source_path,))
+    try:
+        copied = sum(_copy_table(conn, table, account_id) for table in tables)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        conn.execute("DETACH DATABASE src")
+    return copied
+
+
+def split_database(source_path: str, catalog_path: str, shard_dir: Optional[str] = None) -> Dict[int, int]:
+    """
+    Разделить общую БД на каталог и файлы аккаунтов
+
+    Источник не изменяется (кроме миграции схемы до актуальной версии).
+
+    Args:
+        source_path: Существующая общая БД
+        catalog_path: Новый каталог (должен быть пустым или отсутствовать)
+        shard_dir: Папка файлов аккаунтов (по умолчанию shards/ рядом с каталогом)
+
+    Returns:
+        Количество перенесенных строк по аккаунтам
+    """
+    if Path(source_path).resolve() == Path(catalog_path).resolve():
+        raise ValueError("Catalog must be a new file, not the source database")
+
+    # Довести схему источника до актуальной, чтобы колонки совпадали
+    DatabaseManager(source_path).close()
+
+    target = DatabaseManager(catalog_path, sharded=True, shard_dir=shard_dir)
+    try:
+        if target.get_all_accounts():
+            raise ValueError(f"Catalog {catalog_path} is not empty")
+
+        with target.pool.connection() as conn:
+            _copy_from(conn, source_path, CATALOG_TABLES)
+
+        # Аккаунты каталога и те, чьи строки остались без записи в accounts
+        source = sqlite3.connect(source_path)
+        try:
+            union = " UNION ".join(f"SELECT account_id FROM {table}" for table in SHARD_TABLES)
+            account_ids = sorted(
+                row[0] for row in source.execute(f"SELECT id FROM accounts UNION {union}")
+                if row[0] is not None
+            )
+        finally:
+            source.close()
+
+        copied = {}
+        for account_id in account_ids:
+            with target._pool_for(account_id).connection() as conn:
+                copied[account_id] = _copy_from(conn, source_path, SHARD_TABLES, account_id)
+        return copied
+    finally:
+        target.close()
+
+
+def main(argv: List[str]):
+    if len(argv) not in (2, 3):
+        print(__doc__)
+        return 1
+
+    copied = split_database(*argv)
+    for account_id, rows in copied.items():
+        print(f"account {account_id}: {rows} rows")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
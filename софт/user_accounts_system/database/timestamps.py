@@ -0,0 +1,39 @@
+"""
+Время в БД: целые миллисекунды Unix-эпохи
+
+Модели по-прежнему работают с наивными datetime в локальном времени
+(datetime.now()); в БД хранится INTEGER, поэтому выборки по диапазону
+времени сравнивают целые числа, а чтение не разбирает строки.
+"""
+
+import time
+from datetime import datetime
+from typing import Optional
+
+_fromtimestamp = datetime.fromtimestamp
+
+HOUR_MS = 3_600_000
+
+
+def to_epoch_ms(value: Optional[datetime]) -> Optional[int]:
+    """datetime -> миллисекунды эпохи (None остается None)"""
+    if value is None:
+        return None
+    return round(value.timestamp() * 1000)
+
+
+def from_epoch_ms(value: Optional[int]) -> Optional[datetime]:
+    """Миллисекунды эпохи -> локальный наивный datetime (None остается None)"""
+    if value is None:
+        return None
+    return _fromtimestamp(value / 1000)
+
+
+def now_ms() -> int:
+    """Текущее время в миллисекундах эпохи"""
+    return time.time_ns() // 1_000_000
+
+
+def hour_start_ms(value: int) -> int:
+    """Начало часа (UTC, как и эпоха) для миллисекунд эпохи"""
+    return value - value % HOUR_MS
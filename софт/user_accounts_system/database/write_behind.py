@@ -0,0 +1,206 @@
+"""
+Очередь отложенной записи (write-behind) для chat_memory и interaction_log
+"""
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import List, Dict, Any, Callable, Optional, Tuple, TYPE_CHECKING
+
+from .models import ChatMessage, InteractionLog
+
+if TYPE_CHECKING:
+    from .db_manager import DatabaseManager
+
+
+@dataclass
+class WriteBehindConfig:
+    """Настройки очереди отложенной записи"""
+    enabled: bool = True
+    batch_size: int = 500  # Сбросить очередь, как только накопится столько строк
+    flush_interval: float = 0.5  # Максимальное время жизни строки в очереди (секунды)
+    max_pending: int = 20000  # Потолок памяти: при превышении запись ждет сброса
+    synchronous: str = "NORMAL"  # PRAGMA synchronous для транзакций сброса
+    write_through: bool = False  # Писать каждую строку сразу (без буферизации)
+
+    # Предустановки: чем выше надежность, тем ниже пропускная способность
+    DURABILITY_PRESETS = {
+        # Каждая строка - отдельная транзакция с fsync, потерь при сбое нет
+        "strict": {"write_through": True, "synchronous": "FULL"},
+        # Группы до 500 строк, при сбое теряется не больше flush_interval
+        "balanced": {"batch_size": 500, "flush_interval": 0.5, "synchronous": "NORMAL"},
+        # Большие группы без fsync, при сбое ОС теряются последние секунды
+        "fast": {"batch_size": 2000, "flush_interval": 2.0, "synchronous": "OFF"},
+    }
+
+    @classmethod
+    def for_durability(cls, level: str, **overrides) -> "WriteBehindConfig":
+        """Создать конфигурацию по уровню надежности (strict | balanced | fast)"""
+        if level not in cls.DURABILITY_PRESETS:
+            raise ValueError(f"Unknown durability level: {level}")
+        params = dict(cls.DURABILITY_PRESETS[level])
+        params.update(overrides)
+        return cls(**params)
+
+
+class WriteBehindQueue:
+    """
+    Буфер строк ChatMessage и InteractionLog с групповой фиксацией.
+
+    Строки накапливаются в памяти и записываются фоновым потоком через
+    executemany в одной транзакции - по достижении batch_size или раз в
+    flush_interval. Если в очереди max_pending строк, добавление блокирует
+    вызывающий поток до ближайшего сброса, так что память ограничена.
+    """
+
+    def __init__(self, db: "DatabaseManager", config: WriteBehindConfig = None):
+        self.db = db
+        self.config = config or WriteBehindConfig()
+
+        self._messages: List[ChatMessage] = []
+        self._interactions: List[InteractionLog] = []
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._closed = False
+        self._thread = None
+
+        self.stats = {
+            "enqueued": 0,
+            "flushed_rows": 0,
+            "flushes": 0,
+            "failed_flushes": 0,
+            "backpressure_waits": 0,
+            "last_flush_ms": 0.0,
+        }
+
+    @property
+    def pending(self) -> int:
+        """Количество строк, ожидающих записи"""
+        return len(self._messages) + len(self._interactions)
+
+    def start(self):
+        """Запустить фоновый поток сброса"""
+        if self.config.write_through or (self._thread and self._thread.is_alive()):
+            return
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="db-write-behind", daemon=True)
+        self._thread.start()
+
+    def put_message(self, message: ChatMessage):
+        """Поставить сообщение в очередь на запись"""
+        if self.config.write_through:
+            self._write_through([message], [])
+        else:
+            self._put("_messages", message)
+
+    def put_interaction(self, interaction: InteractionLog):
+        """Поставить запись лога в очередь на запись"""
+        if self.config.write_through:
+            self._write_through([], [interaction])
+        else:
+            self._put("_interactions", interaction)
+
+    def _write_through(self, messages: List[ChatMessage], interactions: List[InteractionLog]):
+        """Записать строки сразу в вызывающем потоке"""
+        self.stats["enqueued"] += len(messages) + len(interactions)
+        self._write(messages, interactions)
+
+    def _put(self, buffer_name: str, row):
+        with self._cond:
+            while self.pending >= self.config.max_pending and not self._closed:
+                self.stats["backpressure_waits"] += 1
+                self._cond.notify_all()
+                self._cond.wait(self.config.flush_interval)
+            # Буфер берется после ожидания: flush мог заменить список, пока мы ждали
+            getattr(self, buffer_name).append(row)
+            self.stats["enqueued"] += 1
+            if self.pending >= self.config.batch_size:
+                self._cond.notify_all()
+
+    def _run(self):
+        """Цикл фонового потока: сброс по размеру или по времени"""
+        while True:
+            with self._cond:
+                if self.pending < self.config.batch_size and not self._closed:
+                    self._cond.wait(self.config.flush_interval)
+                closed = self._closed
+            failed_before = self.stats["failed_flushes"]
+            self.flush()
+            if closed:
+                return
+            if self.stats["failed_flushes"] != failed_before:
+                # Не крутиться в цикле, пока БД недоступна
+                time.sleep(self.config.flush_interval)
+
+    def flush(self) -> int:
+        """Записать всё накопленное в одной транзакции, вернуть число строк"""
+        return self._flush(None)
+
+    def flush_for(self, account_id: int, chat_id: Optional[str] = None) -> int:
+        """
+        Записать только строки аккаунта (или одного его чата), вернуть их число
+
+        Для чтения своих записей: остальные строки ждут группового сброса,
+        и чтение без ожидающих строк своего аккаунта ничего не пишет.
+        """
+        return self._flush(
+            lambda row: row.account_id == account_id and (chat_id is None or row.chat_id == chat_id)
+        )
+
+    def _flush(self, match: Optional[Callable[[Any], bool]]) -> int:
+        with self._flush_lock:
+            with self._cond:
+                if match is None:
+                    messages, self._messages = self._messages, []
+                    interactions, self._interactions = self._interactions, []
+                else:
+                    messages, self._messages = self._split(self._messages, match)
+                    interactions, self._interactions = self._split(self._interactions, match)
+            if not messages and not interactions:
+                return 0
+
+            try:
+                self._write(messages, interactions)
+            except Exception as e:
+                # Вернуть строки в начало очереди, чтобы не потерять их
+                with self._cond:
+                    self._messages[:0] = messages
+                    self._interactions[:0] = interactions
+                self.stats["failed_flushes"] += 1
+                print(f"Write-behind flush failed: {e}")
+                return 0
+            finally:
+                with self._cond:
+                    self._cond.notify_all()
+
+            return len(messages) + len(interactions)
+
+    @staticmethod
+    def _split(rows: list, match: Callable[[Any], bool]) -> Tuple[list, list]:
+        """(подходящие строки, остальные) с сохранением порядка"""
+        matched, rest = [], []
+        for row in rows:
+            (matched if match(row) else rest).append(row)
+        return matched, rest
+
+    def _write(self, messages: List[ChatMessage], interactions: List[InteractionLog]):
+        started = time.perf_counter()
+        # synchronous задается соединениям потока, который пишет группу
+        self.db.write_batch(messages, interactions, synchronous=self.config.synchronous)
+        self.stats["flushes"] += 1
+        self.stats["flushed_rows"] += len(messages) + len(interactions)
+        self.stats["last_flush_ms"] = round((time.perf_counter() - started) * 1000, 3)
+
+    def close(self):
+        """Сбросить очередь и остановить фоновый поток"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Получить статистику очереди"""
+        return {**self.stats, "pending": self.pending}
@@ -6,11 +6,14 @@ from .decision_engine import DecisionEngine, DecisionType, Decision
 from .context_analyzer import ContextAnalyzer
 from .importance_scorer import ImportanceScorer
 from .cooldown_manager import CooldownManager
+from .activity_counter import SlidingWindowCounter, ChatActivityTracker
 
 __all__ = [
     "DecisionEngine",
     "ContextAnalyzer",
     "ImportanceScorer",
     "CooldownManager",
+    "SlidingWindowCounter",
+    "ChatActivityTracker",
 ]
 
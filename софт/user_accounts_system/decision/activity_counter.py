@@ -0,0 +1,108 @@
+"""
+Счетчики активности чатов за скользящее окно
+"""
+
+import time
+from collections import OrderedDict
+from typing import Callable, Tuple
+
+
+class SlidingWindowCounter:
+    """
+    Число событий за последние window секунд
+
+    Окно разбито на кольцо корзин одинаковой ширины: добавление и чтение
+    сдвигают кольцо на прошедшие корзины и поддерживают сумму, поэтому не
+    зависят от числа событий. Точность - одна корзина (window / buckets).
+    """
+
+    def __init__(self, window: float = 3600.0, buckets: int = 60,
+                 clock: Callable[[], float] = time.monotonic):
+        self.window = window
+        self.bucket_width = window / buckets
+        self._clock = clock
+        self._counts = [0] * buckets
+        self._total = 0
+        # Абсолютный номер текущей корзины (время // ширина корзины)
+        self._current = int(clock() // self.bucket_width)
+
+    def _advance(self):
+        """Обнулить корзины, вышедшие из окна с прошлого обращения"""
+        index = int(self._clock() // self.bucket_width)
+        elapsed = index - self._current
+        if elapsed <= 0:
+            return
+
+        size = len(self._counts)
+        if elapsed >= size:
+            self._counts = [0] * size
+            self._total = 0
+        else:
+            for absolute in range(self._current + 1, index + 1):
+                slot = absolute % size
+                self._total -= self._counts[slot]
+                self._counts[slot] = 0
+        self._current = index
+
+    def add(self, amount: int = 1):
+        """Учесть событие"""
+        self._advance()
+        self._counts[self._current % len(self._counts)] += amount
+        self._total += amount
+
+    def count(self) -> int:
+        """Событий в окне"""
+        self._advance()
+        return self._total
+
+
+class ChatActivityTracker:
+    """
+    Частота входящих сообщений и наших ответов по чатам
+
+    Счетчики обновляются при приеме сообщения и отправке ответа, чтение -
+    без обращения к истории чата. Давно не активные чаты вытесняются сверх
+    max_chats.
+    """
+
+    def __init__(self, window: float = 3600.0, buckets: int = 60, max_chats: int = 5000,
+                 clock: Callable[[], float] = time.monotonic):
+        self.window = window
+        self.buckets = buckets
+        self.max_chats = max_chats
+        self._clock = clock
+        # chat_id -> (входящие сообщения, наши ответы)
+        self._chats: "OrderedDict[str, Tuple[SlidingWindowCounter, SlidingWindowCounter]]" = OrderedDict()
+
+    def _counters(self, chat_id: str) -> Tuple[SlidingWindowCounter, SlidingWindowCounter]:
+        """Счетчики чата (создаются при первом событии)"""
+        counters = self._chats.get(chat_id)
+        if counters is None:
+            counters = (
+                SlidingWindowCounter(self.window, self.buckets, self._clock),
+                SlidingWindowCounter(self.window, self.buckets, self._clock),
+            )
+            self._chats[chat_id] = counters
+            if len(self._chats) > self.max_chats:
+                self._chats.popitem(last=False)
+        else:
+            self._chats.move_to_end(chat_id)
+        return counters
+
+    def record_message(self, chat_id: str, count: int = 1):
+        """Учесть входящее сообщение"""
+        self._counters(chat_id)[0].add(count)
+
+    def record_response(self, chat_id: str, count: int = 1):
+        """Учесть наш ответ"""
+        self._counters(chat_id)[1].add(count)
+
+    def message_count(self, chat_id: str) -> int:
+        """Входящих сообщений в чате за окно"""
+        counters = self._chats.get(chat_id)
+        return counters[0].count() if counters else 0
+
+    def response_count(self, chat_id: str) -> int:
+        """Наших ответов в чате за окно"""
+        counters = self._chats.get(chat_id)
+        return counters[1].count() if counters else 0
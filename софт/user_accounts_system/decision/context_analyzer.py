@@ -15,13 +15,13 @@ class ContextAnalyzer:
     def __init__(self, profile: PersonalityProfile):
         self.profile = profile
 
-    def analyze(self, context: MessageContext, chat_history_count: int = 0) -> Dict[str, Any]:
+    def analyze(self, context: MessageContext, recent_messages_count: int = 0) -> Dict[str, Any]:
         """
         Проанализировать контекст сообщения
         
         Args:
             context: Контекст сообщения
-            chat_history_count: Количество сообщений в истории чата
+            recent_messages_count: Количество сообщений в чате за последний час
             
         Returns:
             Словарь с результатами анализа
@@ -32,7 +32,7 @@ class ContextAnalyzer:
             "tone": context.tone,
             "is_reply": context.is_reply,
             "topic_relevance": 0.0,
-            "chat_activity": self._analyze_chat_activity(chat_history_count),
+            "chat_activity": self._analyze_chat_activity(recent_messages_count),
             "user_relationship": 0.5,  # Будет заполнено из памяти
             "banned_check": self._check_banned(context),
         }
@@ -42,13 +42,13 @@ class ContextAnalyzer:
 
         return analysis
 
-    def _analyze_chat_activity(self, history_count: int) -> str:
-        """Проанализировать активность в чате"""
-        if history_count == 0:
+    def _analyze_chat_activity(self, messages_count: int) -> str:
+        """Проанализировать активность в чате по числу сообщений за час"""
+        if messages_count == 0:
             return "quiet"
-        elif history_count < 5:
+        elif messages_count < 5:
             return "low"
-        elif history_count < 20:
+        elif messages_count < 20:
             return "moderate"
         else:
             return "high"
@@ -11,6 +11,7 @@ from ..database.models import PersonalityProfile, UserProfile
 from .context_analyzer import ContextAnalyzer
 from .importance_scorer import ImportanceScorer
 from .cooldown_manager import CooldownManager
+from .activity_counter import ChatActivityTracker
 
 
 class DecisionType(Enum):
@@ -28,6 +29,7 @@ class Decision:
     importance_score: float
     reason: str
     delay: Optional[float] = None  # Задержка перед действием (секунды)
+    reason_class: str = "other"  # Класс причины без подробностей (для агрегированных счетчиков)
 
 
 class DecisionEngine:
@@ -37,27 +39,28 @@ class DecisionEngine:
     RESPOND_THRESHOLD = 0.5  # Порог для ответа
     REACT_THRESHOLD = 0.3  # Порог для реакции
 
-    def __init__(self, profile: PersonalityProfile):
+    def __init__(self, profile: PersonalityProfile, activity: Optional[ChatActivityTracker] = None):
         self.profile = profile
         self.context_analyzer = ContextAnalyzer(profile)
         self.importance_scorer = ImportanceScorer(profile)
         self.cooldown_manager = CooldownManager()
+        # Частота сообщений и ответов по чатам за последний час
+        self.activity = activity or ChatActivityTracker()
 
     def make_decision(
         self,
         context: MessageContext,
-        chat_history_count: int = 0,
         user_profile: Optional[UserProfile] = None,
-        recent_responses_count: int = 0,
     ) -> Decision:
         """
         Принять решение о действии
         
+        Активность чата и число недавних ответов берутся из счетчиков
+        self.activity (сообщение должно быть учтено до вызова).
+        
         Args:
             context: Контекст сообщения
-            chat_history_count: Количество сообщений в истории
             user_profile: Профиль пользователя
-            recent_responses_count: Количество недавних ответов
             
         Returns:
             Decision с решением
@@ -69,6 +72,7 @@ class DecisionEngine:
                 decision_type=DecisionType.IGNORE,
                 importance_score=-1.0,
                 reason=f"Chat {context.chat_id} not in allowed chats list",
+                reason_class="chat_not_allowed",
             )
 
         # Проверка ограничений автономности
@@ -77,10 +81,11 @@ class DecisionEngine:
                 decision_type=DecisionType.IGNORE,
                 importance_score=0.0,
                 reason="Low autonomy level - manual control required",
+                reason_class="low_autonomy",
             )
 
         # Анализ контекста
-        analysis = self.context_analyzer.analyze(context, chat_history_count)
+        analysis = self.context_analyzer.analyze(context, self.activity.message_count(context.chat_id))
 
         # Проверка запрещенных тем/пользователей
         banned_check = analysis.get("banned_check", {})
@@ -89,6 +94,7 @@ class DecisionEngine:
                 decision_type=DecisionType.IGNORE,
                 importance_score=-1.0,
                 reason=f"Banned: topic={banned_check.get('topic_banned')}, user={banned_check.get('user_banned')}",
+                reason_class="banned",
             )
 
         # Проверка активных часов
@@ -97,6 +103,7 @@ class DecisionEngine:
                 decision_type=DecisionType.DEFER,
                 importance_score=0.0,
                 reason="Outside active hours",
+                reason_class="inactive_hours",
             )
 
         # Проверка cooldown
@@ -105,6 +112,7 @@ class DecisionEngine:
                 decision_type=DecisionType.IGNORE,
                 importance_score=0.0,
                 reason="Cooldown period - too soon after last response",
+                reason_class="cooldown",
             )
 
         # Расчет важности
@@ -112,7 +120,7 @@ class DecisionEngine:
             context,
             analysis,
             user_profile,
-            recent_responses_count,
+            self.activity.response_count(context.chat_id),
         )
 
         # Принятие решения
@@ -124,6 +132,7 @@ class DecisionEngine:
                 decision_type=DecisionType.RESPOND,
                 importance_score=importance_score,
                 reason=f"High importance: {importance_score:.2f}",
+                reason_class="high_importance",
                 delay=delay,
             )
         elif importance_score >= self.REACT_THRESHOLD:
@@ -131,11 +140,13 @@ class DecisionEngine:
                 decision_type=DecisionType.REACT,
                 importance_score=importance_score,
                 reason=f"Medium importance: {importance_score:.2f}",
+                reason_class="medium_importance",
             )
         else:
             return Decision(
                 decision_type=DecisionType.IGNORE,
                 importance_score=importance_score,
                 reason=f"Low importance: {importance_score:.2f}",
+                reason_class="low_importance",
             )
 
@@ -40,7 +40,7 @@ class ImportanceScorer:
             context: Контекст сообщения
             analysis: Результаты анализа контекста
             user_profile: Профиль пользователя (опционально)
-            recent_responses_count: Количество недавних ответов
+            recent_responses_count: Количество наших ответов в чате за последний час
             
         Returns:
             Оценка важности (0.0 - 1.0)
@@ -4,6 +4,7 @@
 
 from .message_listener import MessageListener
 from .message_parser import MessageParser
+from .shared_ingest import SharedIngest
 
-__all__ = ["MessageListener", "MessageParser"]
+__all__ = ["MessageListener", "MessageParser", "SharedIngest"]
 
@@ -8,6 +8,7 @@ from telethon import TelegramClient, events
 from telethon.sessions import StringSession
 
 from .message_parser import MessageParser, MessageContext
+from .shared_ingest import SharedIngest
 
 
 class MessageListener:
@@ -19,6 +20,7 @@ class MessageListener:
         api_hash: str,
         session_string: str,
         account_username: Optional[str] = None,
+        ingest: Optional[SharedIngest] = None,
     ):
         """
         Args:
@@ -26,6 +28,7 @@ class MessageListener:
             api_hash: Telegram API Hash
             session_string: Сессия в формате StringSession
             account_username: Username аккаунта для определения упоминаний
+            ingest: Общий разбор сообщений с другими аккаунтами (None - свой разбор)
         """
         self.api_id = api_id
         self.api_hash = api_hash
@@ -34,6 +37,7 @@ class MessageListener:
         
         self.client: Optional[TelegramClient] = None
         self.parser = MessageParser(account_username)
+        self.ingest = ingest
         self.message_handler: Optional[Callable[[MessageContext], None]] = None
         self.is_running = False
 
@@ -79,6 +83,21 @@ class MessageListener:
         if not self.message_handler:
             return
 
+        # Парсинг контекста (сообщение группы - один раз на все аккаунты)
+        if self.ingest is not None:
+            shared = await self.ingest.get_or_parse(
+                str(event.chat_id), event.message.id, lambda: self._message_data(event)
+            )
+            context = self.parser.for_account(shared)
+        else:
+            context = self.parser.parse(await self._message_data(event))
+
+        # Вызов обработчика
+        if self.message_handler:
+            self.message_handler(context)
+
+    async def _message_data(self, event: events.NewMessage.Event) -> Dict[str, Any]:
+        """Данные сообщения для парсера (с запросом сообщения, на которое оно отвечает)"""
         # Преобразовать событие в словарь
         message_data = {
             "id": event.message.id,
@@ -103,12 +122,7 @@ class MessageListener:
                     },
                 }
 
-        # Парсинг контекста
-        context = self.parser.parse(message_data)
-
-        # Вызов обработчика
-        if self.message_handler:
-            self.message_handler(context)
+        return message_data
 
     async def send_message(self, chat_id: int, text: str) -> Optional[int]:
         """Отправить сообщение"""
@@ -3,7 +3,7 @@
 """
 
 from typing import Dict, Any, Optional, List
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 import re
 
 
@@ -92,7 +92,7 @@ class MessageParser:
         is_reply = False
         reply_to_message_id = None
         reply_to_user_id = None
-        if "reply_to" in message_data:
+        if message_data.get("reply_to"):
             is_reply = True
             reply_to_message_id = message_data["reply_to"].get("reply_to_msg_id")
             reply_to_user_id = str(message_data["reply_to"].get("from_id", {}).get("user_id", ""))
@@ -127,6 +127,15 @@ class MessageParser:
             raw_data=message_data,
         )
 
+    def for_account(self, context: MessageContext) -> MessageContext:
+        """
+        Копия разобранного другим парсером контекста с признаками этого аккаунта
+        
+        Разбор текста от аккаунта не зависит; заново определяется только
+        прямое упоминание. Списки и raw_data остаются общими - их не меняют.
+        """
+        return replace(context, is_direct_mention=self._is_direct_mention(context.text, context.mentions))
+
     def _extract_mentions(self, text: str) -> List[str]:
         """Извлечь упоминания из текста"""
         mentions = []
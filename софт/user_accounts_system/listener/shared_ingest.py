@@ -0,0 +1,102 @@
+"""
+Общий прием сообщений для аккаунтов, состоящих в одних чатах
+"""
+
+import asyncio
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from .message_parser import MessageParser, MessageContext
+
+
+class SharedIngest:
+    """
+    Разбор сообщения один раз на все аккаунты
+
+    Каждый listener получает то же сообщение группы отдельно. Первый из
+    них загружает данные сообщения (включая запрос сообщения, на которое
+    оно отвечает) и разбирает текст, остальные получают готовый контекст -
+    в том числе пока разбор первого еще идет. Аккаунт накладывает на общий
+    контекст только свои признаки (MessageParser.for_account). Экономятся
+    запросы к Telegram и разбор: в память и БД каждый аккаунт по-прежнему
+    записывает свою копию сообщения.
+
+    Ключ (chat_id, message_id) одинаков у всех участников только в
+    супергруппах и каналах; в обычных группах и личных чатах номера
+    сообщений у каждого аккаунта свои, поэтому они разбираются отдельно.
+    """
+
+    def __init__(self, capacity: int = 10000):
+        """
+        Args:
+            capacity: Сколько последних сообщений помнить (достаточно на
+                время, пока событие доходит до всех аккаунтов)
+        """
+        self.capacity = capacity
+        self.parser = MessageParser()
+        # (chat_id, message_id) -> future с общим контекстом (None - разбор не удался)
+        self._entries: "OrderedDict[Tuple[str, int], asyncio.Future]" = OrderedDict()
+        self.stats = {
+            "parsed": 0,  # Разобрано сообщений групп
+            "shared": 0,  # Получено аккаунтами готовым
+            "unshared": 0,  # Сообщений личных чатов и обычных групп (без общего ключа)
+        }
+
+    @staticmethod
+    def is_shared_chat(chat_id: str) -> bool:
+        """Одинаковы ли номера сообщений чата у всех аккаунтов (супергруппы и каналы)"""
+        return chat_id.startswith("-100")
+
+    async def get_or_parse(self, chat_id: str, message_id: int,
+                           load: Callable[[], Awaitable[Dict[str, Any]]]) -> MessageContext:
+        """
+        Общий контекст сообщения (без признаков аккаунта)
+
+        Args:
+            chat_id: ID чата
+            message_id: ID сообщения
+            load: Загрузка данных сообщения для MessageParser.parse - вызывается,
+                только если сообщение еще не разобрано другим аккаунтом
+
+        Returns:
+            Контекст для MessageParser.for_account
+        """
+        if not self.is_shared_chat(chat_id):
+            self.stats["unshared"] += 1
+            return self.parser.parse(await load())
+
+        key = (chat_id, message_id)
+        future = self._entries.get(key)
+        if future is not None:
+            self._entries.move_to_end(key)
+            # shield: отмена ожидающего аккаунта не отменяет разбор для остальных
+            context = await asyncio.shield(future)
+            if context is not None:
+                self.stats["shared"] += 1
+                return context
+            # Первый аккаунт не смог загрузить сообщение - пробуем сами
+            return self.parser.parse(await load())
+
+        future = asyncio.get_running_loop().create_future()
+        self._entries[key] = future
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+        try:
+            context = self.parser.parse(await load())
+        except BaseException:
+            self._entries.pop(key, None)
+            future.set_result(None)
+            raise
+        self.stats["parsed"] += 1
+        future.set_result(context)
+        return context
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Счетчики разбора и повторного использования"""
+        group_messages = self.stats["parsed"] + self.stats["shared"]
+        return {
+            **self.stats,
+            "cached": len(self._entries),
+            "share_rate": round(self.stats["shared"] / group_messages, 4) if group_messages else None,
+        }
@@ -72,6 +72,39 @@ class LLMService:
             print(f"Error generating response: {e}")
             return "Извини, не могу ответить сейчас."
 
+    def generate_summary(self, prompt: str, max_tokens: int = 300) -> Optional[str]:
+        """
+        Сжать текст по промпту (сводка разговора)
+        
+        В отличие от generate_response, при ошибке или без настроенного
+        клиента возвращает None, а не заглушку для отправки в чат.
+        
+        Args:
+            prompt: Промпт со старой сводкой и новыми сообщениями
+            max_tokens: Максимальное количество токенов
+            
+        Returns:
+            Текст сводки или None
+        """
+        if not self.client:
+            return None
+        
+        try:
+            response = self.client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {"role": "user", "content": prompt}
+                ],
+                max_tokens=max_tokens,
+                temperature=0.2,  # Сводке нужна точность, а не разнообразие
+            )
+            
+            return (response.choices[0].message.content or "").strip() or None
+        
+        except Exception as e:
+            print(f"Error generating summary: {e}")
+            return None
+
     def generate_with_context(
         self,
         system_prompt: str,
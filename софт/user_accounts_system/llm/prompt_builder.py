@@ -2,7 +2,7 @@
 Построитель промптов для LLM
 """
 
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from datetime import datetime
 
 from ..database.models import PersonalityProfile
@@ -21,6 +21,8 @@ class PromptBuilder:
         chat_history: List[Dict[str, Any]],
         user_context: Dict[str, Any] = None,
         topic_context: Dict[str, Any] = None,
+        recalled_messages: List[Dict[str, Any]] = None,
+        chat_summary: Optional[str] = None,
     ) -> str:
         """
         Построить промпт для LLM
@@ -30,6 +32,9 @@ class PromptBuilder:
             chat_history: История чата (форматированная)
             user_context: Контекст о пользователе
             topic_context: Контекст о темах
+            recalled_messages: Давние сообщения чата, найденные поиском по памяти
+            chat_summary: Сводка ранней части разговора (тогда chat_history -
+                только сообщения после нее)
             
         Returns:
             Готовый промпт
@@ -38,10 +43,10 @@ class PromptBuilder:
         system_prompt = self._build_system_prompt()
         
         # Контекст диалога
-        dialogue_context = self._build_dialogue_context(chat_history, context)
+        dialogue_context = self._build_dialogue_context(chat_history, context, chat_summary)
         
         # Память о пользователе
-        memory_context = self._build_memory_context(user_context, topic_context)
+        memory_context = self._build_memory_context(user_context, topic_context, recalled_messages)
         
         # Инструкции
         instructions = self._build_instructions(context)
@@ -100,30 +105,62 @@ class PromptBuilder:
         self,
         chat_history: List[Dict[str, Any]],
         current_context: MessageContext,
+        chat_summary: Optional[str] = None,
     ) -> str:
         """Построить контекст диалога"""
-        if not chat_history:
+        if not chat_history and not chat_summary:
             return f"Новое сообщение в чате:\n{current_context.user_id}: {current_context.text}"
         
-        # Форматировать историю
+        # Форматировать историю: со сводкой - все сообщения после нее
+        # (сводчик не дает им накопиться), без сводки - последние 10
         history_lines = []
-        for msg in chat_history[-10:]:  # Последние 10 сообщений
+        for msg in chat_history if chat_summary else chat_history[-10:]:
             user = msg.get("user", "Unknown")
             text = msg.get("text", "")
             history_lines.append(f"{user}: {text}")
         
         history_text = "\n".join(history_lines)
+        summary_text = f"Краткое содержание более раннего разговора:\n{chat_summary}\n\n" if chat_summary else ""
         
-        return f"""Контекст диалога (последние сообщения):
+        return f"""{summary_text}Контекст диалога (последние сообщения):
 {history_text}
 
 Текущее сообщение:
 {current_context.username or current_context.user_id}: {current_context.text}"""
 
+    def build_summary_prompt(self, previous_summary: Optional[str],
+                             messages: List[Dict[str, Any]], max_chars: int = 1500) -> str:
+        """
+        Построить промпт для сворачивания сообщений в сводку чата
+        
+        Args:
+            previous_summary: Текущая сводка (None - первая сводка чата)
+            messages: Сообщения, которые нужно добавить в сводку (форматированные)
+            max_chars: Ориентировочная длина сводки
+            
+        Returns:
+            Готовый промпт
+        """
+        lines = "\n".join(f"{msg.get('user', 'Unknown')}: {msg.get('text', '')}" for msg in messages)
+        previous = previous_summary or "(пока пусто)"
+        
+        return f"""Ты ведешь краткое содержание группового чата, чтобы помнить ранний разговор.
+
+Текущее краткое содержание:
+{previous}
+
+Новые сообщения:
+{lines}
+
+Перепиши краткое содержание с учетом новых сообщений: кто что говорил, обсуждаемые темы,
+вопросы без ответа, договоренности и мнения участников. Устаревшие подробности сокращай.
+Пиши от третьего лица, без вступлений, не длиннее {max_chars} символов."""
+
     def _build_memory_context(
         self,
         user_context: Dict[str, Any] = None,
         topic_context: Dict[str, Any] = None,
+        recalled_messages: List[Dict[str, Any]] = None,
     ) -> str:
         """Построить контекст памяти"""
         memory_parts = []
@@ -146,6 +183,13 @@ class PromptBuilder:
                 if position:
                     memory_parts.append(f"По теме '{topic}' ты ранее высказывал позицию: {position}")
         
+        if recalled_messages:
+            memory_parts.append("Ранее в этом чате об этом говорили:")
+            for msg in recalled_messages:
+                user = msg.get("user", "Unknown")
+                text = msg.get("text", "")
+                memory_parts.append(f"{user}: {text}")
+        
         if memory_parts:
             return "Память:\n" + "\n".join(memory_parts)
         
@@ -0,0 +1,65 @@
+"""
+Мониторинг задержки event loop
+"""
+
+import asyncio
+import time
+from typing import Optional, Dict, Any
+
+
+class LoopLagMonitor:
+    """
+    Измеряет, насколько event loop опаздывает с пробуждением.
+
+    Корутина засыпает на interval секунд; всё, что сверх interval прошло
+    до пробуждения, - время, когда loop был заблокирован синхронным кодом
+    (например, fsync SQLite в корутине).
+    """
+
+    def __init__(self, interval: float = 0.05):
+        """
+        Args:
+            interval: Период замера (секунды)
+        """
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self.reset()
+
+    def reset(self):
+        """Сбросить накопленную статистику"""
+        self.samples = 0
+        self.total_lag = 0.0
+        self.max_lag = 0.0
+
+    def start(self):
+        """Запустить мониторинг в текущем event loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Остановить мониторинг"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - started - self.interval)
+            self.samples += 1
+            self.total_lag += lag
+            self.max_lag = max(self.max_lag, lag)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Получить статистику задержки (в миллисекундах)"""
+        avg_lag = self.total_lag / self.samples if self.samples else 0.0
+        return {
+            "samples": self.samples,
+            "avg_lag_ms": round(avg_lag * 1000, 3),
+            "max_lag_ms": round(self.max_lag * 1000, 3),
+        }
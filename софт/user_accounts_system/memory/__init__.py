@@ -3,8 +3,19 @@
 """
 
 from .memory_manager import MemoryManager
+from .cache import BoundedCache, ChatHistoryBuffer, MemoryCacheConfig, WarmUpConfig, WriteBackConfig
+from .semantic_index import SemanticIndex
+from .summarizer import ChatSummarizer, SummaryConfig
 
 __all__ = [
     "MemoryManager",
+    "BoundedCache",
+    "ChatHistoryBuffer",
+    "MemoryCacheConfig",
+    "WarmUpConfig",
+    "WriteBackConfig",
+    "SemanticIndex",
+    "ChatSummarizer",
+    "SummaryConfig",
 ]
 
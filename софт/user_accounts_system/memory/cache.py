@@ -0,0 +1,188 @@
+"""
+Ограниченные кэши памяти аккаунта (LRU + время жизни записей)
+"""
+
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from itertools import islice
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional
+
+
+@dataclass
+class MemoryCacheConfig:
+    """Размеры кэшей MemoryManager (на один аккаунт)"""
+    chat_capacity: int = 500  # Чатов с историей в памяти
+    chat_history_size: int = 100  # Последних сообщений на чат
+    user_capacity: int = 5000  # Профилей пользователей
+    topic_capacity: int = 2000  # Записей памяти о темах
+    ttl: Optional[float] = 1800.0  # Время жизни записи, секунды (None - без ограничения)
+
+
+@dataclass
+class WriteBackConfig:
+    """Настройки отложенной записи профилей пользователей и памяти о темах"""
+    enabled: bool = True  # False - каждое изменение сразу пишется в БД
+    flush_interval: float = 5.0  # Максимальное время жизни несохраненного изменения (секунды)
+    max_dirty: int = 1000  # Сбросить сразу, как только накопится столько измененных записей
+
+    # Предустановки: чем выше надежность, тем больше записей в БД
+    DURABILITY_PRESETS = {
+        # Запись на каждое изменение, при сбое ничего не теряется
+        "strict": {"enabled": False},
+        # При сбое теряются изменения за последние flush_interval секунд
+        "balanced": {"flush_interval": 5.0, "max_dirty": 1000},
+        # Редкие большие сбросы, при сбое теряется до 30 секунд изменений
+        "fast": {"flush_interval": 30.0, "max_dirty": 5000},
+    }
+
+    @classmethod
+    def for_durability(cls, level: str, **overrides) -> "WriteBackConfig":
+        """Создать конфигурацию по уровню надежности (strict | balanced | fast)"""
+        if level not in cls.DURABILITY_PRESETS:
+            raise ValueError(f"Unknown durability level: {level}")
+        params = dict(cls.DURABILITY_PRESETS[level])
+        params.update(overrides)
+        return cls(**params)
+
+
+@dataclass
+class WarmUpConfig:
+    """Предзагрузка кэшей памяти при старте аккаунта (бюджет памяти на аккаунт)"""
+    enabled: bool = True
+    max_messages: int = 5000  # Сообщений истории всего (чаты загружаются на весь буфер)
+    max_chats: int = 50  # Самых активных чатов
+    active_hours: int = 24  # Активность чатов считается за столько последних часов
+    users: int = 500  # Профилей пользователей с наибольшим числом взаимодействий
+    topics: int = 200  # Тем с наибольшим приоритетом
+
+
+class BoundedCache:
+    """
+    Кэш с вытеснением давно не используемых записей и временем жизни
+
+    Запись живет ttl секунд с момента последней записи (put), чтение срок
+    не продлевает: изменения в БД из других источников видны не позже ttl.
+    on_evict(key, value) вызывается для записей, вытесненных или истекших.
+    """
+
+    def __init__(self, capacity: int, ttl: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic,
+                 on_evict: Optional[Callable[[Hashable, Any], None]] = None):
+        if capacity < 1:
+            raise ValueError("Cache capacity must be positive")
+        self.capacity = capacity
+        self.ttl = ttl
+        self._clock = clock
+        self._on_evict = on_evict
+        # ключ -> (значение, момент истечения или None)
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, default: Any = None,
+            usable: Optional[Callable[[Any], bool]] = None) -> Any:
+        """
+        Значение по ключу (default при промахе или истекшем сроке)
+
+        usable: Проверка, что значение подходит для запроса; неподходящее
+            считается промахом, но остается в кэше.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= self._clock():
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            if self._on_evict:
+                self._on_evict(key, value)
+            return default
+
+        self._entries.move_to_end(key)
+        if usable is not None and not usable(value):
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """Значение без учета в счетчиках и без изменения порядка вытеснения"""
+        entry = self._entries.get(key)
+        if entry is None or (entry[1] is not None and entry[1] <= self._clock()):
+            return default
+        return entry[0]
+
+    def put(self, key: Hashable, value: Any):
+        """Сохранить значение, вытеснив самые старые записи сверх capacity"""
+        expires_at = self._clock() + self.ttl if self.ttl is not None else None
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.capacity:
+            evicted_key, (evicted, _) = self._entries.popitem(last=False)
+            self.evictions += 1
+            if self._on_evict:
+                self._on_evict(evicted_key, evicted)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Удалить запись (без учета в счетчиках)"""
+        entry = self._entries.pop(key, None)
+        return entry[0] if entry is not None else default
+
+    def clear(self):
+        """Удалить все записи (счетчики сохраняются)"""
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Счетчики попаданий, промахов и вытеснений"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "capacity": self.capacity,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class ChatHistoryBuffer:
+    """
+    Кольцевой буфер последних сообщений чата
+
+    Буфер всегда хранит непрерывный хвост истории: сообщения загружаются из
+    БД подряд от самого нового и дописываются по мере сохранения. Флаг
+    complete означает, что более старых сообщений в БД нет, - тогда буфер
+    отвечает на запрос любой длины, иначе только на запросы не длиннее себя.
+    """
+
+    def __init__(self, capacity: int, messages: Iterable = (), complete: bool = False):
+        messages = list(messages)
+        self.messages: deque = deque(messages, maxlen=capacity)
+        # Вся история чата поместилась в буфер
+        self.complete = complete and len(self.messages) == len(messages)
+
+    def append(self, message):
+        """Дописать новое сообщение (самое старое вытесняется при заполнении)"""
+        if len(self.messages) == self.messages.maxlen:
+            self.complete = False
+        self.messages.append(message)
+
+    def covers(self, limit: int) -> bool:
+        """Можно ли ответить на запрос limit последних сообщений без БД"""
+        return self.complete or len(self.messages) >= limit
+
+    def tail(self, limit: int) -> List:
+        """Последние limit сообщений в хронологическом порядке"""
+        skip = max(0, len(self.messages) - limit)
+        return list(islice(self.messages, skip, None))
@@ -2,34 +2,93 @@
 Менеджер памяти для аккаунта
 """
 
+import asyncio
+import time
+from dataclasses import replace
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta
 
 from ..database.db_manager import DatabaseManager
+from ..database.async_db import AsyncDatabaseManager
+from ..database.timestamps import now_ms, to_epoch_ms
 from ..database.models import (
     ChatMessage,
+    ChatSearchResult,
+    ChatSummary,
     UserProfile,
     TopicMemory,
     InteractionLog,
+    RetentionPolicy,
 )
 from ..listener.message_parser import MessageContext
+from .cache import BoundedCache, ChatHistoryBuffer, MemoryCacheConfig, WarmUpConfig, WriteBackConfig
+from .semantic_index import SemanticIndex
+
+# Значение кэша сводок для чата, у которого сводки нет
+_NO_SUMMARY = ChatSummary()
 
 
 class MemoryManager:
     """Центральный менеджер памяти для аккаунта"""
 
-    def __init__(self, account_id: int, db_manager: DatabaseManager):
+    def __init__(
+        self,
+        account_id: int,
+        db_manager: DatabaseManager,
+        async_db: Optional[AsyncDatabaseManager] = None,
+        cache_config: Optional[MemoryCacheConfig] = None,
+        write_back: Optional[WriteBackConfig] = None,
+        semantic_index: Optional[SemanticIndex] = None,
+        warm_up: Optional[WarmUpConfig] = None,
+    ):
         self.account_id = account_id
         self.db = db_manager
+        # Все обращения к БД из корутин идут через фасад, чтобы не блокировать event loop
+        self.async_db = async_db or AsyncDatabaseManager(db_manager)
+        
+        # Векторный индекс для поиска давних сообщений по смыслу (None - только полнотекстовый поиск)
+        self.semantic_index = semantic_index
         
-        # Кэш для быстрого доступа
-        self._chat_cache: Dict[str, List[ChatMessage]] = {}
-        self._user_cache: Dict[str, UserProfile] = {}
-        self._topic_cache: Dict[str, TopicMemory] = {}
+        # Кэши для быстрого доступа (ограничены по размеру и времени жизни)
+        self.cache_config = cache_config or MemoryCacheConfig()
+        ttl = self.cache_config.ttl
+        self._chat_cache = BoundedCache(self.cache_config.chat_capacity, ttl)
+        self._summary_cache = BoundedCache(self.cache_config.chat_capacity, ttl)
+        self._user_cache = BoundedCache(
+            self.cache_config.user_capacity, ttl,
+            on_evict=lambda user_id, _: self._on_evict(self._dirty_users, user_id),
+        )
+        self._topic_cache = BoundedCache(
+            self.cache_config.topic_capacity, ttl,
+            on_evict=lambda keyword, _: self._on_evict(self._dirty_topics, keyword),
+        )
+
+        # Отложенная запись профилей и тем: измененные объекты копятся здесь и
+        # пишутся в БД пачками - по таймеру, при вытеснении из кэша и при остановке
+        self.write_back = write_back or WriteBackConfig()
+        self._dirty_users: Dict[str, UserProfile] = {}
+        self._dirty_topics: Dict[str, TopicMemory] = {}
+        # Пачка, которая пишется прямо сейчас (чтения видят ее до конца записи)
+        self._flushing_users: Dict[str, UserProfile] = {}
+        self._flushing_topics: Dict[str, TopicMemory] = {}
+        # Создаются в event loop при первом использовании
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._flush_requested: Optional[asyncio.Event] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self.write_back_stats = {
+            "updates": 0,  # Изменений профилей и тем
+            "rows_written": 0,  # Строк, записанных в БД
+            "writes_saved": 0,  # Изменений, слитых с еще не записанным
+            "flushes": 0,
+        }
+        
+        # Предзагрузка кэшей при старте аккаунта (см. warm_up)
+        self.warm_up_config = warm_up or WarmUpConfig()
+        self.warm_up_stats: Optional[Dict[str, Any]] = None
 
     # === Chat Memory ===
 
-    def save_message(self, context: MessageContext):
+    async def save_message(self, context: MessageContext):
         """Сохранить сообщение в память"""
         message = ChatMessage(
             account_id=self.account_id,
@@ -40,66 +99,235 @@ class MemoryManager:
             message_text=context.text,
             timestamp=datetime.now(),
             is_reply_to=context.reply_to_message_id,
-            context_data={
-                "tone": context.tone,
-                "is_question": context.is_question,
-                "topic_keywords": context.topic_keywords,
-                "mentions": context.mentions,
-            },
+            tone=context.tone,
+            is_question=context.is_question,
+            topic_keywords=list(context.topic_keywords),
+            mentions=list(context.mentions),
         )
         
-        self.db.save_chat_message(message)
-        
-        # Обновить кэш
-        if context.chat_id not in self._chat_cache:
-            self._chat_cache[context.chat_id] = []
-        self._chat_cache[context.chat_id].append(message)
+        await self.async_db.queue_chat_message(message)
+        if self.semantic_index is not None:
+            self.semantic_index.add(
+                message.chat_id, message.message_id, to_epoch_ms(message.timestamp), message.message_text
+            )
         
-        # Ограничить размер кэша
-        if len(self._chat_cache[context.chat_id]) > 100:
-            self._chat_cache[context.chat_id] = self._chat_cache[context.chat_id][-100:]
+        # Дописать в буфер чата (не учитывая обращение в счетчиках попаданий);
+        # буфер нового чата не знает старых сообщений, пока их не загрузит чтение
+        buffer = self._chat_cache.peek(context.chat_id)
+        if buffer is None:
+            buffer = ChatHistoryBuffer(self.cache_config.chat_history_size)
+        buffer.append(message)
+        self._chat_cache.put(context.chat_id, buffer)
 
-    def get_chat_history(self, chat_id: str, limit: int = 50) -> List[ChatMessage]:
+    async def get_chat_history(self, chat_id: str, limit: int = 50) -> List[ChatMessage]:
         """Получить историю чата"""
-        # Проверить кэш
-        if chat_id in self._chat_cache and len(self._chat_cache[chat_id]) >= limit:
-            return self._chat_cache[chat_id][-limit:]
+        # Проверить кэш: буфер отвечает, если содержит весь запрошенный хвост
+        buffer = self._chat_cache.get(chat_id, usable=lambda buffer: buffer.covers(limit))
+        if buffer is not None:
+            return buffer.tail(limit)
         
-        # Загрузить из БД
-        history = self.db.get_chat_history(self.account_id, chat_id, limit)
+        # Загрузить из БД сразу на весь буфер, чтобы следующие чтения попадали в кэш
+        size = self.cache_config.chat_history_size
+        fetch = max(limit, size)
+        history = await self.async_db.get_chat_history(self.account_id, chat_id, fetch)
+        complete = len(history) < fetch
+        
+        # Сообщения, сохраненные пока шло чтение, в ответ БД могли не попасть
+        current = self._chat_cache.peek(chat_id)
+        if current is not None:
+            loaded = {msg.message_id for msg in history}
+            history.extend(msg for msg in current.messages if msg.message_id not in loaded)
         
         # Обновить кэш
-        self._chat_cache[chat_id] = history
+        self._chat_cache.put(chat_id, ChatHistoryBuffer(size, history, complete))
         
-        return history
+        return history[-limit:]
+
+    def forget_chat(self, chat_id: Optional[str] = None):
+        """Сбросить кэш истории чата (или всех чатов) после очистки в БД"""
+        if chat_id is None:
+            self._chat_cache.clear()
+            self._summary_cache.clear()
+        else:
+            self._chat_cache.pop(chat_id, None)
+            self._summary_cache.pop(chat_id, None)
+        if self.semantic_index is not None:
+            self.semantic_index.forget_chat(chat_id)
+
+    async def apply_retention(self, policy: Optional[RetentionPolicy], compact: bool = False) -> int:
+        """
+        Применить политику хранения к семантическому индексу
+
+        Args:
+            policy: Политика аккаунта (None - только compact)
+            compact: Переписать файлы индекса без исключенных строк - только
+                пока индекс никто не использует (при старте аккаунта)
+
+        Returns:
+            Сколько сообщений исключено из поиска
+        """
+        if self.semantic_index is None:
+            return 0
+        before = now_ms() - policy.max_age_days * 86_400_000 if policy and policy.max_age_days else None
+        max_rows = policy.max_rows_per_chat if policy else None
+
+        def run() -> int:
+            removed = self.semantic_index.prune(before, max_rows) if before or max_rows else 0
+            if compact:
+                self.semantic_index.compact(min_dead_fraction=0.1)
+            return removed
 
-    def get_recent_messages_count(self, chat_id: str, minutes: int = 60) -> int:
+        # Проход по всей матрице - в пуле потоков, чтобы не задерживать event loop
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, run)
+
+    async def get_chat_summary(self, chat_id: str) -> Optional[ChatSummary]:
+        """Сводка ранней части разговора в чате (None, если сообщения еще не сворачивались)"""
+        summary = self._summary_cache.get(chat_id)
+        if summary is None:
+            summary = await self.async_db.get_chat_summary(self.account_id, chat_id) or _NO_SUMMARY
+            self._summary_cache.put(chat_id, summary)
+        return summary if summary is not _NO_SUMMARY else None
+
+    async def save_chat_summary(self, summary: ChatSummary):
+        """Сохранить новую сводку чата"""
+        await self.async_db.save_chat_summary(summary)
+        self._summary_cache.put(summary.chat_id, summary)
+
+    def get_cache_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Счетчики кэшей памяти (попадания, промахи, вытеснения, отложенная запись)"""
+        return {
+            "chats": self._chat_cache.get_stats(),
+            "summaries": self._summary_cache.get_stats(),
+            "users": self._user_cache.get_stats(),
+            "topics": self._topic_cache.get_stats(),
+            "write_back": {
+                **self.write_back_stats,
+                "dirty": len(self._dirty_users) + len(self._dirty_topics),
+            },
+            "warm_up": self.warm_up_stats,
+        }
+
+    async def get_recent_messages_count(self, chat_id: str, minutes: int = 60) -> int:
         """Получить количество сообщений за последние N минут"""
-        history = self.get_chat_history(chat_id, limit=100)
+        history = await self.get_chat_history(chat_id, limit=self.cache_config.chat_history_size)
         cutoff = datetime.now() - timedelta(minutes=minutes)
         
         return sum(1 for msg in history if msg.timestamp and msg.timestamp >= cutoff)
 
+    async def get_recent_questions(self, chat_id: str, minutes: int = 60,
+                                   limit: int = 50) -> List[ChatMessage]:
+        """Получить вопросы в чате за последние N минут"""
+        since = datetime.now() - timedelta(minutes=minutes)
+        return await self.async_db.get_questions(self.account_id, chat_id, since, limit)
+
+    async def find_messages_with_keyword(self, keyword: str, chat_id: Optional[str] = None,
+                                         limit: int = 50) -> List[ChatMessage]:
+        """Найти последние сообщения с ключевым словом"""
+        return await self.async_db.find_messages_by_term(
+            self.account_id, keyword.lower(), chat_id=chat_id, limit=limit
+        )
+
+    async def search(self, chat_id: Optional[str], query: str, limit: int = 5) -> List[ChatSearchResult]:
+        """
+        Найти в истории сообщения, релевантные запросу (полнотекстовый поиск)
+        
+        Args:
+            chat_id: ID чата (None - искать во всех чатах аккаунта)
+            query: Текст запроса
+            limit: Максимум результатов
+            
+        Returns:
+            Сообщения по убыванию релевантности с фрагментами текста
+        """
+        return await self.async_db.search_chat_memory(self.account_id, query, chat_id, limit)
+
+    async def semantic_search(self, chat_id: Optional[str], query: str, limit: int = 5,
+                              exclude_message_ids: Optional[set] = None) -> List[ChatSearchResult]:
+        """
+        Найти сообщения, близкие к запросу по смыслу (семантический индекс)
+        
+        Args:
+            chat_id: ID чата (None - искать во всех чатах аккаунта)
+            query: Текст запроса
+            limit: Максимум результатов
+            exclude_message_ids: message_id сообщений чата, которые не нужны в ответе
+            
+        Returns:
+            Сообщения по убыванию близости (rank - минус косинусная близость);
+            пустой список, если индекса нет
+        """
+        if self.semantic_index is None:
+            return []
+
+        exclude = [(chat_id, message_id) for message_id in exclude_message_ids or ()]
+        # Умножение матрицы на вектор - в пуле потоков, чтобы не задерживать event loop
+        loop = asyncio.get_running_loop()
+        hits = await loop.run_in_executor(
+            None, lambda: self.semantic_index.search(query, limit, chat_id, exclude)
+        )
+        if not hits:
+            return []
+
+        messages = await self.async_db.get_chat_messages_by_keys(
+            self.account_id, [(hit.chat_id, hit.message_id, hit.timestamp) for hit in hits]
+        )
+        by_key = {(msg.chat_id, msg.message_id): msg for msg in messages}
+        results = []
+        for hit in hits:
+            msg = by_key.get((hit.chat_id, hit.message_id))
+            # Сообщения, удаленные из БД (очистка, сроки хранения), пропускаются
+            if msg is not None:
+                results.append(ChatSearchResult(message=msg, snippet=msg.message_text, rank=-hit.score))
+        return results
+
     # === User Memory ===
 
-    def get_user_profile(self, user_id: str, username: Optional[str] = None) -> UserProfile:
+    async def get_user_profile(self, user_id: str, username: Optional[str] = None) -> UserProfile:
         """Получить профиль пользователя"""
-        # Проверить кэш
-        if user_id in self._user_cache:
-            return self._user_cache[user_id]
+        # Проверить кэш и еще не записанные изменения
+        profile = self._user_cache.get(user_id)
+        if profile is not None:
+            return profile
+        profile = self._pending(self._dirty_users, self._flushing_users, user_id)
+        if profile is not None:
+            self._user_cache.put(user_id, profile)
+            return profile
         
-        # Загрузить из БД
-        profile = self.db.get_or_create_user_profile(self.account_id, user_id, username)
+        # Загрузить из БД: известного пользователя - в потоке чтения, не
+        # занимая поток записи; новый или сменивший username - get_or_create
+        profile = (await self.async_db.get_user_profiles(self.account_id, [user_id])).get(user_id)
+        if profile is None or (username is not None and profile.username != username):
+            profile = await self.async_db.get_or_create_user_profile(self.account_id, user_id, username)
         
         # Обновить кэш
-        self._user_cache[user_id] = profile
+        self._user_cache.put(user_id, profile)
         
         return profile
 
-    def update_user_interaction(self, user_id: str, context: MessageContext, 
+    async def get_user_profiles(self, user_ids: List[str]) -> Dict[str, UserProfile]:
+        """Получить уже известные профили нескольких пользователей одним запросом"""
+        profiles = {}
+        for user_id in user_ids:
+            profile = self._user_cache.get(user_id)
+            if profile is None:
+                profile = self._pending(self._dirty_users, self._flushing_users, user_id)
+            if profile is not None:
+                profiles[user_id] = profile
+
+        missing = [user_id for user_id in user_ids if user_id not in profiles]
+        if missing:
+            loaded = await self.async_db.get_user_profiles(self.account_id, missing)
+            for user_id, profile in loaded.items():
+                self._user_cache.put(user_id, profile)
+            profiles.update(loaded)
+
+        return {user_id: profiles[user_id] for user_id in user_ids if user_id in profiles}
+
+    async def update_user_interaction(self, user_id: str, context: MessageContext, 
                                 response_sent: bool = False):
         """Обновить информацию о взаимодействии с пользователем"""
-        profile = self.get_user_profile(user_id, context.username)
+        profile = await self.get_user_profile(user_id, context.username)
         
         profile.interaction_count += 1
         profile.last_interaction = datetime.now()
@@ -117,64 +345,299 @@ class MemoryManager:
             # Если не ответили, отношения немного ухудшаются
             profile.relationship_score = max(0.0, profile.relationship_score - 0.02)
         
-        self.db.update_user_profile(profile)
-        self._user_cache[user_id] = profile
+        self._user_cache.put(user_id, profile)
+        await self._save(self._dirty_users, {user_id: profile})
 
     # === Topic Memory ===
 
-    def get_topic_memory(self, topic_keyword: str) -> TopicMemory:
+    async def get_topic_memory(self, topic_keyword: str) -> TopicMemory:
         """Получить память о теме"""
-        # Проверить кэш
-        if topic_keyword in self._topic_cache:
-            return self._topic_cache[topic_keyword]
+        # Проверить кэш и еще не записанные изменения
+        topic = self._topic_cache.get(topic_keyword)
+        if topic is not None:
+            return topic
+        topic = self._pending(self._dirty_topics, self._flushing_topics, topic_keyword)
+        if topic is not None:
+            self._topic_cache.put(topic_keyword, topic)
+            return topic
         
         # Загрузить из БД
-        topic = self.db.get_or_create_topic_memory(self.account_id, topic_keyword)
+        topic = await self.async_db.get_or_create_topic_memory(self.account_id, topic_keyword)
         
         # Обновить кэш
-        self._topic_cache[topic_keyword] = topic
+        self._topic_cache.put(topic_keyword, topic)
         
         return topic
 
-    def update_topic_discussion(self, topic_keyword: str, position: Optional[str] = None):
-        """Обновить информацию о обсуждении темы"""
-        topic = self.get_topic_memory(topic_keyword)
+    async def get_topic_memories(self, topic_keywords: List[str]) -> Dict[str, TopicMemory]:
+        """Получить память о нескольких темах (недостающие - одним запросом к БД)"""
+        topics = {}
+        for keyword in dict.fromkeys(topic_keywords):
+            topic = self._topic_cache.get(keyword)
+            if topic is None:
+                topic = self._pending(self._dirty_topics, self._flushing_topics, keyword)
+            if topic is not None:
+                topics[keyword] = topic
+
+        missing = [keyword for keyword in dict.fromkeys(topic_keywords) if keyword not in topics]
+        if missing:
+            loaded = await self.async_db.get_or_create_topic_memories(self.account_id, missing)
+            for keyword, topic in loaded.items():
+                self._topic_cache.put(keyword, topic)
+            topics.update(loaded)
         
-        topic.discussion_count += 1
-        topic.last_discussed = datetime.now()
+        return {keyword: topics[keyword] for keyword in topic_keywords}
+
+    async def update_topic_discussion(self, topic_keyword: str, position: Optional[str] = None):
+        """Обновить информацию о обсуждении темы"""
+        await self.update_topic_discussions([topic_keyword], position)
+
+    async def update_topic_discussions(self, topic_keywords: List[str], position: Optional[str] = None):
+        """Обновить информацию об обсуждении нескольких тем одной транзакцией"""
+        topics = []
+        for topic in (await self.get_topic_memories(topic_keywords)).values():
+            topic.discussion_count += 1
+            topic.last_discussed = datetime.now()
+            
+            if position:
+                topic.position = position
+            
+            # Увеличить приоритет темы
+            topic.priority = min(1.0, topic.priority + 0.1)
+            topics.append(topic)
         
-        if position:
-            topic.position = position
+        for topic in topics:
+            self._topic_cache.put(topic.topic_keyword, topic)
+        await self._save(self._dirty_topics, {topic.topic_keyword: topic for topic in topics})
+
+    # === Warm-up ===
+
+    async def warm_up(self) -> Dict[str, Any]:
+        """
+        Заполнить пустые кэши перед приходом первых сообщений
         
-        # Увеличить приоритет темы
-        topic.priority = min(1.0, topic.priority + 0.1)
+        Тремя параллельными запросами (после выбора чатов по почасовым
+        счетчикам) загружается история самых активных чатов - на весь буфер
+        чата, профили самых частых собеседников и темы с наибольшим
+        приоритетом. Объем ограничен WarmUpConfig и размерами кэшей.
+        Записи, попавшие в кэш раньше (сообщения во время прогрева), не
+        перезаписываются.
         
-        self.db.update_topic_memory(topic)
-        self._topic_cache[topic_keyword] = topic
+        Returns:
+            Сколько загружено чатов, сообщений, профилей и тем и за сколько миллисекунд
+        """
+        config = self.warm_up_config
+        stats = {"chats": 0, "messages": 0, "users": 0, "topics": 0, "duration_ms": 0.0}
+        if not config.enabled:
+            self.warm_up_stats = stats
+            return stats
+
+        started = time.perf_counter()
+        size = self.cache_config.chat_history_size
+        chat_limit = min(config.max_chats, config.max_messages // size, self.cache_config.chat_capacity)
+        chat_ids = []
+        if chat_limit > 0:
+            since = datetime.now() - timedelta(hours=config.active_hours)
+            chat_ids = await self.async_db.get_active_chat_ids(self.account_id, since, chat_limit)
+
+        histories, users, topics = await asyncio.gather(
+            self.async_db.get_chat_histories(self.account_id, chat_ids, size),
+            self.async_db.get_top_user_profiles(
+                self.account_id, min(config.users, self.cache_config.user_capacity)
+            ),
+            self.async_db.get_top_topic_memories(
+                self.account_id, min(config.topics, self.cache_config.topic_capacity)
+            ),
+        )
+
+        # Самые важные записи кладутся последними - их кэш вытеснит последними
+        for chat_id in reversed(chat_ids):
+            history = histories[chat_id]
+            complete = len(history) < size
+            stats["messages"] += len(history)
+            current = self._chat_cache.peek(chat_id)
+            if current is not None:
+                loaded = {msg.message_id for msg in history}
+                history.extend(msg for msg in current.messages if msg.message_id not in loaded)
+            self._chat_cache.put(chat_id, ChatHistoryBuffer(size, history, complete))
+            stats["chats"] += 1
+
+        for profile in reversed(users):
+            if (self._user_cache.peek(profile.user_id) is None
+                    and self._pending(self._dirty_users, self._flushing_users, profile.user_id) is None):
+                self._user_cache.put(profile.user_id, profile)
+                stats["users"] += 1
+
+        for topic in reversed(topics):
+            keyword = topic.topic_keyword
+            if (self._topic_cache.peek(keyword) is None
+                    and self._pending(self._dirty_topics, self._flushing_topics, keyword) is None):
+                self._topic_cache.put(keyword, topic)
+                stats["topics"] += 1
+
+        stats["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        self.warm_up_stats = stats
+        return stats
+
+    # === Write-back ===
+
+    @staticmethod
+    def _pending(dirty: Dict[str, Any], flushing: Dict[str, Any], key: str) -> Optional[Any]:
+        """Объект с еще не записанными изменениями (новее строки в БД)"""
+        item = dirty.get(key)
+        return item if item is not None else flushing.get(key)
+
+    def _on_evict(self, dirty: Dict[str, Any], key: str):
+        """Вытесненный из кэша измененный объект - повод записать изменения раньше"""
+        if key in dirty and self._flush_requested is not None:
+            self._flush_requested.set()
+
+    async def _save(self, dirty: Dict[str, Any], items: Dict[str, Any]):
+        """Отметить объекты измененными (или сразу записать, если отложенная запись выключена)"""
+        self.write_back_stats["updates"] += len(items)
+        for key, item in items.items():
+            if key in dirty:
+                self.write_back_stats["writes_saved"] += 1
+            dirty[key] = item
+
+        if (not self.write_back.enabled
+                or len(self._dirty_users) + len(self._dirty_topics) >= self.write_back.max_dirty):
+            await self.flush()
+
+    async def flush(self) -> int:
+        """Записать накопленные изменения профилей и тем, вернуть число строк"""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+
+        async with self._flush_lock:
+            if not self._dirty_users and not self._dirty_topics:
+                return 0
+
+            self._flushing_users, self._dirty_users = self._dirty_users, {}
+            self._flushing_topics, self._dirty_topics = self._dirty_topics, {}
+            # Поток записи получает копии: корутины продолжают менять оригиналы
+            users = [
+                replace(profile, communication_style=dict(profile.communication_style))
+                for profile in self._flushing_users.values()
+            ]
+            topics = [replace(topic) for topic in self._flushing_topics.values()]
+            try:
+                if users:
+                    await self.async_db.update_user_profiles(users)
+                if topics:
+                    await self.async_db.update_topic_memories(topics)
+            except BaseException:
+                # Вернуть в очередь всё, что не успело измениться заново
+                for user_id, profile in self._flushing_users.items():
+                    self._dirty_users.setdefault(user_id, profile)
+                for keyword, topic in self._flushing_topics.items():
+                    self._dirty_topics.setdefault(keyword, topic)
+                raise
+            finally:
+                self._flushing_users, self._flushing_topics = {}, {}
+
+            self.write_back_stats["flushes"] += 1
+            self.write_back_stats["rows_written"] += len(users) + len(topics)
+            return len(users) + len(topics)
+
+    def start(self):
+        """Запустить периодическую запись изменений в текущем event loop"""
+        if not self.write_back.enabled:
+            return
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_requested = asyncio.Event()
+            self._flush_task = asyncio.create_task(self._run_flusher())
+
+    async def stop(self):
+        """Остановить периодическую запись и записать все изменения (и семантический индекс)"""
+        if self._flush_task:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
+        if self.semantic_index is not None:
+            self.semantic_index.flush()
+
+    async def _run_flusher(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(), self.write_back.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error flushing memory of account {self.account_id}: {e}")
 
     # === Context Building ===
 
-    def build_context_for_llm(self, chat_id: str, limit: int = 20) -> Dict[str, Any]:
-        """Построить контекст для LLM"""
-        history = self.get_chat_history(chat_id, limit)
+    async def build_context_for_llm(self, chat_id: str, limit: int = 20,
+                                    recall_query: Optional[str] = None,
+                                    recall_limit: int = 3) -> Dict[str, Any]:
+        """
+        Построить контекст для LLM
+        
+        Args:
+            chat_id: ID чата
+            limit: Сколько последних сообщений включить
+            recall_query: Запрос для поиска давних релевантных сообщений чата
+                (по смыслу, если есть семантический индекс, иначе полнотекстовый)
+            recall_limit: Сколько найденных сообщений включить
+        
+        Если у чата есть сводка, в историю попадают только сообщения после
+        нее (не больше limit), а сама сводка возвращается в "summary".
+        """
+        history = await self.get_chat_history(chat_id, limit)
+        summary = await self.get_chat_summary(chat_id)
+        recent = history
+        if summary is not None:
+            recent = [msg for msg in history if not summary.covers(msg)]
         
         # Форматировать историю
         formatted_history = []
-        for msg in history[-limit:]:
+        for msg in recent[-limit:]:
             formatted_history.append({
                 "user": msg.username or msg.user_id,
                 "text": msg.message_text,
                 "timestamp": msg.timestamp.isoformat() if msg.timestamp else None,
             })
         
+        # Давние сообщения по теме (кроме тех, что уже есть в истории)
+        recalled = []
+        if recall_query:
+            # id у только что сохраненных сообщений еще нет, поэтому по message_id
+            recent_ids = {msg.message_id for msg in history}
+            results = await self.semantic_search(chat_id, recall_query, recall_limit, recent_ids)
+            if not results:
+                results = await self.search(chat_id, recall_query, recall_limit + len(recent_ids))
+            for result in results:
+                msg = result.message
+                if msg.message_id in recent_ids:
+                    continue
+                recalled.append({
+                    "user": msg.username or msg.user_id,
+                    "text": result.snippet,
+                    "timestamp": msg.timestamp.isoformat() if msg.timestamp else None,
+                })
+                if len(recalled) >= recall_limit:
+                    break
+        
         return {
             "chat_history": formatted_history,
             "message_count": len(history),
+            "recalled_messages": recalled,
+            "summary": summary.summary if summary is not None else None,
         }
 
-    def get_user_context(self, user_id: str) -> Dict[str, Any]:
+    async def get_user_context(self, user_id: str) -> Dict[str, Any]:
         """Получить контекст о пользователе"""
-        profile = self.get_user_profile(user_id)
+        profile = await self.get_user_profile(user_id)
         
         return {
             "username": profile.username,
@@ -184,11 +647,10 @@ class MemoryManager:
             "last_interaction": profile.last_interaction.isoformat() if profile.last_interaction else None,
         }
 
-    def get_topic_context(self, topic_keywords: List[str]) -> Dict[str, Any]:
+    async def get_topic_context(self, topic_keywords: List[str]) -> Dict[str, Any]:
         """Получить контекст о темах"""
         topics = {}
-        for keyword in topic_keywords:
-            topic = self.get_topic_memory(keyword)
+        for keyword, topic in (await self.get_topic_memories(topic_keywords)).items():
             topics[keyword] = {
                 "position": topic.position,
                 "priority": topic.priority,
@@ -199,12 +661,19 @@ class MemoryManager:
 
     # === Interaction Logging ===
 
-    def log_interaction(self, chat_id: str, action_type: str, 
+    async def log_interaction(self, chat_id: str, action_type: str, 
                        message_id: Optional[int] = None,
                        response_text: Optional[str] = None,
                        importance_score: Optional[float] = None,
-                       decision_reason: Optional[str] = None):
-        """Записать взаимодействие в лог"""
+                       decision_reason: Optional[str] = None,
+                       reason_class: Optional[str] = None,
+                       keep_row: bool = True):
+        """
+        Записать взаимодействие в лог
+        
+        Взаимодействие всегда попадает в почасовые счетчики; keep_row=False -
+        без полной строки в interaction_log.
+        """
         from ..database.models import InteractionLog
         
         interaction = InteractionLog(
@@ -215,7 +684,9 @@ class MemoryManager:
             response_text=response_text,
             importance_score=importance_score,
             decision_reason=decision_reason,
+            reason_class=reason_class,
+            keep_row=keep_row,
         )
         
-        self.db.log_interaction(interaction)
+        await self.async_db.queue_interaction(interaction)
 
@@ -0,0 +1,433 @@
+"""
+Локальный семантический индекс сообщений (векторный поиск на NumPy)
+
+Сообщения переводятся в векторы хешированием слов, основ и пар слов -
+без обучения, словаря и сети, поэтому индекс пополняется по одному
+сообщению при сохранении. Векторы аккаунта лежат в файле float32,
+отображенном в память; поиск - косинусная близость одним умножением
+матрицы на вектор запроса, взвешенный по IDF позиций (частота позиции
+среди сообщений считается по мере добавления).
+
+Удаленные сообщения (очистка памяти, политика хранения) обнуляются в
+матрице и вычитаются из частот позиций; compact переписывает файлы без
+них.
+"""
+
+import json
+import math
+import os
+import re
+import threading
+import zlib
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # Семантический поиск необязателен
+    np = None
+
+
+def is_available() -> bool:
+    """Установлен ли NumPy"""
+    return np is not None
+
+
+@dataclass
+class SemanticHit:
+    """Найденное по смыслу сообщение"""
+    chat_id: str
+    message_id: int
+    timestamp: int  # Миллисекунды эпохи (ключ поиска сообщения в БД)
+    score: float  # Косинусная близость к запросу (0..1)
+
+
+class HashingVectorizer:
+    """
+    Вектор текста фиксированной размерности без словаря
+
+    Признаки - слова, их основы (слово без последних букв, как в
+    полнотекстовом поиске) и пары соседних слов. Признак попадает в
+    позицию crc32 % dim со знаком из старшего бита, что гасит коллизии.
+    Веса 1 + log(tf), вектор нормирован.
+
+    С cache_size > 0 помнит векторы последних текстов: один векторизатор
+    на все аккаунты считает сообщение общей группы один раз. Векторы из
+    кэша только для чтения.
+    """
+
+    # Основа важнее точной формы слова (падежи, спряжения)
+    STEM_WEIGHT = 1.0
+    WORD_WEIGHT = 0.5
+    BIGRAM_WEIGHT = 0.5
+
+    def __init__(self, dim: int = 512, cache_size: int = 0):
+        self.dim = dim
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        # Векторизатор вызывается и из event loop, и из пула потоков поиска
+        self._cache_lock = threading.Lock()
+        self.cache_hits = 0
+
+    @staticmethod
+    def _features(text: str) -> Counter:
+        # Однобуквенные слова и числа почти не несут смысла, но дают коллизии
+        words = [word for word in re.findall(r"\w+", text.lower()) if len(word) > 1 and not word.isdigit()]
+        features = Counter()
+        for word in words:
+            features["w:" + word] += 1
+            features["s:" + word[:max(4, len(word) - 2)]] += 1
+        for first, second in zip(words, words[1:]):
+            features[f"b:{first} {second}"] += 1
+        return features
+
+    def transform(self, text: str) -> "np.ndarray":
+        """Нормированный вектор float32 (нулевой, если в тексте нет слов)"""
+        if not self.cache_size:
+            return self._transform(text)
+
+        with self._cache_lock:
+            vector = self._cache.get(text)
+            if vector is not None:
+                self._cache.move_to_end(text)
+                self.cache_hits += 1
+                return vector
+
+        vector = self._transform(text)
+        vector.setflags(write=False)
+        with self._cache_lock:
+            self._cache[text] = vector
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return vector
+
+    def _transform(self, text: str) -> "np.ndarray":
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature, count in self._features(text).items():
+            weight = 1.0 + math.log(count)
+            if feature[0] == "s":
+                weight *= self.STEM_WEIGHT
+            elif feature[0] == "w":
+                weight *= self.WORD_WEIGHT
+            else:
+                weight *= self.BIGRAM_WEIGHT
+            digest = zlib.crc32(feature.encode("utf-8"))
+            sign = 1.0 if digest & 0x80000000 else -1.0
+            vector[digest % self.dim] += sign * weight
+
+        norm = float(np.linalg.norm(vector))
+        if norm > 0:
+            vector /= norm
+        return vector
+
+
+class SemanticIndex:
+    """
+    Векторный индекс сообщений одного аккаунта
+
+    Файлы в каталоге индекса:
+        vectors-<dim>.f32 - матрица векторов (строка на сообщение), растет удвоением
+        meta.jsonl - [chat_id, message_id, timestamp] по строкам матрицы
+
+    Строка сначала пишется в матрицу, потом в meta.jsonl: после сбоя число
+    строк берется из meta.jsonl, недописанная строка отбрасывается.
+
+    Нулевая строка матрицы - сообщение, исключенное из поиска. compact
+    пишет новые файлы рядом (*.compact: сначала meta, потом матрица) и
+    фиксирует результат заменой meta.jsonl; после сбоя до замены
+    недописанные файлы удаляются, после - матрица заменяется при открытии.
+    """
+
+    INITIAL_CAPACITY = 1024
+    # Строк матрицы за одну операцию при обнулении и переписывании
+    CHUNK_ROWS = 65536
+
+    def __init__(self, path: str, dim: int = 512, vectorizer: Optional[HashingVectorizer] = None):
+        if np is None:
+            raise RuntimeError("numpy is required for the semantic index")
+        if vectorizer is not None and vectorizer.dim != dim:
+            raise ValueError("Vectorizer dimension does not match the index")
+
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        # Векторизатор может быть общим для индексов всех аккаунтов
+        self.vectorizer = vectorizer or HashingVectorizer(dim)
+        self.dim = dim
+        self._vectors_path = self.path / f"vectors-{dim}.f32"
+        self._meta_path = self.path / "meta.jsonl"
+        self._vectors_compact_path = self.path / f"vectors-{dim}.f32.compact"
+        self._meta_compact_path = self.path / "meta.jsonl.compact"
+
+        # Пересоздание отображения не должно совпасть с поиском в другом потоке
+        self._resize_lock = threading.Lock()
+        # Добавление и удаление строк (удаление идет в пуле потоков)
+        self._update_lock = threading.Lock()
+        self._open()
+
+    def _open(self):
+        """Открыть файлы индекса и прочитать метаданные строк"""
+        self._finish_compaction()
+
+        # Метаданные строк в памяти: ключи сообщений, номер чата и время строки
+        self._keys: List[Tuple[str, int, int]] = []
+        self._chat_numbers: Dict[str, int] = {}
+        self._chat_rows = np.zeros(0, dtype=np.int32)
+        self._timestamps = np.zeros(0, dtype=np.int64)
+        self._load_meta()
+
+        capacity = max(self.INITIAL_CAPACITY, len(self._keys))
+        if self._vectors_path.exists():
+            capacity = max(capacity, self._vectors_path.stat().st_size // (self.dim * 4))
+        self._vectors = self._open_vectors(capacity)
+        self._meta_file = open(self._meta_path, "a", encoding="utf-8")
+
+        # В скольких сообщениях занята каждая позиция вектора (для IDF запроса)
+        self._document_frequency = np.count_nonzero(self._vectors[:len(self._keys)], axis=0).astype(np.float32)
+
+    def _finish_compaction(self):
+        """Довести или отменить compact, прерванный сбоем"""
+        if self._meta_compact_path.exists():
+            # meta.jsonl не заменен - действуют старые файлы
+            self._meta_compact_path.unlink()
+            if self._vectors_compact_path.exists():
+                self._vectors_compact_path.unlink()
+        elif self._vectors_compact_path.exists():
+            os.replace(self._vectors_compact_path, self._vectors_path)
+
+    def _load_meta(self):
+        """Прочитать meta.jsonl (недописанная после сбоя строка отрезается)"""
+        if not self._meta_path.exists():
+            return
+        chats, timestamps = [], []
+        valid_bytes = 0
+        with open(self._meta_path, "r+b") as meta:
+            for line in meta:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    chat_id, message_id, timestamp = json.loads(line)
+                except ValueError:
+                    break
+                self._keys.append((chat_id, message_id, timestamp))
+                chats.append(self._chat_number(chat_id))
+                timestamps.append(timestamp)
+                valid_bytes += len(line)
+            meta.truncate(valid_bytes)
+        self._chat_rows = np.array(chats, dtype=np.int32)
+        self._timestamps = np.array(timestamps, dtype=np.int64)
+
+    def _chat_number(self, chat_id: str) -> int:
+        number = self._chat_numbers.get(chat_id)
+        if number is None:
+            number = self._chat_numbers[chat_id] = len(self._chat_numbers)
+        return number
+
+    def _open_vectors(self, capacity: int) -> "np.memmap":
+        """Отобразить файл векторов, растянув его до capacity строк"""
+        size = capacity * self.dim * 4
+        with open(self._vectors_path, "ab") as vectors:
+            if vectors.tell() < size:
+                vectors.truncate(size)
+        return np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def add(self, chat_id: str, message_id: int, timestamp: int, text: str) -> bool:
+        """Добавить сообщение, вернуть False для текста без слов"""
+        vector = self.vectorizer.transform(text or "")
+        if not vector.any():
+            return False
+
+        with self._update_lock:
+            row = len(self._keys)
+            if row >= self._vectors.shape[0]:
+                with self._resize_lock:
+                    self._vectors.flush()
+                    capacity = self._vectors.shape[0] * 2
+                    del self._vectors
+                    self._vectors = self._open_vectors(capacity)
+            self._vectors[row] = vector
+            self._document_frequency += vector != 0
+
+            number = self._chat_number(chat_id)
+            if row >= len(self._chat_rows):
+                size = max(self.INITIAL_CAPACITY, len(self._chat_rows) * 2)
+                self._chat_rows = self._grown(self._chat_rows, row, size)
+                self._timestamps = self._grown(self._timestamps, row, size)
+            self._chat_rows[row] = number
+            self._timestamps[row] = timestamp
+
+            self._meta_file.write(json.dumps([chat_id, message_id, timestamp]) + "\n")
+            self._meta_file.flush()
+            self._keys.append((chat_id, message_id, timestamp))
+        return True
+
+    @staticmethod
+    def _grown(array: "np.ndarray", used: int, size: int) -> "np.ndarray":
+        grown = np.empty(size, dtype=array.dtype)
+        grown[:used] = array[:used]
+        return grown
+
+    def search(self, query: str, limit: int = 5, chat_id: Optional[str] = None,
+               exclude: Iterable[Tuple[str, int]] = (), min_score: float = 0.2) -> List[SemanticHit]:
+        """
+        Ближайшие к запросу сообщения
+
+        Args:
+            query: Текст запроса
+            limit: Максимум результатов
+            chat_id: Искать только в этом чате
+            exclude: Пропустить эти (chat_id, message_id)
+            min_score: Минимальная косинусная близость
+
+        Returns:
+            Результаты по убыванию близости
+        """
+        query_vector = self.vectorizer.transform(query or "")
+        count = len(self._keys)
+        if not count or not query_vector.any():
+            return []
+
+        chat_number = None
+        if chat_id is not None:
+            chat_number = self._chat_numbers.get(chat_id)
+            if chat_number is None:
+                return []
+
+        # Редкие позиции (редкие слова) весят в запросе больше частых
+        idf = np.log((count + 1) / (self._document_frequency + 1)) + 1
+        query_vector = query_vector * idf
+        query_vector /= np.linalg.norm(query_vector)
+
+        excluded: Set[Tuple[str, int]] = set(exclude)
+        with self._resize_lock:
+            scores = self._vectors[:count] @ query_vector
+        if chat_number is not None:
+            scores[self._chat_rows[:count] != chat_number] = -1.0
+
+        # Кандидатов с запасом на исключенные, затем точная сортировка
+        wanted = min(count, limit + len(excluded))
+        top = np.argpartition(-scores, wanted - 1)[:wanted]
+        top = top[np.argsort(-scores[top])]
+
+        hits = []
+        for row in top:
+            score = float(scores[row])
+            # Нулевая близость - в том числе у исключенных (обнуленных) строк
+            if score < min_score or score <= 0.0:
+                break
+            chat, message_id, timestamp = self._keys[row]
+            if (chat, message_id) in excluded:
+                continue
+            hits.append(SemanticHit(chat, message_id, timestamp, score))
+            if len(hits) >= limit:
+                break
+        return hits
+
+    def forget_chat(self, chat_id: Optional[str] = None):
+        """Исключить сообщения чата (или всех чатов) из поиска"""
+        with self._update_lock:
+            count = len(self._keys)
+            if chat_id is None:
+                self._vectors[:count] = 0.0
+                self._document_frequency[:] = 0.0
+            else:
+                chat_number = self._chat_numbers.get(chat_id)
+                if chat_number is not None:
+                    self._drop_rows(np.flatnonzero(self._chat_rows[:count] == chat_number))
+            self._vectors.flush()
+
+    def prune(self, before: Optional[int] = None, max_rows_per_chat: Optional[int] = None) -> int:
+        """
+        Исключить из поиска сообщения по политике хранения
+
+        Args:
+            before: Сообщения старше этого времени (миллисекунды эпохи)
+            max_rows_per_chat: Оставить в каждом чате только столько последних строк
+
+        Returns:
+            Сколько сообщений исключено
+        """
+        with self._update_lock:
+            count = len(self._keys)
+            if not count:
+                return 0
+            drop = np.zeros(count, dtype=bool)
+            if before is not None:
+                drop |= self._timestamps[:count] < before
+            if max_rows_per_chat:
+                # Номер строки внутри своего чата; строки чата идут по времени добавления
+                chats = self._chat_rows[:count]
+                order = np.argsort(chats, kind="stable")
+                sorted_chats = chats[order]
+                starts = np.flatnonzero(np.r_[True, sorted_chats[1:] != sorted_chats[:-1]])
+                sizes = np.diff(np.r_[starts, count])
+                position = np.arange(count) - np.repeat(starts, sizes)
+                drop[order[position < np.repeat(sizes - max_rows_per_chat, sizes)]] = True
+            return self._drop_rows(np.flatnonzero(drop))
+
+    def _drop_rows(self, rows: "np.ndarray") -> int:
+        """Обнулить строки и вычесть их позиции из частот, вернуть число еще не обнуленных"""
+        dropped = 0
+        for start in range(0, len(rows), self.CHUNK_ROWS):
+            chunk = rows[start:start + self.CHUNK_ROWS]
+            vectors = self._vectors[chunk]
+            live = vectors.any(axis=1)
+            if not live.any():
+                continue
+            self._document_frequency -= np.count_nonzero(vectors[live], axis=0)
+            self._vectors[chunk[live]] = 0.0
+            dropped += int(live.sum())
+        return dropped
+
+    def compact(self, min_dead_fraction: float = 0.0) -> int:
+        """
+        Переписать файлы индекса без исключенных из поиска строк
+
+        Args:
+            min_dead_fraction: Переписывать, только если исключенных строк
+                не меньше этой доли
+
+        Returns:
+            Сколько строк удалено из файлов
+        """
+        with self._update_lock, self._resize_lock:
+            count = len(self._keys)
+            live = np.flatnonzero(self._vectors[:count].any(axis=1))
+            removed = count - len(live)
+            if not removed or removed < min_dead_fraction * count:
+                return 0
+
+            with open(self._meta_compact_path, "w", encoding="utf-8") as meta:
+                for row in live:
+                    meta.write(json.dumps(self._keys[row]) + "\n")
+                meta.flush()
+                os.fsync(meta.fileno())
+
+            capacity = max(self.INITIAL_CAPACITY, len(live))
+            compacted = np.memmap(self._vectors_compact_path, dtype=np.float32, mode="w+",
+                                  shape=(capacity, self.dim))
+            for start in range(0, len(live), self.CHUNK_ROWS):
+                chunk = live[start:start + self.CHUNK_ROWS]
+                compacted[start:start + len(chunk)] = self._vectors[chunk]
+            compacted.flush()
+            del compacted
+
+            # Отображение и meta.jsonl закрываются до замены файлов (иначе Windows не даст их заменить)
+            self._meta_file.close()
+            del self._vectors
+            os.replace(self._meta_compact_path, self._meta_path)
+            self._open()
+        return removed
+
+    def flush(self):
+        """Записать измененные страницы матрицы на диск"""
+        self._vectors.flush()
+
+    def close(self):
+        """Записать отображение на диск и закрыть файлы"""
+        self._vectors.flush()
+        self._meta_file.close()
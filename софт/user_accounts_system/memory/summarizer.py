@@ -0,0 +1,136 @@
+"""
+Сворачивание ранней истории чата в сводку
+
+Промпт ответа получает сводку и сообщения после нее вместо длинной
+истории. Сводка обновляется в фоне, раз в every новых сообщений чата:
+сообщения старше последних window дописываются в нее одним запросом к LLM.
+"""
+
+import asyncio
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Optional, TYPE_CHECKING
+
+from ..database.models import ChatSummary
+
+if TYPE_CHECKING:
+    from ..llm.llm_service import LLMService
+    from ..llm.prompt_builder import PromptBuilder
+    from .memory_manager import MemoryManager
+
+
+@dataclass
+class SummaryConfig:
+    """Настройки сводок чатов"""
+    enabled: bool = True
+    window: int = 10  # Последних сообщений, которые остаются в промпте как есть
+    every: int = 10  # Обновлять сводку после стольких новых сообщений чата
+    max_chars: int = 1500  # Ориентировочная длина сводки
+    max_tokens: int = 400  # Ограничение ответа LLM при сворачивании
+    max_concurrent: int = 2  # Одновременных запросов сворачивания на аккаунт
+
+
+class ChatSummarizer:
+    """
+    Фоновое обновление сводок чатов одного аккаунта
+
+    Между обновлениями в промпт попадает от window до window + every
+    сообщений после сводки (пока LLM сворачивает - и новые сообщения сверх
+    этого, в пределах limit у build_context_for_llm). На чат - не больше одной задачи сворачивания;
+    если LLM не ответил, сводка остается прежней до следующего срабатывания.
+    """
+
+    def __init__(self, memory_manager: "MemoryManager", llm_service: "LLMService",
+                 prompt_builder: "PromptBuilder", config: Optional[SummaryConfig] = None):
+        self.memory = memory_manager
+        self.llm_service = llm_service
+        self.prompt_builder = prompt_builder
+        self.config = config or SummaryConfig()
+        # Новых сообщений по чатам с последнего запуска сворачивания
+        self._new_messages: Dict[str, int] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        # Создается в event loop при первом использовании
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.stats = {
+            "runs": 0,  # Успешных обновлений сводок
+            "messages_folded": 0,  # Сообщений, свернутых в сводки
+            "failures": 0,  # Запусков без ответа LLM или с ошибкой
+        }
+
+    def note_message(self, chat_id: str):
+        """Учесть новое сообщение чата и запустить сворачивание каждые every сообщений"""
+        if not self.config.enabled:
+            return
+        count = self._new_messages.get(chat_id, 0) + 1
+        if count < self.config.every or chat_id in self._tasks:
+            self._new_messages[chat_id] = count
+            return
+
+        self._new_messages.pop(chat_id, None)
+        self._tasks[chat_id] = asyncio.create_task(self._run(chat_id))
+
+    async def _run(self, chat_id: str):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.config.max_concurrent)
+        try:
+            async with self._semaphore:
+                await self.summarize_chat(chat_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.stats["failures"] += 1
+            print(f"Error summarizing chat {chat_id} of account {self.memory.account_id}: {e}")
+        finally:
+            self._tasks.pop(chat_id, None)
+
+    async def summarize_chat(self, chat_id: str) -> int:
+        """Свернуть в сводку сообщения старше последних window, вернуть их число"""
+        history = await self.memory.get_chat_history(chat_id, self.memory.cache_config.chat_history_size)
+        summary = await self.memory.get_chat_summary(chat_id)
+        if summary is not None:
+            history = [msg for msg in history if not summary.covers(msg)]
+
+        window = self.config.window
+        fold = history[:-window] if window else history
+        if not fold:
+            return 0
+
+        prompt = self.prompt_builder.build_summary_prompt(
+            summary.summary if summary is not None else None,
+            [{"user": msg.username or msg.user_id, "text": msg.message_text} for msg in fold],
+            self.config.max_chars,
+        )
+        # Запрос к LLM блокирующий - в пуле потоков, чтобы не задерживать event loop
+        loop = asyncio.get_running_loop()
+        text = await loop.run_in_executor(
+            None, self.llm_service.generate_summary, prompt, self.config.max_tokens
+        )
+        if not text:
+            self.stats["failures"] += 1
+            return 0
+
+        last = fold[-1]
+        await self.memory.save_chat_summary(ChatSummary(
+            account_id=self.memory.account_id,
+            chat_id=chat_id,
+            summary=text,
+            covered_until=last.timestamp,
+            covered_message_id=last.message_id,
+            messages_folded=(summary.messages_folded if summary is not None else 0) + len(fold),
+            updated_at=datetime.now(),
+        ))
+        self.stats["runs"] += 1
+        self.stats["messages_folded"] += len(fold)
+        return len(fold)
+
+    async def stop(self):
+        """Отменить незавершенные сворачивания"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks.clear()
@@ -7,9 +7,18 @@ from typing import List, Dict, Any, Optional
 from pathlib import Path
 
 from .database.db_manager import DatabaseManager
-from .database.models import Account
+from .database.async_db import AsyncDatabaseManager
+from .database.write_behind import WriteBehindConfig
+from .database.retention import RetentionPruner
+from .database.models import Account, AccountStats, RetentionPolicy
 from .account_manager import AccountManager
+from .memory.cache import MemoryCacheConfig, WarmUpConfig, WriteBackConfig
+from .memory.summarizer import SummaryConfig
+from .memory import semantic_index
+from .personality.personality_engine import load_profile_scores
+from .listener.shared_ingest import SharedIngest
 from .llm.llm_service import LLMService
+from .loop_monitor import LoopLagMonitor
 
 
 class Orchestrator:
@@ -21,22 +30,63 @@ class Orchestrator:
         llm_provider: str = "openai",
         llm_api_key: Optional[str] = None,
         llm_model: str = "gpt-4o-mini",
+        write_behind: Optional[WriteBehindConfig] = None,
+        sharded: bool = False,
+        interaction_sample_rate: float = 0.05,
+        memory_cache: Optional[MemoryCacheConfig] = None,
+        memory_write_back: Optional[WriteBackConfig] = None,
+        memory_warm_up: Optional[WarmUpConfig] = None,
+        semantic_index_dir: Optional[str] = "data/semantic",
+        chat_summary: Optional[SummaryConfig] = None,
     ):
         """
         Args:
-            db_path: Путь к БД
+            db_path: Путь к файлу SQLite или адрес postgresql://...
             llm_provider: Провайдер LLM
             llm_api_key: API ключ для LLM
             llm_model: Модель LLM
+            write_behind: Настройки отложенной записи сообщений и лога
+                (по умолчанию WriteBehindConfig.for_durability("balanced"))
+            sharded: Хранить данные каждого аккаунта в отдельном файле БД
+                (db_path - общий каталог аккаунтов)
+            interaction_sample_rate: Доля решений без ответа, сохраняемых в лог
+                полной строкой (все решения учитываются в почасовых счетчиках)
+            memory_cache: Размеры кэшей памяти по умолчанию для каждого аккаунта
+            memory_write_back: Отложенная запись профилей пользователей и тем
+                (по умолчанию WriteBackConfig.for_durability("balanced"))
+            memory_warm_up: Предзагрузка кэшей памяти при старте каждого аккаунта
+                (по умолчанию WarmUpConfig())
+            semantic_index_dir: Каталог семантических индексов аккаунтов для
+                поиска давних сообщений по смыслу (None - выключено; нужен NumPy)
+            chat_summary: Сводки ранней истории чатов для промпта
+                (по умолчанию SummaryConfig())
         """
-        self.db = DatabaseManager(db_path)
+        self.db = DatabaseManager(db_path, sharded=sharded)
+        write_behind = write_behind or WriteBehindConfig.for_durability("balanced")
+        if write_behind.enabled:
+            self.db.enable_write_behind(write_behind)
+        self.async_db = AsyncDatabaseManager(self.db)
         self.llm_service = LLMService(
             provider=llm_provider,
             api_key=llm_api_key,
             model=llm_model,
         )
+        self.interaction_sample_rate = interaction_sample_rate
+        self.memory_cache = memory_cache or MemoryCacheConfig()
+        self.memory_write_back = memory_write_back or WriteBackConfig.for_durability("balanced")
+        self.memory_warm_up = memory_warm_up or WarmUpConfig()
+        self.semantic_index_dir = semantic_index_dir
+        self.chat_summary = chat_summary or SummaryConfig()
+        # Сообщение группы, где состоят несколько наших аккаунтов, разбирается
+        # и векторизуется один раз (хранит сообщение каждый аккаунт сам)
+        self.ingest = SharedIngest()
+        self.semantic_vectorizer = (
+            semantic_index.HashingVectorizer(cache_size=1024) if semantic_index.is_available() else None
+        )
         self.account_managers: Dict[int, AccountManager] = {}
         self.is_running = False
+        self.loop_monitor = LoopLagMonitor()
+        self.retention_pruner = RetentionPruner(self.async_db, on_prune=self._prune_semantic_index)
 
     def register_account(
         self,
@@ -44,6 +94,7 @@ class Orchestrator:
         session_string: str,
         api_id: int,
         api_hash: str,
+        memory_cache: Optional[MemoryCacheConfig] = None,
     ) -> int:
         """
         Зарегистрировать новый аккаунт
@@ -53,6 +104,7 @@ class Orchestrator:
             session_string: Сессия в формате StringSession
             api_id: Telegram API ID
             api_hash: Telegram API Hash
+            memory_cache: Размеры кэшей памяти аккаунта (по умолчанию общие)
             
         Returns:
             ID аккаунта
@@ -75,6 +127,15 @@ class Orchestrator:
             session_string=session_string,
             db_manager=self.db,
             llm_service=self.llm_service,
+            async_db=self.async_db,
+            interaction_sample_rate=self.interaction_sample_rate,
+            memory_cache=memory_cache or self.memory_cache,
+            memory_write_back=self.memory_write_back,
+            memory_warm_up=self.memory_warm_up,
+            semantic_index_dir=self.semantic_index_dir,
+            chat_summary=self.chat_summary,
+            ingest=self.ingest,
+            semantic_vectorizer=self.semantic_vectorizer,
         )
         
         self.account_managers[account_id] = manager
@@ -106,6 +167,8 @@ class Orchestrator:
 
     async def start_all(self):
         """Запустить все активные аккаунты"""
+        self.loop_monitor.start()
+        self.retention_pruner.start()
         accounts = self.db.get_all_accounts()
         
         for account in accounts:
@@ -122,50 +185,97 @@ class Orchestrator:
         for account_id in list(self.account_managers.keys()):
             await self.stop_account(account_id)
         
+        # Записать всё, что накопилось в очереди отложенной записи
+        await self.async_db.flush_pending()
+
+        await self.retention_pruner.stop()
+        await self.loop_monitor.stop()
         self.is_running = False
 
-    def get_account_stats(self, account_id: int) -> Optional[Dict[str, Any]]:
+    def get_system_stats(self) -> Dict[str, Any]:
+        """Получить системную статистику"""
+        return {
+            "is_running": self.is_running,
+            "running_accounts": len(self.account_managers),
+            "event_loop_lag": self.loop_monitor.get_stats(),
+            "write_behind": self.db.write_behind.get_stats() if self.db.write_behind else None,
+            "retention": self.retention_pruner.get_stats(),
+            "ingest": self.ingest.get_stats(),
+        }
+
+    async def _prune_semantic_index(self, policy: RetentionPolicy):
+        """Применить политику хранения к семантическому индексу запущенного аккаунта"""
+        manager = self.account_managers.get(policy.account_id)
+        if manager is not None:
+            await manager.memory_manager.apply_retention(policy)
+
+    async def forget_chat_memory(self, account_id: int, chat_id: Optional[str] = None):
+        """
+        Сбросить память о чате (или всех чатах) после очистки в БД: кэши и
+        семантический индекс, в том числе незапущенного аккаунта
+        """
+        manager = self.account_managers.get(account_id)
+        if manager is not None:
+            manager.memory_manager.forget_chat(chat_id)
+            return
+
+        if not self.semantic_index_dir or not semantic_index.is_available():
+            return
+        path = Path(self.semantic_index_dir) / str(account_id)
+        if not path.exists():
+            return
+
+        def forget():
+            index = semantic_index.SemanticIndex(str(path), vectorizer=self.semantic_vectorizer)
+            try:
+                index.forget_chat(chat_id)
+                # Индекс никто не использует - сразу переписать без удаленных строк
+                index.compact()
+            finally:
+                index.close()
+
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, forget)
+
+    async def get_account_stats(self, account_id: int) -> Optional[Dict[str, Any]]:
         """Получить статистику аккаунта"""
         if account_id in self.account_managers:
-            return self.account_managers[account_id].get_stats()
-        else:
-            # Если аккаунт не запущен, возвращаем базовую информацию из БД
-            account = self.db.get_account(account_id)
-            if account:
-                # Возвращаем минимальную информацию об аккаунте
-                profile = self.db.get_personality_profile(account_id)
-                if profile:
-                    return {
-                        "id": account.id,
-                        "phone_number": account.phone_number,
-                        "is_active": account.is_active,
-                        "profile": profile.to_dict(),
-                        "stats": {
-                            "messages_received": 0,
-                            "messages_responded": 0,
-                            "messages_ignored": 0,
-                            "last_activity": None,
-                        }
-                    }
-                else:
-                    return {
-                        "id": account.id,
-                        "phone_number": account.phone_number,
-                        "is_active": account.is_active,
-                        "profile": None,
-                        "stats": None
-                    }
-        return None
-
-    def get_all_accounts_info(self) -> List[Dict[str, Any]]:
+            return await self.account_managers[account_id].get_stats()
+
+        # Аккаунт не запущен: накопленная статистика из БД
+        account = await self.async_db.get_account(account_id)
+        if not account:
+            return None
+        profile, stats = await asyncio.gather(
+            self.async_db.get_personality_profile(account_id),
+            self.async_db.get_account_stats(account_id),
+        )
+        if profile:
+            # to_dict обходит оценки профиля - прочитать их заранее, не из event loop
+            await load_profile_scores(self.async_db, profile)
+        return {
+            "id": account.id,
+            "phone_number": account.phone_number,
+            "is_active": account.is_active,
+            "is_running": False,
+            "profile": profile.to_dict() if profile else None,
+            "stats": stats.to_dict(),
+        }
+
+    async def get_all_accounts_info(self) -> List[Dict[str, Any]]:
         """Получить информацию о всех аккаунтах"""
-        accounts = self.db.get_all_accounts()
+        # Статистика всех аккаунтов - одним чтением на хранилище
+        accounts, all_stats = await asyncio.gather(
+            self.async_db.get_all_accounts(),
+            self.async_db.get_all_account_stats(),
+        )
         return [
             {
                 "id": acc.id,
                 "phone_number": acc.phone_number,
                 "is_active": acc.is_active,
-                "stats": self.get_account_stats(acc.id),
+                "is_running": acc.id in self.account_managers,
+                "stats": all_stats.get(acc.id, AccountStats(account_id=acc.id)).to_dict(),
             }
             for acc in accounts
         ]
@@ -6,6 +6,7 @@ from typing import Dict, Any, Optional
 from datetime import datetime
 
 from ..database.db_manager import DatabaseManager
+from ..database.async_db import AsyncDatabaseManager
 from ..database.models import PersonalityProfile, DynamicPersonalityConfig
 
 
@@ -16,11 +17,17 @@ class EvolutionEngine:
     EVOLUTION_RATE = 0.02  # 2% за событие
     MAX_CHANGE = 0.05  # Максимальное изменение за раз
 
-    def __init__(self, account_id: int, db_manager: DatabaseManager):
+    def __init__(
+        self,
+        account_id: int,
+        db_manager: DatabaseManager,
+        async_db: Optional[AsyncDatabaseManager] = None,
+    ):
         self.account_id = account_id
         self.db = db_manager
+        self.async_db = async_db or AsyncDatabaseManager(db_manager)
 
-    def evolve_from_interaction(
+    async def evolve_from_interaction(
         self,
         profile: PersonalityProfile,
         interaction_type: str,  # "responded", "ignored", "discussion", "positive_reaction"
@@ -75,10 +82,15 @@ class EvolutionEngine:
             if abs(dynamic.activity_level - old_activity) > 0.001:
                 changes.append(("activity_level", old_activity, dynamic.activity_level))
         
+        # Изменившиеся строки приоритетов тем и отношений (сохраняются через UPSERT)
+        changed_topics: Dict[str, float] = {}
+        changed_relationships: Dict[str, float] = {}
+
         # Эволюция приоритетов тем
         if context and "topic_keywords" in context:
             for keyword in context.get("topic_keywords", []):
-                if keyword not in dynamic.topic_priorities:
+                is_new = keyword not in dynamic.topic_priorities
+                if is_new:
                     dynamic.topic_priorities[keyword] = 0.5
                 
                 # Увеличить приоритет темы
@@ -87,6 +99,9 @@ class EvolutionEngine:
                     1.0,
                     old_priority + self.EVOLUTION_RATE
                 )
+                # Приоритет, упершийся в 1.0, не записывается повторно
+                if is_new or dynamic.topic_priorities[keyword] != old_priority:
+                    changed_topics[keyword] = dynamic.topic_priorities[keyword]
                 
                 if abs(dynamic.topic_priorities[keyword] - old_priority) > 0.001:
                     changes.append(
@@ -98,6 +113,7 @@ class EvolutionEngine:
             user_id = context["user_id"]
             if user_id not in dynamic.user_relationships:
                 dynamic.user_relationships[user_id] = 0.5
+                changed_relationships[user_id] = 0.5
             
             # Если был положительный опыт, улучшаем отношения
             if interaction_type in ["responded", "positive_reaction"]:
@@ -106,35 +122,23 @@ class EvolutionEngine:
                     1.0,
                     old_relationship + self.EVOLUTION_RATE
                 )
+                if dynamic.user_relationships[user_id] != old_relationship:
+                    changed_relationships[user_id] = dynamic.user_relationships[user_id]
                 
                 if abs(dynamic.user_relationships[user_id] - old_relationship) > 0.001:
                     changes.append(
                         (f"user_relationship_{user_id}", old_relationship, dynamic.user_relationships[user_id])
                     )
         
-        # Сохранить изменения в БД
-        if changes:
+        # Сохранить изменения в БД: только изменившиеся ключи, одной транзакцией
+        if changes or changed_topics or changed_relationships:
             profile.last_updated = datetime.now()
-            self.db.save_personality_profile(profile)
-            
-            # Записать в историю эволюции
-            self._log_evolution(changes, interaction_type)
+            await self.async_db.save_personality_evolution(
+                profile,
+                changed_topics,
+                changed_relationships,
+                changes,
+                interaction_type,
+            )
         
         return profile
-
-    def _log_evolution(self, changes: list, reason: str):
-        """Записать изменения в историю эволюции"""
-        import sqlite3
-        conn = sqlite3.connect(self.db.db_path)
-        cursor = conn.cursor()
-        
-        for param_name, old_value, new_value in changes:
-            cursor.execute("""
-                INSERT INTO evolution_history 
-                (account_id, parameter_name, old_value, new_value, reason)
-                VALUES (?, ?, ?, ?, ?)
-            """, (self.account_id, param_name, old_value, new_value, reason))
-        
-        conn.commit()
-        conn.close()
-
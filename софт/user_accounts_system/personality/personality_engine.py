@@ -2,20 +2,49 @@
 Движок управления личностью
 """
 
+import asyncio
 from typing import Optional, Dict, List, Any
 
 from ..database.db_manager import DatabaseManager
-from ..database.models import PersonalityProfile, BasePersonalityConfig, DynamicPersonalityConfig, PersonalityConstraints
+from ..database.async_db import AsyncDatabaseManager
+from ..database.models import PersonalityProfile, BasePersonalityConfig, DynamicPersonalityConfig, PersonalityConstraints, LazyScoreMap
 from .evolution_engine import EvolutionEngine
 
 
+async def load_profile_scores(async_db: AsyncDatabaseManager, profile: PersonalityProfile):
+    """
+    Прочитать приоритеты тем и отношения профиля через async_db
+
+    Иначе LazyScoreMap загрузится синхронным запросом при первом
+    обращении (в том числе в to_dict) - уже из event loop.
+    """
+    loaders = {
+        "topic_priorities": async_db.get_topic_priorities,
+        "user_relationships": async_db.get_user_relationships,
+    }
+    pending = []
+    for name, loader in loaders.items():
+        scores = getattr(profile.dynamic, name)
+        if isinstance(scores, LazyScoreMap) and not scores.is_loaded:
+            pending.append((scores, loader))
+    loaded = await asyncio.gather(*(loader(profile.account_id) for _, loader in pending))
+    for (scores, _), values in zip(pending, loaded):
+        scores.fill(values)
+
+
 class PersonalityEngine:
     """Движок для управления и применения личности"""
 
-    def __init__(self, account_id: int, db_manager: DatabaseManager):
+    def __init__(
+        self,
+        account_id: int,
+        db_manager: DatabaseManager,
+        async_db: Optional[AsyncDatabaseManager] = None,
+    ):
         self.account_id = account_id
         self.db = db_manager
-        self.evolution_engine = EvolutionEngine(account_id, db_manager)
+        self.async_db = async_db or AsyncDatabaseManager(db_manager)
+        self.evolution_engine = EvolutionEngine(account_id, db_manager, self.async_db)
         self._profile: Optional[PersonalityProfile] = None
 
     def load_profile(self) -> PersonalityProfile:
@@ -30,6 +59,10 @@ class PersonalityEngine:
         self._profile = profile
         return profile
 
+    async def load_scores(self):
+        """Прочитать оценки профиля до первых сообщений (см. load_profile_scores)"""
+        await load_profile_scores(self.async_db, self.get_profile())
+
     def get_profile(self) -> PersonalityProfile:
         """Получить текущий профиль (загружает если нужно)"""
         if not self._profile:
@@ -92,14 +125,14 @@ class PersonalityEngine:
         self._profile = profile
         return profile
 
-    def evolve_from_interaction(
+    async def evolve_from_interaction(
         self,
         interaction_type: str,
         context: Dict[str, Any] = None,
     ) -> PersonalityProfile:
         """Эволюционировать личность на основе взаимодействия"""
         profile = self.get_profile()
-        updated_profile = self.evolution_engine.evolve_from_interaction(
+        updated_profile = await self.evolution_engine.evolve_from_interaction(
             profile,
             interaction_type,
             context,
@@ -71,6 +71,12 @@ async function loadAccounts() {
                     </span>
                 </div>
                 <div class="account-phone">${account.phone_number}</div>
+                ${account.stats ? `
+                <div class="account-stats">
+                    Сообщений: ${account.stats.messages_received}, ответов: ${account.stats.messages_responded}
+                    (за ${account.stats.recent_hours} ч: ${account.stats.recent.received} / ${account.stats.recent.responded})
+                </div>
+                ` : ''}
                 <div class="account-actions">
                     <button class="btn btn-primary btn-small" onclick="viewAccountDetails(${account.id})">
                         📊 Детали
@@ -126,13 +132,21 @@ async function viewAccountDetails(accountId) {
                 <h3>Статистика</h3>
                 <div class="stats-grid">
                     <div class="stat-card">
-                        <div class="stat-value">${stats.stats.messages_processed || 0}</div>
+                        <div class="stat-value">${stats.stats.messages_received || 0}</div>
                         <div class="stat-label">Сообщений обработано</div>
                     </div>
                     <div class="stat-card">
-                        <div class="stat-value">${stats.stats.responses_sent || 0}</div>
+                        <div class="stat-value">${stats.stats.messages_responded || 0}</div>
                         <div class="stat-label">Ответов отправлено</div>
                     </div>
+                    <div class="stat-card">
+                        <div class="stat-value">${stats.stats.recent.received || 0}</div>
+                        <div class="stat-label">Сообщений за ${stats.stats.recent_hours} ч</div>
+                    </div>
+                    <div class="stat-card">
+                        <div class="stat-value">${stats.stats.recent.responded || 0}</div>
+                        <div class="stat-label">Ответов за ${stats.stats.recent_hours} ч</div>
+                    </div>
                 </div>
             </div>
             ` : ''}